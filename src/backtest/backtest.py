@@ -1,10 +1,21 @@
+import numpy as np
 import streamlit as st
 import pandas as pd
 from datetime import date
-from src.utils.utils import _show_day_range_slider, _leverage_dataset
-from src.backtest.utils import plot_backtest, translate_operation_days_to_dates, plot_wallet_chart
+from src.utils.utils import _show_day_range_slider, _filter_days
+from src.utils.leverage import leveraged_datasets, sort_assets
+from src.backtest.utils import plot_backtest, plot_portfolio, plot_wallet_chart
 from src.backtest.strategy.builders import STRATEGY_BUILDERS
+from src.backtest.strategy.Journal import NullJournal, TextJournal, TradeJournal, new_run_log_path
+from src.backtest.strategy.Instrumentation import Instrumentation
+from src.backtest.strategy.PortfolioRecorder import PortfolioRecorder
 from src.evaluation.configs import ENTRY_THRESHOLDS_SPACE
+from src.utils.memo import memoize
+from src.utils.downsampling import DEFAULT_MAX_POINTS
+
+# Assets available in the entry thresholds editor, x2 and x3 are always loaded (they define the rotation order)
+ASSET_OPTIONS = ["x1", "x1.5", "x2", "x2.5", "x3"]
+DEFAULT_ASSETS = ("x2", "x3")
 
 def thresholds_df_to_dict(df):
     thresholds = {}
@@ -52,7 +63,7 @@ def create_entry_thresholds_input():
             ),
             "asset": st.column_config.SelectboxColumn(
                 "Asset",
-                options=["x1", "x2", "x3"],
+                options=ASSET_OPTIONS,
             ),
         },
     )
@@ -60,7 +71,7 @@ def create_entry_thresholds_input():
 
 
 def create_yields_input(entry_thresholds):
-    assets = sorted({asset for _, asset in entry_thresholds.values()})
+    assets = sort_assets({asset for _, asset in entry_thresholds.values()})
     yield_targets = {}
     yield_values = {}
     for asset in assets:
@@ -97,17 +108,90 @@ def create_yields_input(entry_thresholds):
     return yield_targets, yield_values
 
 
+def create_journal(journal_kind):
+    if journal_kind == "text":
+        # One log file per session, overwritten by every run
+        if 'journal_log_path' not in st.session_state:
+            st.session_state.journal_log_path = new_run_log_path()
+        return TextJournal(st.session_state.journal_log_path)
+    if journal_kind == "trades":
+        return TradeJournal()
+    return NullJournal()
+
+
+def render_journal(journal):
+    if isinstance(journal, TextJournal):
+        with st.expander("Operations log"):
+            st.download_button("Download log", journal.get_text(), file_name="thresholds.log")
+            st.code("\n".join(journal.lines[-200:]), language=None)
+    elif isinstance(journal, TradeJournal):
+        with st.expander(f"Trades journal ({len(journal)} operations)"):
+            st.dataframe(journal.to_frame(), width='stretch')
+
+
+def create_instrumentation(instrumentation_kind):
+    if instrumentation_kind == "off":
+        return None
+    return Instrumentation(profile=instrumentation_kind == "profile")
+
+
+def render_instrumentation(report):
+    with st.expander(f"Instrumentation ({report['total_time_s']:.3f} s)"):
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Buys", report["buys"])
+        c2.metric("Sells", report["sells"])
+        c3.metric("Rotations", report["rotations"])
+
+        phases = pd.DataFrame.from_dict(report["phases"], orient="index").rename_axis("phase")
+        phases["% of total"] = phases["time_s"] / report["total_time_s"] * 100
+        phases["us_per_call"] = phases["time_s"] / phases["calls"] * 1e6
+        st.caption("Phase times are inclusive, e.g. the journal time spent while buying is also counted in buy_or_rotate")
+        st.dataframe(phases.round(3), width='stretch')
+        st.caption("Maximum number of lots held: " + ", ".join(f"{asset}: {n}" for asset, n in report["max_lots"].items()))
+
+        if report["profile"]:
+            st.code(report["profile"], language=None)
+
+
+def render_portfolio(portfolio, x1, start_day, end_day, fast_charts):
+    # Recorded days in the selected range, mapped to the dates of the x1 rows
+    keep = (portfolio["days"] >= start_day) & (portfolio["days"] <= end_day)
+    if keep.sum() < 2:
+        return
+    shown = {key: portfolio[key][keep] for key in ("rows", "days", "cash", "owed", "total")}
+    shown["values"] = {asset: values[keep] for asset, values in portfolio["values"].items()}
+    dates = x1['Date'].to_numpy()[shown["rows"]]
+
+    # Strategy drawdown and volatility of the total value, annualized from the calendar days between recorded days
+    total = shown["total"]
+    drawdown = total / np.maximum.accumulate(total) - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(total) / total[:-1]
+    returns = returns[np.isfinite(returns)]
+    volatility = returns.std() * np.sqrt(365 / np.diff(shown["days"]).mean()) if len(returns) > 1 else 0.0
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Strategy max drawdown", f"{drawdown.min():,.2%}")
+    c2.metric("Strategy volatility (annual)", f"{volatility:,.2%}")
+    c3.metric("Max owed money", f"{shown['owed'].max():,.2f} €")
+
+    fig = plot_portfolio(dates, shown, max_points=DEFAULT_MAX_POINTS if fast_charts else None)
+    st.plotly_chart(fig, width='stretch')
+
+
 def render_backtest_result(start_day, end_day, strategy_params, input_dfs, result):
     # Unpack strategy parameters
-    initial_capital, strategy_key, entry_thresholds, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional = strategy_params
+    initial_capital, strategy_key, entry_thresholds, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional, *_ = strategy_params
 
-    # Translate operations tracked days to DataFrame dates, in order to plot them properly in the X-axis
     x1 = input_dfs["x1"]
-    x1_filtered = x1[(x1['Days'] >= start_day) & (x1['Days'] <= end_day)].copy()
-    translated_ops = translate_operation_days_to_dates(st.session_state["df"], result)
-
-    # Plot input DataFrames with the performed operations (buy, rotate and sell)
-    fig = plot_backtest(x1_filtered, input_dfs["x2"], input_dfs["x3"], translated_ops)
+    x1_filtered = _filter_days(x1, start_day, end_day)
+
+    # Plot input DataFrames with the performed operations (buy, rotate and sell), operations are tracked by day
+    fast_charts = st.toggle("Fast charts", value=True, key="backtest_fast_charts",
+                            help=f"Downsample every line to {DEFAULT_MAX_POINTS} points keeping its shape (LTTB) and draw it with WebGL. "
+                                 "Narrow the days range to see more detail")
+    leveraged_dfs = {asset: asset_df for asset, asset_df in input_dfs.items() if asset != "x1"}
+    fig = plot_backtest(x1_filtered, leveraged_dfs, result, max_points=DEFAULT_MAX_POINTS if fast_charts else None)
     st.plotly_chart(fig, width='stretch')
 
     st.markdown("### Analysis of results")
@@ -154,8 +238,24 @@ def render_backtest_result(start_day, end_day, strategy_params, input_dfs, resul
     c3.metric("Time Under Water", f"{tuw:,.2%}")
     c4.metric("Base CAGR", f"{base_cagr:,.2%}")
 
+    if "portfolio" in result:
+        render_portfolio(result["portfolio"], x1, start_day, end_day, fast_charts)
+
+    if "journal" in result:
+        render_journal(result["journal"])
+
+    if "instrumentation" in result:
+        render_instrumentation(result["instrumentation"])
+
 
-def update_data(start_date, end_date, df):
+@memoize(maxsize=16)
+def load_period_data(df, start_dt, end_dt, assets=DEFAULT_ASSETS):
+    # Period slice and the leveraged NAVs of the assets (one cube), memoized so switching back to a previous date range is instant
+    x1 = df[(df['Date'] >= start_dt) & (df['Date'] <= end_dt)].copy()
+    return {"x1": x1, **leveraged_datasets(x1, assets, knockout_zero=True)}
+
+
+def update_data(start_date, end_date, df, assets=DEFAULT_ASSETS):
     _data = {}
     _updated = False
     start_dt, end_dt = pd.to_datetime(start_date), pd.to_datetime(end_date)
@@ -163,13 +263,11 @@ def update_data(start_date, end_date, df):
         st.error("End date must be later than the start date")
         st.stop()
 
-    if st.session_state.get('data_params', ()) != (start_date, end_date):
-        _data["x1"] = df[(df['Date'] >= start_dt) & (df['Date'] <= end_dt)].copy()
-        _data["x2"] = _leverage_dataset(_data["x1"], L=2, knockout_zero=True)
-        _data["x3"] = _leverage_dataset(_data["x1"], L=3, knockout_zero=True)
+    if st.session_state.get('data_params', ()) != (start_date, end_date, assets):
+        _data = load_period_data(df, start_dt, end_dt, assets)
         _updated = True
         st.session_state.backtest_data = _data
-        st.session_state.data_params = (start_date, end_date)
+        st.session_state.data_params = (start_date, end_date, assets)
     else:
         _data = st.session_state.backtest_data
 
@@ -200,13 +298,41 @@ def run():
     rotate = st.toggle("Rotate between leverage factors", value=False)
     risk_control = st.toggle("Risk control", value=False)
     allow_fractional = st.toggle("Allow fractional shares", value=True)
+    event_driven = st.toggle("Skip idle days", value=False,
+                             help="Only simulate the days where a buy, sell or rotation can happen (debt costs may differ by rounding)")
+    record_every = st.number_input("Portfolio record step (days)", min_value=1, max_value=252, value=1,
+                                   help="Record cash, owed money and asset values every N trading days for the equity and debt chart (the last day is always recorded)")
     debt_yield = st.number_input("Debt yield", min_value=0.0000, max_value=1.0000, step=0.0001, value=0.0325, format="%0.4f")
+    journal_kind = st.selectbox(
+        "Operations journal",
+        options=["text", "trades", "off"],
+        format_func=lambda k: {
+            "text": "Text log",
+            "trades": "Trades table",
+            "off": "Disabled (faster)",
+        }[k],
+    )
+    instrumentation_kind = st.selectbox(
+        "Instrumentation",
+        options=["off", "phases", "profile"],
+        format_func=lambda k: {
+            "off": "Disabled",
+            "phases": "Phase timings and counters",
+            "profile": "Phase timings + full profile (slower)",
+        }[k],
+    )
 
-    # Check if data has been updated
-    updated_data, input_dfs = update_data(start_date, end_date, df)
+    # Check if data has been updated (x2, x3 and any other leveraged asset of the entry thresholds)
+    config_assets = sort_assets({asset for _, asset in entry_thresholds.values() if asset != "x1"})
+    assets = tuple(sort_assets(set(DEFAULT_ASSETS) | set(config_assets)))
+    updated_data, input_dfs = update_data(start_date, end_date, df, assets)
+    # The strategy only gets x1 and the assets of its thresholds, like in the evaluation: rotations step down through the
+    # leverage factors of the config, the other leveraged NAVs are only charted
+    strategy_dfs = {asset: input_dfs[asset] for asset in ["x1"] + config_assets}
 
     # Check if strategy has been updated
-    strategy_params = (initial_capital, strategy_key, entry_thresholds, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional)
+    strategy_params = (initial_capital, strategy_key, entry_thresholds, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional, journal_kind, event_driven,
+                       instrumentation_kind, record_every)
     updated_strategy = st.session_state.get('strategy_params', ()) != strategy_params
 
     run = st.button("▶ Run backtest")
@@ -214,7 +340,9 @@ def run():
     if run and (updated_data or updated_strategy):
         with st.spinner("Doing a really hard work to backtest your strategy..."):
             if updated_strategy:
-                strategy = STRATEGY_BUILDERS[strategy_key](initial_capital, entry_thresholds, input_dfs, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional)
+                strategy = STRATEGY_BUILDERS[strategy_key](initial_capital, entry_thresholds, strategy_dfs, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional,
+                                                         journal=create_journal(journal_kind), event_driven=event_driven,
+                                                         instrumentation=create_instrumentation(instrumentation_kind), recorder=PortfolioRecorder(record_every))
                 st.session_state.backtest_strategy = strategy
             else:
                 strategy = st.session_state.get("backtest_strategy", None)
@@ -1,25 +1,32 @@
 from math import floor
+import numpy as np
+
+from src.backtest.strategy.LotLedger import LotLedger
+from src.backtest.strategy.Journal import NullJournal, BUY, SELL, ROTATE_BUY, ROTATE_SELL
 
 
 class Asset:
 
-    def __init__(self, ticker, prices, max_eur, yield_target, yield_value, log_file, allow_fractional=True, min_trade_value=5.0):
+    # Trading fees: a percentage of the traded amount with a minimum per operation
+    FEE_RATE = 0.0012
+    MIN_FEE = 1.0
+
+    def __init__(self, ticker, prices, max_eur, yield_target, yield_value, journal=None, allow_fractional=True, min_trade_value=5.0):
         self.ticker = ticker
         self.prices = prices
         self.max_eur = max_eur
         self.yield_target = yield_target  # "none", "num" or "auto"
         self.yield_value = -1 if yield_target == "none" else yield_value
-        self.log_file = log_file
+        self.journal = journal if journal is not None else NullJournal()
         self.invested_eur = 0
         self.invested_qty = 0
         self.invested_value = 0
-        self.buys = []
+        self.buys = LotLedger(ticker)
         self.allow_fractional = allow_fractional
         self.min_trade_value = float(min_trade_value)
 
     def __log_and_print(self, msg):
-        with open(self.log_file, "a") as f:
-            f.write(f"{msg}\n")
+        self.journal.log(msg)
         #print(msg)
 
     def __get_yield_value(self, dd):
@@ -31,35 +38,31 @@ class Asset:
         return self.invested_qty * self.prices[t]
 
     def __get_buy(self, idx):
-        if idx >= len(self.buys):
-            raise IndexError(f"Index out of range when accessing {self.ticker} buys list: Index={idx} | Length={len(self.buys)}")
-        return self.buys[idx]
+        return self.buys.get(idx)
 
     def __update_buy(self, idx, item):
-        if idx >= len(self.buys):
-            raise IndexError(f"Index out of range when accessing {self.ticker} buys list: Index={idx} | Length={len(self.buys)}")
-        self.buys[idx] = item
+        self.buys.update_qty(idx, item['qty'])
 
     def __delete_buy(self, idx):
-        if idx >= len(self.buys):
-            raise IndexError(f"Index out of range when accessing {self.ticker} buys list: Index={idx} | Length={len(self.buys)}")
-        del self.buys[idx]
+        self.buys.remove(idx)
 
     def __create_buy(self, t, amount, fees, qty, dd):
-        return {
-            "index": t,
-            "ticker": self.ticker,
-            "price": self.prices[t],
-            "amount": amount,
-            "qty": qty,
-            "fees": fees,
-            "yield_value": self.__get_yield_value(dd),
-            "current_dd": dd,
-            "invested_eur": self.invested_eur,
-            "pending_until_max": max(self.max_eur - self.invested_eur, 0) if self.max_eur > 0 else -1
-        }
+        self.buys.append(
+            index=t,
+            price=self.prices[t],
+            amount=amount,
+            qty=qty,
+            fees=fees,
+            yield_value=self.__get_yield_value(dd),
+            current_dd=dd,
+            invested_eur=self.invested_eur,
+            pending_until_max=max(self.max_eur - self.invested_eur, 0) if self.max_eur > 0 else -1
+        )
+        return self.buys.get(len(self.buys) - 1)
 
     def __print_buy(self, buy_item):
+        if not self.journal.text:
+            return
         self.__log_and_print("************************ BUY ************************")
         self.__log_and_print(f"{'Ticker':<30}: {buy_item['ticker']:>10}")
         self.__log_and_print(f"{'Buy time':<30}: {buy_item['index']:>10}")
@@ -74,6 +77,8 @@ class Asset:
         self.__log_and_print("*****************************************************")
 
     def __print_sell(self, buy_item, sell_time, sell_price, final_amount, fees, final_yield):
+        if not self.journal.text:
+            return
         self.__log_and_print("************************ SELL ************************")
         self.__log_and_print(f"{'Ticker':<30}: {buy_item['ticker']:>10}")
         self.__log_and_print(f"{'Buy time':<30}: {buy_item['index']:>10}")
@@ -89,6 +94,8 @@ class Asset:
         self.__log_and_print("*****************************************************")
 
     def __print_partial_sell(self, buy_item, sell_time, sell_price, sell_qty, final_amount, fees, final_yield):
+        if not self.journal.text:
+            return
         self.__log_and_print("******************** PARTIAL SELL ********************")
         self.__log_and_print(f"{'Ticker':<30}: {buy_item['ticker']:>10}")
         self.__log_and_print(f"{'Buy time':<30}: {buy_item['index']:>10}")
@@ -114,9 +121,7 @@ class Asset:
         self.invested_value = self.prices[t] * self.invested_qty
 
         # Create and add buy
-        new_buy = self.__create_buy(t, amount_eur, fees, qty, dd)
-        self.buys.append(new_buy)
-        return new_buy
+        return self.__create_buy(t, amount_eur, fees, qty, dd)
 
     def __buy(self, amount_eur, t, dd):
         price = self.prices[t]
@@ -147,7 +152,7 @@ class Asset:
 
     @staticmethod
     def compute_fees(amount):
-        return max(amount * 0.0012, 1.0)
+        return max(amount * Asset.FEE_RATE, Asset.MIN_FEE)
 
     def get_ticker(self):
         return self.ticker
@@ -167,7 +172,7 @@ class Asset:
         return self.invested_qty * self.prices[t]
 
     def get_buys(self):
-        return self.buys
+        return self.buys.to_list()
 
     def get_extra_cash(self, t):
         self.invested_value = self.invested_qty * self.prices[t]
@@ -187,6 +192,7 @@ class Asset:
         # Print buy info
         self.__log_and_print(f"Using cash to buy {amount_eur}€ of {self.ticker}")
         self.__print_buy(buy_item)
+        self.journal.record(BUY, t, self.ticker, buy_item['price'], buy_item['qty'], buy_item['amount'], buy_item['fees'], buy_item['yield_value'])
 
         return True, buy_item['fees']
 
@@ -200,6 +206,8 @@ class Asset:
         # Print buy info
         self.__log_and_print(f"Rotating {amount_eur}€ from {from_ticker} to {self.ticker}")
         self.__print_buy(buy_item)
+        self.journal.record(ROTATE_BUY, t, self.ticker, buy_item['price'], buy_item['qty'], buy_item['amount'], buy_item['fees'],
+                            buy_item['yield_value'], from_ticker)
 
         return True, buy_item['fees']
 
@@ -251,6 +259,8 @@ class Asset:
             # Update fees
             sell_fees = self.compute_fees(sell_amount)
             total_fees += sell_fees
+            self.journal.record(SELL if to_ticker is None else ROTATE_SELL, t, self.ticker, current_price, sell_qty, sell_amount, sell_fees,
+                                final_yield, to_ticker or "")
 
             if sell_amount >= buy_value:
                 # Full buy sold
@@ -261,7 +271,6 @@ class Asset:
                 self.__log_and_print(f"Partial sell of {self.ticker} amount = {sell_amount}€ (shares value = {buy_value}€)")
                 self.__print_partial_sell(buy_item, t, current_price, sell_qty, sell_amount, sell_fees, final_yield)
                 buy_item['qty'] -= sell_qty
-                buy_item['amount'] = buy_item['qty'] * buy_item['price']
                 self.__update_buy(0, buy_item)
 
             pending_amount -= sell_amount
@@ -282,18 +291,52 @@ class Asset:
 
         self.__log_and_print(f"Selling {buy_amount}€ of {self.ticker} that has reached its yield target")
         self.__print_sell(buy_item, t, current_price, final_amount, fees, final_yield)
+        self.journal.record(SELL, t, self.ticker, current_price, buy_qty, final_amount, fees, final_yield)
 
         self.__delete_buy(idx)
 
         return final_amount, fees
 
+    def __find_next_day(self, condition, start, end):
+        # First day in [start, end) whose price meets the condition, end if there is none.
+        # Prices are checked in growing blocks, as the next event is usually close
+        block = 16
+        while start < end:
+            stop = min(end, start + block)
+            hits = np.flatnonzero(condition(self.prices[start:stop]))
+            if len(hits) > 0:
+                return start + int(hits[0])
+            start, block = stop, block * 2
+        return end
+
+    def get_next_extra_cash_day(self, start, end):
+        # Next day with extra cash to rotate (see get_extra_cash) while the holdings do not change
+        return self.__find_next_day(lambda prices: self.invested_qty * prices - self.max_eur > 0, start, end)
+
+    def get_next_buy_day(self, amount_eur, start, end):
+        # Next day a cash buy of amount_eur would succeed while the holdings do not change
+        if amount_eur <= 0.0 or amount_eur < self.min_trade_value:
+            return end
+        if 0 < self.max_eur < self.invested_eur + amount_eur:
+            return start  # cash_buy raises the same error on the first attempt
+        if self.allow_fractional:
+            return self.__find_next_day(lambda prices: prices > 0, start, end)
+        with np.errstate(divide="ignore"):
+            return self.__find_next_day(lambda prices: (prices > 0) & (np.floor(amount_eur / prices) >= 1), start, end)
+
+    def get_next_sell_day(self, start, end):
+        # Next day a buy may reach its yield target while the holdings do not change (a lower bound, the exact check
+        # is done by check_buys_yields on that day)
+        if self.yield_target == "none" or len(self.buys) == 0:
+            return end
+        min_price = self.buys.get_min_sell_price() * (1 - 1e-9)
+        return self.__find_next_day(lambda prices: ~(prices < min_price), start, end)
+
     def check_buys_yields(self, t):
         buys_ready = {}
-        current_price = self.prices[t]
-        if self.yield_target != "none":
-            for i, buy in enumerate(self.buys):
-                if (current_price / buy['price']) - 1 > buy['yield_value']:
-                    buys_ready[i] = buy
+        if self.yield_target != "none" and len(self.buys) > 0:
+            for i in self.buys.ready_to_sell(self.prices[t]):
+                buys_ready[int(i)] = self.__get_buy(int(i))
         return buys_ready
 
 
@@ -0,0 +1,379 @@
+import numpy as np
+
+from src.backtest.strategy.Strategy import Strategy
+from src.backtest.strategy.MarketData import MarketData
+from src.backtest.strategy.Asset import Asset
+from src.backtest.strategy.ThresholdsStrategy import ThresholdsStrategy
+from src.backtest.strategy.Journal import NullJournal
+from src.utils.leverage import sort_assets
+
+# Yield target kinds
+YIELD_NONE, YIELD_NUM, YIELD_AUTO = 0, 1, 2
+YIELD_KINDS = {"none": YIELD_NONE, "num": YIELD_NUM, "auto": YIELD_AUTO}
+
+SAVE_SLOT = 0  # Slot of the "x1_save" asset, the remaining slots are the leverage factors sorted
+MIN_TRADE_VALUE = 5.0
+INITIAL_LOTS_CAPACITY = 16
+
+
+class BatchThresholdsStrategy(Strategy):
+
+    """
+    Thresholds strategy simulating many configurations that share the same price path at once.
+
+    Wallet and lot state is kept in NumPy arrays with a leading config dimension, so every day is advanced for all the
+    configurations with a few vectorized operations. Operations are performed in the same order as in
+    ThresholdsStrategy, so results match the scalar engine.
+    """
+
+    def __init__(self, initial_capital, configs, input_dfs, debt_yield, allow_fractional=True, market_data=None, recorder=None):
+        super().__init__("Thresholds (batch)", initial_capital, input_dfs, market_data)
+        self.configs = list(configs)
+        self.debt_yield = debt_yield
+        self.allow_fractional = allow_fractional
+        self.recorder = recorder  # Optional daily cash and asset values of every configuration (see PortfolioRecorder)
+        self.slots = ["x1_save"] + sort_assets({asset for c in self.configs for _, asset in c["thresholds"].values()})
+        self.slot_index = {asset: i for i, asset in enumerate(self.slots)}
+        self._build_config_arrays()
+
+    def _build_config_arrays(self):
+        n_configs, n_slots = len(self.configs), len(self.slots)
+        n_thresholds = max(len(c["thresholds"]) for c in self.configs)
+
+        self.rotate = np.array([c["rotate"] for c in self.configs], dtype=bool)
+        self.risk_control = np.array([c["risk_control"] for c in self.configs], dtype=bool)
+        self.max_eur = np.full((n_configs, n_slots), -1.0)
+        self.yield_kind = np.full((n_configs, n_slots), YIELD_NONE, dtype=np.int8)
+        self.yield_value = np.full((n_configs, n_slots), -1.0)
+        self.prev_slot = np.full((n_configs, n_slots), -1, dtype=np.int64)
+        self.buy_order = np.full((n_configs, n_slots - 1), -1, dtype=np.int64)
+
+        # Entry thresholds padded with -inf, so the number of thresholds reached is the index of the first False
+        self.threshold_pcts = np.full((n_configs, n_thresholds + 1), -np.inf)
+
+        # Target investment per asset after reaching the first p thresholds (with or without x3 paused)
+        self.targets = np.zeros((2, n_configs, n_slots, n_thresholds + 1))
+        self.has_target = np.zeros((2, n_configs, n_slots, n_thresholds + 1), dtype=bool)
+
+        for c, config in enumerate(self.configs):
+            strategy = ThresholdsStrategy(self.initial_capital, config["thresholds"], {}, config["rotate"], config["risk_control"],
+                                          config["yield_targets"], config["yield_values"], self.debt_yield, journal=NullJournal())
+            lev_factors = sort_assets({"x1"} | set(strategy.assets))
+            for asset in strategy.assets:
+                s = self.slot_index[asset]
+                self.max_eur[c, s] = self.initial_capital * strategy.max_pcts[asset]
+                self.yield_kind[c, s] = YIELD_KINDS[config["yield_targets"][asset]]
+                if config["yield_targets"][asset] != "none":
+                    self.yield_value[c, s] = config["yield_values"][asset]
+                prev_factor = lev_factors[max(0, lev_factors.index(asset) - 1)]
+                if prev_factor in strategy.assets and prev_factor != asset and config["rotate"]:
+                    self.prev_slot[c, s] = self.slot_index[prev_factor]
+
+            order = list(dict.fromkeys(buy_type for _, buy_type in config["thresholds"].values()))
+            self.buy_order[c, :len(order)] = [self.slot_index[a] for a in order]
+
+            pcts = list(config["thresholds"])
+            self.threshold_pcts[c, :len(pcts)] = pcts
+            for paused in (0, 1):
+                strategy.pause_x3 = bool(paused)
+                for p in range(len(pcts) + 1):
+                    # A drawdown equal to the p-th threshold reaches exactly the thresholds before it
+                    dd = pcts[p] if p < len(pcts) else -np.inf
+                    for asset, amount in strategy.get_amounts_to_buy(dd).items():
+                        self.targets[paused, c, self.slot_index[asset], p] = amount
+                        self.has_target[paused, c, self.slot_index[asset], p] = True
+
+    def _init_state(self):
+        n_configs, n_slots = len(self.configs), len(self.slots)
+        self.cash = np.full(n_configs, float(self.initial_capital))
+        self.fees_paid = np.zeros(n_configs)
+        self.debt_cost = np.zeros(n_configs)
+        self.debt_time = np.zeros(n_configs, dtype=np.int64)
+        self.tuw = np.zeros(n_configs, dtype=np.int64)
+        self.invested_eur = np.zeros((n_configs, n_slots))
+        self.invested_qty = np.zeros((n_configs, n_slots))
+
+        # Lots ledger, lots are appended and flagged as not alive when they are sold, so their order is preserved
+        self.lot_price = np.ones((n_configs, n_slots, INITIAL_LOTS_CAPACITY))
+        self.lot_qty = np.zeros((n_configs, n_slots, INITIAL_LOTS_CAPACITY))
+        self.lot_amount = np.zeros((n_configs, n_slots, INITIAL_LOTS_CAPACITY))
+        self.lot_yield = np.zeros((n_configs, n_slots, INITIAL_LOTS_CAPACITY))
+        self.lot_alive = np.zeros((n_configs, n_slots, INITIAL_LOTS_CAPACITY), dtype=bool)
+        self.lot_count = np.zeros((n_configs, n_slots), dtype=np.int64)
+
+        # Values cached between days while no operation is performed
+        self.min_sell_price = np.zeros(n_slots)
+        self.min_sell_price_outdated = np.ones(n_slots, dtype=bool)
+        self.wallet_outdated = True
+        self.last_buy_check = None
+
+    def _wallet_changed(self):
+        self.wallet_outdated = True
+        self.last_buy_check = None
+
+    def _grow_lots(self):
+        pad = [(0, 0), (0, 0), (0, self.lot_alive.shape[2])]
+        self.lot_price = np.pad(self.lot_price, pad, constant_values=1.0)
+        self.lot_qty = np.pad(self.lot_qty, pad)
+        self.lot_amount = np.pad(self.lot_amount, pad)
+        self.lot_yield = np.pad(self.lot_yield, pad)
+        self.lot_alive = np.pad(self.lot_alive, pad)
+
+    def compute_x3_pause_series(self, market_data):
+        # The pause state only depends on the price path, so it is shared by every config with risk control
+        prices, _, dd, _ = market_data.get_arrays("x1")
+        pause = np.zeros(len(prices), dtype=bool)
+        config = next((c for c in self.configs if c["risk_control"]), None)
+        if config is None:
+            return pause
+        ma200, higher_low = market_data.get_risk_indicators("x1")
+        tracker = ThresholdsStrategy(self.initial_capital, config["thresholds"], {}, config["rotate"], config["risk_control"],
+                                     config["yield_targets"], config["yield_values"], self.debt_yield, journal=NullJournal())
+        return tracker.compute_x3_pause_series(dd, prices, ma200, higher_low)
+
+    # ---------- Vectorized asset operations (one entry per config) ----------
+
+    def _buy(self, c, s, amount, t, dd):
+        price = self.prices[s, t]
+        ok = (price > 0) & ~(amount < MIN_TRADE_VALUE)
+        amount = amount.copy()
+
+        # Adjust amount if fractional shares are not allowed ("x1_save" is always fractional)
+        if not self.allow_fractional:
+            whole = ok & (s != SAVE_SLOT)
+            qty = np.floor(amount[whole] / price[whole])
+            ok[whole] = qty > 0
+            amount[whole] = qty * price[whole]
+
+        c, s, amount, price = c[ok], s[ok], amount[ok], price[ok]
+        fees = np.maximum(amount * Asset.FEE_RATE, Asset.MIN_FEE)
+        qty = amount / price
+        self.invested_eur[c, s] += amount
+        self.invested_qty[c, s] += qty
+
+        # Append new lots
+        if len(c) > 0 and self.lot_count[c, s].max() >= self.lot_alive.shape[2]:
+            self._grow_lots()
+        pos = self.lot_count[c, s]
+        kind = self.yield_kind[c, s]
+        self.lot_price[c, s, pos] = price
+        self.lot_qty[c, s, pos] = qty
+        self.lot_amount[c, s, pos] = amount
+        self.lot_yield[c, s, pos] = np.where(kind == YIELD_AUTO, (1 / (1 + dd)) - 1, self.yield_value[c, s])
+        self.lot_alive[c, s, pos] = True
+        self.lot_count[c, s] += 1
+        self.min_sell_price_outdated[s] = True
+        if len(c) > 0:
+            self._wallet_changed()
+
+        all_fees = np.zeros(len(ok))
+        all_fees[ok] = fees
+        return ok, all_fees
+
+    def _sell_amount(self, c, s, amount, t):
+        # Sell lots in FIFO order until the amount is reached
+        pending = amount.copy()
+        total_fees = np.zeros(len(c))
+        active = np.ones(len(c), dtype=bool)
+        while True:
+            alive = self.lot_alive[c, s, :]
+            active &= (pending > 0.0) & alive.any(axis=1)
+            if not active.any():
+                break
+            i = np.flatnonzero(active)
+            ci, si = c[i], s[i]
+            head = alive[i].argmax(axis=1)
+            price = self.prices[si, t]
+            lot_price, lot_qty = self.lot_price[ci, si, head], self.lot_qty[ci, si, head]
+
+            buy_value = price * lot_qty
+            sell_amount = np.minimum(buy_value, pending[i])
+            sell_qty = np.zeros(len(i))
+            np.divide(sell_amount, price, out=sell_qty, where=price > 0)
+            if not self.allow_fractional:
+                sell_qty = np.floor(sell_qty)
+                too_small = sell_qty <= 0
+                active[i[too_small]] = False
+                keep = ~too_small
+                i, ci, si, head, price = i[keep], ci[keep], si[keep], head[keep], price[keep]
+                lot_price, lot_qty, buy_value, sell_qty = lot_price[keep], lot_qty[keep], buy_value[keep], sell_qty[keep]
+                sell_amount = sell_qty * price
+
+            self.invested_eur[ci, si] -= sell_qty * lot_price
+            self.invested_qty[ci, si] -= sell_qty
+            total_fees[i] += np.maximum(sell_amount * Asset.FEE_RATE, Asset.MIN_FEE)
+
+            full = sell_amount >= buy_value
+            self.lot_alive[ci[full], si[full], head[full]] = False
+            partial = ~full
+            new_qty = lot_qty[partial] - sell_qty[partial]
+            self.lot_qty[ci[partial], si[partial], head[partial]] = new_qty
+            self.lot_amount[ci[partial], si[partial], head[partial]] = new_qty * lot_price[partial]
+
+            pending[i] -= sell_amount
+            self._wallet_changed()
+
+        return amount - pending, total_fees
+
+    # ---------- Daily steps ----------
+
+    def buy_or_rotate(self, t, current_dd, paused):
+        n_configs = len(self.configs)
+        reached = (self.threshold_pcts > current_dd).argmin(axis=1)
+
+        # Nothing to buy if the thresholds reached and the wallet are the same as in the last check without buys
+        if self.last_buy_check is not None:
+            last_reached, last_paused = self.last_buy_check
+            if paused == last_paused and np.array_equal(reached, last_reached):
+                return
+
+        table = np.where(self.risk_control & paused, 1, 0)
+        targets = self.targets[table, np.arange(n_configs), :, reached]
+        has_target = self.has_target[table, np.arange(n_configs), :, reached]
+        if not (has_target & (targets > self.invested_eur)).any():
+            self.last_buy_check = (reached, paused)
+            return
+
+        for k in range(self.buy_order.shape[1]):
+            slot = self.buy_order[:, k]
+            c = np.flatnonzero(slot >= 0)
+            s = slot[c]
+            pending = has_target[c, s] & (targets[c, s] > self.invested_eur[c, s])
+            c, s = c[pending], s[pending]
+            if len(c) == 0:
+                continue
+            amount = targets[c, s] - self.invested_eur[c, s]
+
+            # FIRST, TRY TO ROTATE
+            prev = self.prev_slot[c, s]
+            r = np.flatnonzero(prev >= 0)
+            if len(r) > 0:
+                rc, rs, rp = c[r], s[r], prev[r]
+                extra = np.maximum(self.invested_qty[rc, rp] * self.prices[rp, t] - self.max_eur[rc, rp], 0)
+                go = extra > 0.0
+                r, rc, rs, rp = r[go], rc[go], rs[go], rp[go]
+                amount_to_rotate = np.minimum(amount[r], extra[go])
+                amount_rotated, sell_fees = self._sell_amount(rc, rp, amount_to_rotate, t)
+                success, buy_fees = np.zeros(len(r), dtype=bool), np.zeros(len(r))
+                sold = amount_rotated > 0.0
+                success[sold], buy_fees[sold] = self._buy(rc[sold], rs[sold], amount_to_rotate[sold], t, current_dd)
+                amount[r[success]] -= amount_rotated[success]
+                self.fees_paid[rc] += sell_fees + buy_fees
+
+            # BUY WITH CASH
+            amount = np.minimum(amount, self.cash[c])
+            go = amount > 0.0
+            c, s, amount = c[go], s[go], amount[go]
+            over = (0 < self.max_eur[c, s]) & (self.max_eur[c, s] < self.invested_eur[c, s] + amount)
+            if over.any():
+                asset = self.slots[s[over][0]]
+                raise ValueError(f"Trying to buy more than {self.max_eur[c, s][over][0]} of S&P500 {asset} using cash. Aborting...")
+            success, fees = self._buy(c, s, amount, t, current_dd)
+            self.cash[c[success]] -= amount[success]
+            self.fees_paid[c[success]] += fees[success]
+
+    def sell_or_rotate(self, t, current_dd):
+        for s in range(1, len(self.slots)):
+            alive = self.lot_alive[:, s, :]
+
+            # Cheap check first: a lot can only be sold when the price is above its target price
+            if self.min_sell_price_outdated[s]:
+                sellable = alive & (self.yield_kind[:, s] != YIELD_NONE)[:, None]
+                self.min_sell_price[s] = np.min(self.lot_price[:, s, :] * (1 + self.lot_yield[:, s, :]), where=sellable, initial=np.inf)
+                self.min_sell_price_outdated[s] = False
+            if self.prices[s, t] < self.min_sell_price[s] * (1 - 1e-9):
+                continue
+
+            # Check if the criteria to sell is matched
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ready = alive & ((self.prices[s, t] / self.lot_price[:, s, :]) - 1 > self.lot_yield[:, s, :])
+            ready &= (self.yield_kind[:, s] != YIELD_NONE)[:, None]
+            if not ready.any():
+                continue
+
+            # Execute sells in the order lots were bought
+            rank = np.cumsum(ready, axis=1) - 1
+            for r in range(int(rank.max()) + 1):
+                c, pos = np.nonzero(ready & (rank == r))
+                price = self.prices[s, t]
+                lot_qty, lot_amount = self.lot_qty[c, s, pos], self.lot_amount[c, s, pos]
+                amount = price * lot_qty
+                self.invested_eur[c, s] -= lot_amount
+                self.invested_qty[c, s] -= lot_qty
+                self.fees_paid[c] += np.maximum(amount * Asset.FEE_RATE, Asset.MIN_FEE)
+                self.lot_alive[c, s, pos] = False
+                self.min_sell_price_outdated[s] = True
+                self._wallet_changed()
+
+                # Rotate to the previous leverage factor if possible
+                prev = self.prev_slot[c, s]
+                rot = prev >= 0
+                success, fees = self._buy(c[rot], prev[rot], amount[rot], t, current_dd)
+                self.fees_paid[c[rot][success]] += fees[success]
+                self.cash[c[rot][~success]] += amount[rot][~success]
+
+                # Otherwise, save cash until the initial capital is recovered and invest the earnings in x1
+                c, amount = c[~rot], amount[~rot]
+                new_cash = np.minimum(amount, np.maximum(self.initial_capital - self.cash[c], 0.0))
+                earnings = amount - new_cash
+                self.cash[c] += new_cash
+                e = earnings > 0.0
+                success, fees = self._buy(c[e], np.full(e.sum(), SAVE_SLOT), earnings[e], t, current_dd)
+                self.fees_paid[c[e][success]] += fees[success]
+                self.cash[c[e][~success]] += amount[e][~success]
+
+    def compute_debt_costs(self):
+        # Debt and value only change when an operation is performed
+        if self.wallet_outdated:
+            owed_money = self.initial_capital - self.cash
+            self.with_debt = owed_money > 0.0
+            self.daily_debt_cost = np.where(self.with_debt, owed_money * self.debt_yield / 360, 0.0)
+            self.under_water = self.get_total_value() < self.initial_capital
+            self.wallet_outdated = False
+
+        self.debt_time += self.with_debt
+        if self.debt_yield > 0.0:
+            self.debt_cost += self.daily_debt_cost
+        self.tuw += self.under_water
+
+    def get_total_value(self):
+        # Same summation order as Wallet.get_total_value (x1_save first, then leverage factors sorted)
+        assets_value = 0
+        for s in range(len(self.slots)):
+            assets_value = assets_value + self.invested_qty[:, s] * self.prices[s, -1]
+        return self.cash + assets_value
+
+    def backtest(self):
+        market_data = self.market_data if self.market_data is not None else MarketData(self.input_dfs)
+        prices, _, dd, _ = market_data.get_arrays("x1")
+        self.prices = np.stack([prices] + [market_data.frames[asset].price for asset in self.slots[1:]])
+        pause = self.compute_x3_pause_series(market_data)
+
+        self._init_state()
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.start(market_data.days, dict(zip(self.slots, self.prices)), self.initial_capital, len(self.configs))
+        for t in range(len(prices)):
+            current_dd = dd[t]
+            self.buy_or_rotate(t, current_dd, pause[t])
+            self.sell_or_rotate(t, current_dd)
+            self.compute_debt_costs()
+            if recorder is not None:
+                recorder.record_arrays(t, self.cash, self.invested_qty)
+
+        gross_value = self.get_total_value()
+        results = [
+            {
+                "cash": self.cash[c],
+                "fees_paid": self.fees_paid[c],
+                "debt_cost": self.debt_cost[c],
+                "debt_time": int(self.debt_time[c]),
+                "tuw": int(self.tuw[c]),
+                "gross_value": gross_value[c],
+            }
+            for c in range(len(self.configs))
+        ]
+        if recorder is not None:
+            for c, result in enumerate(results):
+                result["portfolio"] = recorder.report(c)
+        return results
@@ -0,0 +1,89 @@
+import cProfile
+import io
+import pstats
+from time import perf_counter
+
+# Strategy methods timed as phases of a backtest
+STRATEGY_PHASES = ["update_x3_pause_state", "compute_x3_pause_series", "buy_or_rotate", "sell_or_rotate", "compute_debt_costs", "get_next_event_day"]
+# Journal methods called by the assets, timed as "journal.<method>"
+JOURNAL_PHASES = ["log", "record", "flush"]
+
+
+class Instrumentation:
+
+    """
+    Opt-in counters of a backtest: wall time and calls of every phase, number of buys, sells and rotations, and
+    high-water mark of the lots held by every asset. With ``profile``, the whole run is also captured with cProfile.
+
+    Phases are timed by wrapping the strategy and journal methods only while an instrumented backtest runs, a backtest
+    without instrumentation runs the original methods. Phase times are inclusive: the journal time spent inside
+    buy_or_rotate is counted in both phases.
+    """
+
+    def __init__(self, profile=False, profile_lines=40):
+        self.profile = profile
+        self.profile_lines = profile_lines
+        self.times = {}
+        self.calls = {}
+        self.total_time = 0.0
+        self.profile_text = None
+        self._wrapped = []
+        self._profiler = None
+        self._start = 0.0
+
+    def _wrap(self, obj, attr, phase):
+        method = getattr(obj, attr)
+        times, calls = self.times, self.calls
+        times[phase], calls[phase] = 0.0, 0
+
+        def timed(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[phase] += perf_counter() - t0
+                calls[phase] += 1
+
+        setattr(obj, attr, timed)
+        self._wrapped.append((obj, attr))
+
+    def start(self, strategy):
+        self.times, self.calls = {}, {}
+        self.profile_text = None
+        for name in STRATEGY_PHASES:
+            if hasattr(strategy, name):
+                self._wrap(strategy, name, name)
+        for name in JOURNAL_PHASES:
+            self._wrap(strategy.journal, name, f"journal.{name}")
+
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = perf_counter()
+
+    def stop(self):
+        self.total_time = perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(self.profile_lines)
+            self.profile_text = stream.getvalue()
+            self._profiler = None
+
+        # Remove the instance wrappers, so the class methods are used again
+        for obj, attr in self._wrapped:
+            delattr(obj, attr)
+        self._wrapped = []
+
+    def report(self, result):
+        """Counters of the last backtest, ``result`` is the dict returned by the backtest."""
+        phases = {phase: {"time_s": self.times[phase], "calls": self.calls[phase]} for phase in self.times if self.calls[phase] > 0}
+        return {
+            "total_time_s": self.total_time,
+            "phases": phases,
+            "buys": len(result["buy_tracker"]),
+            "sells": len(result["sell_tracker"]),
+            "rotations": len(result["rotate_tracker"]),
+            "max_lots": {asset: result[asset].buys.max_size for asset in result["assets"]},
+            "profile": self.profile_text,
+        }
@@ -0,0 +1,135 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+
+# Trade events recorded by assets
+BUY, SELL, ROTATE_BUY, ROTATE_SELL = "BUY", "SELL", "ROTATE_BUY", "ROTATE_SELL"
+
+LOGS_DIR = "logs"
+MAX_RUN_LOGS = 20  # Run logs kept in LOGS_DIR per prefix, the oldest ones are removed when a new path is created
+
+
+def prune_run_logs(prefix="thresholds", keep=MAX_RUN_LOGS):
+    # Remove the oldest "<prefix>_*.log" files, so that at most ``keep`` of them remain
+    if not os.path.isdir(LOGS_DIR):
+        return
+    paths = [os.path.join(LOGS_DIR, f) for f in os.listdir(LOGS_DIR) if f.startswith(f"{prefix}_") and f.endswith(".log")]
+    for path in sorted(paths, key=os.path.getmtime)[:max(len(paths) - keep, 0)]:
+        os.remove(path)
+
+
+def new_run_log_path(prefix="thresholds"):
+    """Unique log path for a session, so concurrent sessions do not write to the same file (older run logs are pruned)."""
+    prune_run_logs(prefix, MAX_RUN_LOGS - 1)
+    return os.path.join(LOGS_DIR, f"{prefix}_{uuid.uuid4().hex[:12]}.log")
+
+
+class Journal:
+
+    """Journal of the operations performed by a backtest. This base journal discards everything (batch evaluation)."""
+
+    text = False  # True if the journal keeps human-readable log lines
+
+    def log(self, msg):
+        pass
+
+    def record(self, event, t, ticker, price, qty, amount, fees, yield_value, counterpart=""):
+        pass
+
+    def clear(self):
+        pass
+
+    def flush(self):
+        pass
+
+
+class NullJournal(Journal):
+    pass
+
+
+class TextJournal(Journal):
+
+    """In-memory buffer of log lines, written to ``path`` (if any) every ``buffer_lines`` lines and when flushed."""
+
+    text = True
+
+    def __init__(self, path=None, buffer_lines=10_000):
+        self.path = path
+        self.buffer_lines = buffer_lines
+        self.lines = []
+        self.pending = 0  # Lines not written to the file yet
+        self.truncate = True  # The file is overwritten on the first write after a clear
+
+    def log(self, msg):
+        self.lines.append(msg)
+        self.pending += 1
+        if self.path is not None and self.pending >= self.buffer_lines:
+            self.flush()
+
+    def clear(self):
+        self.lines = []
+        self.pending = 0
+        self.truncate = True
+
+    def flush(self):
+        if self.path is None or (self.pending == 0 and not self.truncate):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w" if self.truncate else "a") as f:
+            for line in self.lines[len(self.lines) - self.pending:]:
+                f.write(f"{line}\n")
+        self.pending = 0
+        self.truncate = False
+
+    def get_text(self):
+        return "\n".join(self.lines)
+
+
+class TradeJournal(Journal):
+
+    """
+    Columnar journal with one row per buy, sell or rotation, can be saved to a binary ``.npz`` file.
+    ``yield_value`` is the yield target for buys and the final yield for sells.
+    """
+
+    COLUMNS = ["event", "t", "ticker", "counterpart", "price", "qty", "amount", "fees", "yield_value"]
+
+    def __init__(self, path=None):
+        self.path = path
+        self.clear()
+
+    def record(self, event, t, ticker, price, qty, amount, fees, yield_value, counterpart=""):
+        for name, value in zip(self.COLUMNS, (event, t, ticker, counterpart, price, qty, amount, fees, yield_value)):
+            self.columns[name].append(value)
+
+    def clear(self):
+        self.columns = {name: [] for name in self.COLUMNS}
+
+    def flush(self):
+        if self.path is not None:
+            self.save(self.path)
+
+    def __len__(self):
+        return len(self.columns["t"])
+
+    def to_arrays(self):
+        return {
+            "event": np.array(self.columns["event"], dtype=str),
+            "t": np.array(self.columns["t"], dtype=np.int64),
+            "ticker": np.array(self.columns["ticker"], dtype=str),
+            "counterpart": np.array(self.columns["counterpart"], dtype=str),
+            **{name: np.array(self.columns[name], dtype=np.float64) for name in ["price", "qty", "amount", "fees", "yield_value"]},
+        }
+
+    def to_frame(self):
+        return pd.DataFrame(self.to_arrays(), columns=self.COLUMNS)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, **self.to_arrays())
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            return pd.DataFrame({name: data[name] for name in TradeJournal.COLUMNS})
@@ -0,0 +1,145 @@
+import heapq
+import numpy as np
+
+INITIAL_CAPACITY = 16
+NO_LOTS = np.empty(0, dtype=np.int64)
+
+
+class LotLedger:
+
+    """
+    Purchase lots of an asset stored as a structure of arrays, in the order they were bought.
+
+    Lots are addressed by their position among the lots still held (0 is the oldest one). Removing the oldest lot only
+    moves the head of the ledger, other removals just flag the lot as sold and the storage is compacted when sold lots
+    become the majority, so removals are amortized O(1).
+
+    The sell trigger price of every lot, ``price * (1 + yield_value)``, is kept in a min-heap, so checking if any lot
+    reached its yield target is a peek at the top of the heap.
+    """
+
+    FIELDS = {
+        "index": np.int64,
+        "price": np.float64,
+        "amount": np.float64,
+        "qty": np.float64,
+        "fees": np.float64,
+        "yield_value": np.float64,
+        "current_dd": np.float64,
+        "invested_eur": np.float64,
+        "pending_until_max": np.float64,
+    }
+
+    def __init__(self, ticker, capacity=INITIAL_CAPACITY):
+        self.ticker = ticker
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS.items()}
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.start = 0  # First slot that may hold a lot
+        self.end = 0  # Next free slot
+        self.size = 0  # Number of lots held
+        self.max_size = 0  # High-water mark of the lots held
+
+        # Min-heap of (sell trigger price, slot), entries of sold lots are dropped when they reach the top
+        self.triggers = []
+
+    def __len__(self):
+        return self.size
+
+    def __slot(self, idx):
+        if idx < 0 or idx >= self.size:
+            raise IndexError(f"Index out of range when accessing {self.ticker} buys list: Index={idx} | Length={self.size}")
+        if self.end - self.start == self.size:
+            return self.start + idx
+        return self.start + int(np.flatnonzero(self.alive[self.start:self.end])[idx])
+
+    def __resize(self):
+        # Move held lots to the beginning of the storage and double it if it is still more than half full
+        slots = np.flatnonzero(self.alive[self.start:self.end]) + self.start
+        capacity = len(self.alive) * 2 if self.size * 2 > len(self.alive) else len(self.alive)
+        for name, column in self.columns.items():
+            new_column = np.zeros(capacity, dtype=column.dtype)
+            new_column[:self.size] = column[slots]
+            self.columns[name] = new_column
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:self.size] = True
+        self.start, self.end = 0, self.size
+
+        # Slots have changed, rebuild the triggers heap
+        triggers = self.columns["price"][:self.size] * (1 + self.columns["yield_value"][:self.size])
+        self.triggers = list(zip(triggers.tolist(), range(self.size)))
+        heapq.heapify(self.triggers)
+
+    def append(self, **lot):
+        if self.end == len(self.alive):
+            self.__resize()
+        for name, column in self.columns.items():
+            column[self.end] = lot[name]
+        self.alive[self.end] = True
+        heapq.heappush(self.triggers, (float(lot["price"] * (1 + lot["yield_value"])), self.end))
+        self.end += 1
+        self.size += 1
+        if self.size > self.max_size:
+            self.max_size = self.size
+
+    def get(self, idx):
+        slot = self.__slot(idx)
+        lot = {name: column[slot] for name, column in self.columns.items()}
+        lot["ticker"] = self.ticker
+        return lot
+
+    def get_value(self, idx, name):
+        return self.columns[name][self.__slot(idx)]
+
+    def update_qty(self, idx, qty):
+        slot = self.__slot(idx)
+        self.columns["qty"][slot] = qty
+        self.columns["amount"][slot] = qty * self.columns["price"][slot]
+
+    def remove(self, idx):
+        slot = self.__slot(idx)
+        self.alive[slot] = False
+        self.size -= 1
+
+        # Skip sold lots at the head (FIFO removals)
+        while self.start < self.end and not self.alive[self.start]:
+            self.start += 1
+        if self.size == 0:
+            self.start = self.end = 0
+            self.triggers = []  # Slots will be reused
+        elif (self.end - self.start) > 2 * self.size and self.end - self.start > INITIAL_CAPACITY:
+            self.__resize()
+
+    def get_min_sell_price(self):
+        """Lowest sell trigger price of the lots held, inf if there are none."""
+        while self.triggers and not self.alive[self.triggers[0][1]]:
+            heapq.heappop(self.triggers)
+        return self.triggers[0][0] if self.triggers else np.inf
+
+    def ready_to_sell(self, current_price):
+        """Positions of the lots whose yield at ``current_price`` is over their yield target, in ascending order."""
+        # The margin keeps the trigger check on the safe side of the rounding of the exact yield check
+        if current_price < self.get_min_sell_price() * (1 - 1e-9):
+            return NO_LOTS
+
+        # Visit the heap nodes whose trigger is reached (the children of a node not reached are not reached either)
+        price, yield_value = self.columns["price"], self.columns["yield_value"]
+        slots = []
+        pending = [0]
+        while pending:
+            i = pending.pop()
+            trigger, slot = self.triggers[i]
+            if current_price < trigger * (1 - 1e-9):
+                continue
+            if self.alive[slot] and (current_price / price[slot]) - 1 > yield_value[slot]:
+                slots.append(slot)
+            pending.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(self.triggers))
+
+        if not slots:
+            return NO_LOTS
+        slots = np.sort(np.array(slots, dtype=np.int64))
+        if self.end - self.start == self.size:
+            return slots - self.start
+        return (self.alive[self.start:self.end].cumsum() - 1)[slots - self.start]
+
+    def to_list(self):
+        return [self.get(i) for i in range(self.size)]
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from src.backtest.strategy.MarketFrame import MarketFrame
+from src.backtest.strategy.Strategy import Strategy
+
+
+class MarketData:
+
+    """Per-asset MarketFrames (prices, ATH, drawdowns and max drawdowns) of a period, computed once and shared by strategies."""
+
+    def __init__(self, input_dfs, frames=None):
+        self.input_dfs = input_dfs
+        if frames is None:
+            days = input_dfs["x1"]['Days'].to_numpy(dtype=np.int64)
+            frames = {asset: MarketFrame.from_prices(days, asset_df['Adj Close'].to_numpy(dtype=np.float64)) for asset, asset_df in input_dfs.items()}
+        self.frames = frames
+        self.days = frames["x1"].days
+        self.risk_indicators = {}
+
+    @classmethod
+    def from_arrays(cls, dates, days, prices, frames=None):
+        # Market data of price arrays ({asset: prices}) sharing dates and days, wrapped in minimal DataFrames: strategies
+        # only need the assets from them and the summary metrics the x1 dates, days and prices
+        days = np.asarray(days, dtype=np.int64)
+        input_dfs = {asset: pd.DataFrame({"Date": dates, "Days": days, "Adj Close": asset_prices}, copy=False) for asset, asset_prices in prices.items()}
+        if frames is None:
+            frames = {asset: MarketFrame.from_prices(days, asset_prices) for asset, asset_prices in prices.items()}
+        return cls(input_dfs, frames)
+
+    def get_risk_indicators(self, asset="x1"):
+        # 200-day moving average and higher low flags used by the risk control, computed on first use
+        if asset not in self.risk_indicators:
+            prices = self.frames[asset].price
+            self.risk_indicators[asset] = (Strategy.compute_moving_average(prices), Strategy.compute_higher_lows(prices))
+        return self.risk_indicators[asset]
+
+    def get_arrays(self, asset):
+        return self.frames[asset].arrays()
+
+    def subset(self, assets):
+        # Share the already computed frames with a view restricted to x1 and the given assets
+        keys = ["x1"] + [a for a in assets if a != "x1"]
+        return MarketData({k: self.input_dfs[k] for k in keys}, {k: self.frames[k] for k in keys})
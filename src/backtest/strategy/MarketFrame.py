@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class MarketFrame:
+
+    """
+    Days, prices, ATH, drawdowns and max drawdowns per cycle of one asset over a period, as plain NumPy arrays.
+
+    A drawdown cycle starts on the day the price gets back to its ATH after a drawdown, the max drawdown is the running
+    minimum of the drawdown since the start of the cycle.
+    """
+
+    __slots__ = ("days", "price", "ath", "dd", "dmax")
+
+    def __init__(self, days, price, ath, dd, dmax):
+        self.days = days
+        self.price = price
+        self.ath = ath
+        self.dd = dd
+        self.dmax = dmax
+
+    @classmethod
+    def from_prices(cls, days, price):
+        return cls(days, *cls.drawdowns(price))
+
+    def arrays(self):
+        return self.price, self.ath, self.dd, self.dmax
+
+    @staticmethod
+    def drawdowns(price):
+        """Prices, ATH, drawdowns and max drawdowns per cycle of a price array (the prices are not copied)."""
+        price = np.asarray(price, dtype=np.float64)
+        ath = np.maximum.accumulate(price)
+
+        # dd is 0.0 only on an ATH, a cycle starts on an ATH reached from a drawdown (or on the first day)
+        dd = price / ath - 1.0
+        new_cycle = dd == 0.0
+        new_cycle[1:] &= dd[:-1] != 0.0
+        return price, ath, dd, MarketFrame.segmented_min(dd, np.flatnonzero(new_cycle))
+
+    @staticmethod
+    def segmented_min(values, starts):
+        """
+        Running minimum of ``values`` restarting at every index of ``starts`` (sorted), in a single accumulate.
+
+        NumPy orders complex numbers by real part first, then imaginary part: with minus the segment number as real
+        part, the first value of a segment is below everything before it and the minimum restarts there, while the
+        values themselves are carried unchanged (exactly) in the imaginary part.
+        """
+        keys = np.zeros(len(values), dtype=np.float64)
+        keys[starts[starts > 0]] = -1.0
+        z = np.empty(len(values), dtype=np.complex128)
+        z.real = np.cumsum(keys, out=keys)
+        z.imag = values
+        return np.minimum.accumulate(z).imag.copy()
@@ -0,0 +1,92 @@
+import numpy as np
+
+NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+class PortfolioRecorder:
+
+    """
+    Opt-in daily state of a backtest: cash and quantity held of every asset at the end of the day, written into arrays
+    preallocated when the backtest starts. With ``every`` > 1 only one day out of ``every`` (and the last day) is kept.
+
+    The scalar engine records its wallet (a span of days at once when the event-driven loop skips idle days, the
+    wallet does not change in between), the batch engine records every configuration at once: arrays then have a
+    config dimension after the row one. Asset values, owed money (initial capital not in cash) and total value are
+    derived from the prices in ``report``, so recording a day does not touch the prices.
+    """
+
+    END = np.iinfo(np.int64).max  # next_t once every row is recorded
+
+    def __init__(self, every=1):
+        if every < 1:
+            raise ValueError(f"Portfolio record step must be at least 1 day ({every})")
+        self.every = int(every)
+        self.rows = NO_ROWS
+        self.days = NO_ROWS
+        self.prices = {}
+        self.initial_capital = 0.0
+        self.cash = np.zeros(0)
+        self.qty = np.zeros((0, 0))
+        self.row = 0
+        self.next_t = 0
+
+    def start(self, days, prices, initial_capital, n_configs=None):
+        """Preallocate the rows of a backtest over ``days`` holding the assets of ``prices`` ({asset: prices})."""
+        n_days = len(days)
+        rows = np.arange(0, n_days, self.every)
+        if n_days > 0 and rows[-1] != n_days - 1:
+            rows = np.append(rows, n_days - 1)
+        self.rows, self.days = rows, np.asarray(days)[rows]
+        self.prices = prices
+        self.initial_capital = initial_capital
+
+        shape = (len(rows),) if n_configs is None else (len(rows), n_configs)
+        self.cash = np.zeros(shape)
+        self.qty = np.zeros(shape + (len(prices),))
+        self._move_to(0)
+
+    def _move_to(self, row):
+        self.row = row
+        self.next_t = int(self.rows[row]) if row < len(self.rows) else self.END
+
+    def record_wallet(self, wallet, t, stop=None):
+        # Wallet state at the end of day t, unchanged until day stop (excluded, t + 1 by default)
+        stop = t + 1 if stop is None else stop
+        if stop <= self.next_t:
+            return
+
+        row = self.row
+        if stop == self.next_t + 1:
+            # A single day, written element by element into the preallocated row
+            end = row + 1
+            self.cash[row] = wallet.cash
+            for i, held in enumerate(wallet.assets.values()):
+                self.qty[row, i] = held.invested_qty
+        else:
+            end = int(np.searchsorted(self.rows, stop))
+            self.cash[row:end] = wallet.cash
+            self.qty[row:end] = [held.invested_qty for held in wallet.assets.values()]
+        self.row = end
+        self.next_t = int(self.rows[end]) if end < len(self.rows) else self.END
+
+    def record_arrays(self, t, cash, invested_qty):
+        # Batch engine state at the end of day t: cash (configs) and invested quantities (configs x assets)
+        if t != self.next_t:
+            return
+        self.cash[self.row] = cash
+        self.qty[self.row] = invested_qty
+        self._move_to(self.row + 1)
+
+    def report(self, config=None):
+        """Recorded rows and days with the cash, owed money, value of every asset and total value (of a config of a batch)."""
+        cash = self.cash if config is None else self.cash[:, config]
+        qty = self.qty if config is None else self.qty[:, config]
+        values = {asset: qty[:, i] * prices[self.rows] for i, (asset, prices) in enumerate(self.prices.items())}
+        return {
+            "rows": self.rows,
+            "days": self.days,
+            "cash": cash,
+            "owed": np.maximum(self.initial_capital - cash, 0.0),
+            "values": values,
+            "total": cash + sum(values.values()),
+        }
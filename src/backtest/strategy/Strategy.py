@@ -1,14 +1,18 @@
 import numpy as np
 
+from src.backtest.strategy.MarketFrame import MarketFrame
+from src.utils.leverage import sort_assets
+
 class Strategy:
 
     """Base class for all strategies."""
 
-    def __init__(self, name, initial_capital, input_dfs):
+    def __init__(self, name, initial_capital, input_dfs, market_data=None):
         self.name = name
         self.initial_capital = initial_capital
         self.input_dfs = input_dfs
-        self.lev_factors = sorted(list(input_dfs.keys()))
+        self.market_data = market_data  # Optional precomputed MarketData shared between strategies
+        self.lev_factors = sort_assets(input_dfs.keys())
 
     def set_initial_capital(self, value):
         if value < 0:
@@ -20,25 +24,44 @@ class Strategy:
 
     @staticmethod
     def compute_drawdowns(df):
-        price = df['Adj Close'].to_numpy(dtype=np.float64)
-        ath = np.maximum.accumulate(price)
+        # Prices, ATH, drawdowns and max drawdowns per drop cycle (see MarketFrame)
+        return MarketFrame.drawdowns(df['Adj Close'].to_numpy(dtype=np.float64))
+
+    @staticmethod
+    def compute_moving_average(prices, window=200):
+        # Mean of prices[max(0, t-window):t+1] for every t, using cumulative sums
+        csum = np.concatenate(([0.0], np.cumsum(prices)))
+        end = np.arange(1, len(prices) + 1)
+        start = np.maximum(0, end - 1 - window)
+        ma = (csum[end] - csum[start]) / (end - start)
 
-        # dd will have negative values or 0.0, which means this price is an ATH, as price/ATH - 1 = 0 only if price=ATH
-        dd = price / ath - 1.0
-        dd_df = df["Adj Close"].div(ath).sub(1.0)
+        # Cumulative sums round differently than a direct mean, recompute exactly the values too close to the price
+        # so comparisons against the price give the same result
+        close = np.flatnonzero(np.abs(prices - ma) <= 1e-9 * np.abs(csum[end]))
+        for t in close:
+            ma[t] = prices[start[t]:t+1].mean()
 
-        # Take values equal to 0 (ATH), that come from a previous non-zero value (drowdown), which means a recover drom a drodown
-        # This df will contain True when we arrive an ATH from a previous dd
-        val_is_zero = np.where(dd == 0.0, True, False)
-        shifted_array = np.append(np.inf, dd[:-1])
-        previous_val_not_zero = np.where(shifted_array != 0.0, True, False)
-        new_ath = np.logical_and(val_is_zero, previous_val_not_zero)
+        return ma
+
+    @staticmethod
+    def compute_higher_lows(prices, lookback=120):
+        # True at t if the last two local minima inside prices[t-lookback:t] are ascending (and t >= lookback + 2)
+        n = len(prices)
+        higher_low = np.zeros(n, dtype=bool)
+        if n < lookback + 3:
+            return higher_low
 
-        # Now we True values can be summed up accumulating the sum, then one True will mean first drop cycle, two True values second drop cycle,...
-        # This way we have different cicle ids for each drop cycle
-        cycle_id = np.cumsum(new_ath)
+        # Local minima of the whole series (lower than the previous and the next prices)
+        is_min = np.zeros(n, dtype=bool)
+        is_min[1:-1] = (prices[1:-1] < prices[:-2]) & (prices[1:-1] < prices[2:])
+        min_idx = np.flatnonzero(is_min)
+        ascending = np.zeros(len(min_idx), dtype=bool)
+        ascending[1:] = prices[min_idx[1:]] > prices[min_idx[:-1]]
 
-        # Group by drop cycle and get the max drop (min value) acumulating
-        dmax = dd_df.groupby(cycle_id).cummin().to_numpy(dtype=np.float64)
+        # Position of the last local minimum before t and check that the previous one is still inside the window
+        t = np.arange(lookback + 2, n)
+        last = np.cumsum(is_min)[t - 1] - 1
+        valid = last >= 1
+        higher_low[t[valid]] = ascending[last[valid]] & (min_idx[last[valid] - 1] >= t[valid] - lookback)
 
-        return price, ath, dd, dmax
\ No newline at end of file
+        return higher_low
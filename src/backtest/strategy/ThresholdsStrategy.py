@@ -1,19 +1,21 @@
-import os
-import streamlit as st
 import numpy as np
 
 from src.backtest.strategy.Strategy import Strategy
+from src.backtest.strategy.MarketData import MarketData
 from src.backtest.strategy.Asset import Asset
 from src.backtest.strategy.Wallet import Wallet
+from src.backtest.strategy.Journal import NullJournal
+from src.utils.leverage import sort_assets
 
 
 class ThresholdsStrategy(Strategy):
 
-    def __init__(self, initial_capital, entry_thresholds, input_dfs, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional=True):
-        super().__init__("Thresholds", initial_capital, input_dfs)
+    def __init__(self, initial_capital, entry_thresholds, input_dfs, rotate, risk_control, yield_targets, yield_values, debt_yield, allow_fractional=True, market_data=None, journal=None,
+                 event_driven=False, instrumentation=None, recorder=None):
+        super().__init__("Thresholds", initial_capital, input_dfs, market_data)
         self.entry_thresholds = entry_thresholds
         self.rotate = rotate
-        self.assets = sorted({asset for _, asset in entry_thresholds.values()})
+        self.assets = sort_assets({asset for _, asset in entry_thresholds.values()})
         self.yield_targets = yield_targets
         self.yield_values = yield_values
         self.debt_yield = debt_yield
@@ -24,6 +26,7 @@ class ThresholdsStrategy(Strategy):
         self.pause_x3 = False
         self.min_dd_seen = 0.0
         self.allow_fractional = allow_fractional
+        self.event_driven = event_driven  # Jump between the days where something can happen instead of simulating every day
 
         for buy_pct, buy_type in self.entry_thresholds.values():
             if buy_type not in self.max_pcts:
@@ -31,10 +34,10 @@ class ThresholdsStrategy(Strategy):
             if buy_pct > self.max_pcts[buy_type]:
                 self.max_pcts[buy_type] = buy_pct
 
-        # Initialise logs directory
-        if not os.path.exists("logs") or not os.path.isdir("logs"):
-            os.mkdir("logs")
-        self.log_path = f"logs/thresholds.log"
+        # Journal of the operations, discarded by default (the Backtest page passes a text log or a trades journal)
+        self.journal = journal if journal is not None else NullJournal()
+        self.instrumentation = instrumentation  # Optional per-phase timings and counters (see Instrumentation)
+        self.recorder = recorder  # Optional daily cash and asset values (see PortfolioRecorder)
 
     def has_higher_low(self, prices, t, lookback=120):
         if t < lookback + 2:
@@ -77,15 +80,14 @@ class ThresholdsStrategy(Strategy):
             self.market_state = "NORMAL"
             self.min_dd_seen = 0.0
 
-    def update_x3_pause_state(self, dd, prices, t):
+    def update_x3_pause_state(self, dd, price, ma200, higher_low):
+        # ma200 and higher_low are the precomputed indicators of the current day (see MarketData.get_risk_indicators)
         #self.update_market_state(dd, prices, t)
         self.min_dd_seen = min(self.min_dd_seen, dd)
-        price = prices[t]
-        ma200 = prices[max(0, t-200):t+1].mean()
 
-        pause_condition = (dd <= -0.35 and price < ma200 and not self.has_higher_low(prices, t))
+        pause_condition = (dd <= -0.35 and price < ma200 and not higher_low)
 
-        resume_condition = (price > ma200 and (dd - self.min_dd_seen) >= 0.10 and self.has_higher_low(prices, t))
+        resume_condition = (price > ma200 and (dd - self.min_dd_seen) >= 0.10 and higher_low)
 
         if not self.pause_x3 and pause_condition:
             self.change_counter += 1
@@ -96,6 +98,21 @@ class ThresholdsStrategy(Strategy):
             self.min_dd_seen = 0.0  # Reset min_dd_seen as a recovery is considered
             self.pause_x3 = False
 
+    def compute_x3_pause_series(self, dd, prices, ma200, higher_low):
+        # The pause state only depends on the x1 price path, so it can be computed in advance for every day
+        pause = np.zeros(len(prices), dtype=bool)
+        for t in range(len(prices)):
+            self.update_x3_pause_state(dd[t], prices[t], ma200[t], higher_low[t])
+            pause[t] = self.pause_x3
+        return pause
+
+    def compute_buy_state_changes(self, dd, pause):
+        # Days where the reached entry thresholds or the x3 pause change, i.e. where the buy targets may change
+        pcts = np.array(list(self.entry_thresholds.keys()), dtype=np.float64)
+        reached = np.cumprod(pcts[None, :] > dd[:, None], axis=1).sum(axis=1)  # Thresholds are checked in order until one is not reached
+        state = reached * 2 + pause
+        return np.flatnonzero(state[1:] != state[:-1]) + 1
+
     def get_amounts_to_buy(self, dd):
         # Get the percentage of total capital that should be invested in each type of asset for current drawdown
         buy_amounts = {}
@@ -209,49 +226,117 @@ class ThresholdsStrategy(Strategy):
             # Execute sells
             self.execute_sells(wallet, asset, lev_factor, buys_ready, t, current_dd, current_day, interactive)
 
-    def compute_debt_costs(self, wallet):
+    def get_next_event_day(self, wallet, t, current_dd, buy_state_changes, n_days):
+        # First day after t where a buy, rotation or sell may happen, n_days if there is none.
+        # Until then cash and holdings do not change, so every check below uses the current wallet state
+        i = np.searchsorted(buy_state_changes, t, side="right")
+        next_t = int(buy_state_changes[i]) if i < len(buy_state_changes) else n_days
+
+        # Pending buys: a rotation from the previous leverage factor or a cash buy that can succeed
+        for lev_factor, target_amount in self.get_amounts_to_buy(current_dd).items():
+            asset = wallet.get_asset(lev_factor)
+            invested_amount = asset.get_invested_eur()
+            if target_amount > invested_amount:
+                prev_factor = self.get_prev_factor(lev_factor)
+                if prev_factor in self.assets and prev_factor != lev_factor and self.rotate:
+                    next_t = wallet.get_asset(prev_factor).get_next_extra_cash_day(t + 1, next_t)
+                next_t = asset.get_next_buy_day(min(target_amount - invested_amount, wallet.cash), t + 1, next_t)
+
+        # Buys reaching their yield target (knocked-out prices never do)
+        for lev_factor in self.assets:
+            next_t = wallet.get_asset(lev_factor).get_next_sell_day(t + 1, next_t)
+
+        return next_t
+
+    def compute_debt_costs(self, wallet, days=1):
+        if days <= 0:
+            return
+
         owed_money = self.initial_capital - wallet.cash
         if owed_money > 0.0:
-            wallet.track_debt_time(1)  # +1 day with debt
+            wallet.track_debt_time(days)  # +days with debt
             if self.debt_yield > 0.0:
                 # In the mortgage agreement they use 360 to compute interest costs
                 daily_debt_cost = owed_money * self.debt_yield / 360
-                wallet.track_debt_cost(daily_debt_cost)
+                wallet.track_debt_cost(daily_debt_cost * days)
 
+        # The wallet is valued at the last price of the period, so it does not change while holdings do not
         if wallet.get_total_value() < self.initial_capital:
-            wallet.track_time_under_water(1)  # +1 day under water
+            wallet.track_time_under_water(days)  # +days under water
+
+    def run_event_driven(self, wallet, prices, dd, days, ma200=None, higher_low=None):
+        # Same decisions as the daily loop, but only the days where something can happen are simulated,
+        # debt costs and time under water of the days in between are added at once
+        pause = np.zeros(len(prices), dtype=bool)
+        if self.risk_control:
+            pause = self.compute_x3_pause_series(dd, prices, ma200, higher_low)
+        buy_state_changes = self.compute_buy_state_changes(dd, pause)
+
+        t = 0
+        while t < len(prices):
+            if self.risk_control:
+                self.pause_x3 = bool(pause[t])
+            self.buy_or_rotate(wallet, t, dd[t], days[t])
+            self.sell_or_rotate(wallet, t, dd[t], days[t])
+            self.compute_debt_costs(wallet)
+
+            next_t = self.get_next_event_day(wallet, t, dd[t], buy_state_changes, len(prices))
+            if self.recorder is not None:
+                self.recorder.record_wallet(wallet, t, next_t)
+            self.compute_debt_costs(wallet, next_t - t - 1)
+            t = next_t
+
+        if self.risk_control and len(prices) > 0:
+            self.pause_x3 = bool(pause[-1])
 
     def backtest(self, interactive=False):
-        # Clean log file from previous backtests
-        if os.path.exists(self.log_path):
-            os.remove(self.log_path)
-
-        # Convert time series DataFrames into numpy arrays (more efficient)
-        days = self.input_dfs["x1"]['Days'].to_numpy(dtype=np.int64)
-        prices, ath, dd, dmax = self.compute_drawdowns(self.input_dfs["x1"])
-        prices_dict, ath_dict, dd_dict, dmax_dict = {}, {}, {}, {}
-        for asset in self.assets:
-            prices_dict[asset], ath_dict[asset], dd_dict[asset], dmax_dict[asset] = self.compute_drawdowns(self.input_dfs[asset])
+        if self.instrumentation is None:
+            return self.run_backtest(interactive)
+
+        self.instrumentation.start(self)
+        try:
+            result = self.run_backtest(interactive)
+        finally:
+            self.instrumentation.stop()
+        result["instrumentation"] = self.instrumentation.report(result)
+        return result
+
+    def run_backtest(self, interactive=False):
+        # Clean journal from previous backtests
+        self.journal.clear()
+
+        # Read the NumPy arrays of the market frames (more efficient than DataFrames), unless they were already precomputed
+        market_data = self.market_data if self.market_data is not None else MarketData(self.input_dfs)
+        x1 = market_data.frames["x1"]
+        days, prices, dd, dmax = x1.days, x1.price, x1.dd, x1.dmax
+        prices_dict = {asset: market_data.frames[asset].price for asset in self.assets}
+        ma200, higher_low = market_data.get_risk_indicators("x1") if self.risk_control else (None, None)
 
         # Initialise wallet
         wallet = Wallet(self.initial_capital)
         # "x1_save" allows fractional because it will be a fund, not an ETF
-        wallet.add_asset("x1_save", Asset("S&P500 x1", prices, -1,  "none", -1, self.log_path))
+        wallet.add_asset("x1_save", Asset("S&P500 x1", prices, -1,  "none", -1, self.journal))
         for asset in self.assets:
             wallet.add_asset(asset, Asset(f"S&P500 {asset}", prices_dict[asset], self.initial_capital * self.max_pcts[asset],
-                                          self.yield_targets[asset], self.yield_values[asset], self.log_path, self.allow_fractional))
+                                          self.yield_targets[asset], self.yield_values[asset], self.journal, self.allow_fractional))
+        if self.recorder is not None:
+            self.recorder.start(days, {key: held.prices for key, held in wallet.assets.items()}, self.initial_capital)
+
+        if self.event_driven and not interactive:
+            self.run_event_driven(wallet, prices, dd, days, ma200, higher_low)
+            return self.get_result(wallet)
 
         # Compute prices, ath, drawdowns and max drawdowns along the whole dataset
         for t in range(len(prices)):
             current_dd, current_dmax, current_day = dd[t], dmax[t], days[t]
 
             if interactive:
-                st.info(f"@iteration {t}: @price: {prices[t]} @dd: {current_dd} @dmax: {current_dmax}")
-                st.info(f"@iteration {t}: @cash: {wallet.cash}")
+                print(f"@iteration {t}: @price: {prices[t]} @dd: {current_dd} @dmax: {current_dmax}")
+                print(f"@iteration {t}: @cash: {wallet.cash}")
 
             # Update x3 pause logic (only needs x1 prices)
             if self.risk_control:
-                self.update_x3_pause_state(current_dd, prices, t)
+                self.update_x3_pause_state(current_dd, prices[t], ma200[t], higher_low[t])
 
             # Buy or rotate
             self.buy_or_rotate(wallet, t, current_dd, current_day, interactive)
@@ -262,4 +347,15 @@ class ThresholdsStrategy(Strategy):
             # Add debt financial costs (daily interest rate)
             self.compute_debt_costs(wallet)
 
-        return wallet.to_dict()
+            if self.recorder is not None:
+                self.recorder.record_wallet(wallet, t)
+
+        return self.get_result(wallet)
+
+    def get_result(self, wallet):
+        self.journal.flush()
+        result = wallet.to_dict()
+        result["journal"] = self.journal
+        if self.recorder is not None:
+            result["portfolio"] = self.recorder.report()
+        return result
@@ -1,5 +1,11 @@
 from src.backtest.strategy.ThresholdsStrategy import ThresholdsStrategy
+from src.backtest.strategy.BatchThresholdsStrategy import BatchThresholdsStrategy
 
 STRATEGY_BUILDERS = {
     "thresholds": ThresholdsStrategy,
 }
+
+# Engines simulating many configurations of a strategy at once
+BATCH_STRATEGY_BUILDERS = {
+    "thresholds": BatchThresholdsStrategy,
+}
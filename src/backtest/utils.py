@@ -1,40 +1,24 @@
-import pandas as pd
-from datetime import timedelta
+import numpy as np
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from src.utils.downsampling import lttb_indices, rows_of_days
+from src.utils.leverage import sort_assets
 
 
-def translate_operation_days_to_dates(df, operations):
-    initial_date = df['Date'].min()
-    translated_ops = {"buy_tracker": [], "rotate_tracker": [], "sell_tracker": []}
-    for op_type in translated_ops.keys():
-        for op_name, days in operations[op_type]:
-            date = initial_date + timedelta(days=int(days))
-            translated_ops[op_type].append((op_name, date))
-
-    return translated_ops
-
-
-def add_operations_trace(fig, merged, lev_factor_str, ops, color, label, date_col, legendgroup=None, showlegend=True):
+def add_operations_trace(fig, merged, lev_factor_str, ops, color, label, date_col, legendgroup=None, showlegend=True, scatter=go.Scatter):
     if not ops:
         return
 
-    names, dates = zip(*ops)
-
-    ops_df = pd.DataFrame({
-        "name": names,
-        date_col: pd.to_datetime(dates),
-    })
-
-    ops_df = ops_df.merge(
-        merged[[date_col, lev_factor_str]],
-        on=date_col,
-        how="inner"
-    )
+    # Operations are tracked by day, mapped to the rows of the (full resolution) prices through the sorted Days column
+    names, days = zip(*ops)
+    rows = rows_of_days(merged["Days"].to_numpy(), days)
+    found = rows >= 0
+    rows = rows[found]
 
     fig.add_trace(
-        go.Scatter(
-            x=ops_df[date_col],
-            y=ops_df[lev_factor_str],
+        scatter(
+            x=merged[date_col].to_numpy()[rows],
+            y=merged[lev_factor_str].to_numpy()[rows],
             mode="markers+text",
             name=label,
             legendgroup=legendgroup,
@@ -45,7 +29,7 @@ def add_operations_trace(fig, merged, lev_factor_str, ops, color, label, date_co
                 symbol="circle",
                 line=dict(width=1, color="white"),
             ),
-            text=ops_df["name"],
+            text=np.array(names)[found],
             textposition="top center",
             textfont=dict(size=9, color=color),
             hovertemplate="<b>%{text}</b><br>%{x|%Y-%m-%d}<br>%{y:.2f}<extra></extra>",
@@ -81,46 +65,84 @@ def plot_wallet_chart(assets):
     return bar_fig
 
 
-def plot_backtest(df, df_x2, df_x3, operations, date_col="Date"):
-    d1 = df[[date_col, "Adj Close"]].rename(columns={"Adj Close": "x1"})
-    d2 = df_x2[[date_col, "Adj Close"]].rename(columns={"Adj Close": "x2"})
-    d3 = df_x3[[date_col, "Adj Close"]].rename(columns={"Adj Close": "x3"})
-    merged = d1.merge(d2, on=date_col).merge(d3, on=date_col).sort_values(date_col).reset_index(drop=True)
+# Line color of every asset in the backtest chart, other assets take the next colors of OTHER_ASSET_COLORS
+ASSET_COLORS = {"x1": "#1f77b4", "x2": "#9467bd", "x3": "#7f7f7f"}
+OTHER_ASSET_COLORS = ["#17becf", "#bcbd22", "#8c564b", "#e377c2", "#ff7f0e"]
+
+
+def plot_backtest(df, leveraged_dfs, operations, date_col="Date", max_points=None):
+    """
+    Normalized prices of x1 and the leveraged assets ({asset: DataFrame}) with the operations (tracked by day) as markers.
+    With ``max_points``, every line is downsampled to that many points (LTTB) and drawn with WebGL, markers keep the
+    full resolution prices.
+    """
+    assets = ["x1"] + sort_assets(leveraged_dfs)
+    merged = df[[date_col, "Days", "Adj Close"]].rename(columns={"Adj Close": "x1"})
+    for asset in assets[1:]:
+        merged = merged.merge(leveraged_dfs[asset][[date_col, "Adj Close"]].rename(columns={"Adj Close": asset}), on=date_col)
+    merged = merged.sort_values(date_col).reset_index(drop=True)
 
     base = merged.iloc[0]  # Initial value for each asset
-    for col in ["x1", "x2", "x3"]:
+    for col in assets:
         merged[f"{col}_norm"] = merged[col] / base[col] * 100
 
+    scatter = go.Scatter if max_points is None else go.Scattergl
+    other_colors = iter(OTHER_ASSET_COLORS * len(assets))
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=merged[date_col], y=merged["x1_norm"], mode='lines', name='x1', line={"color": "#1f77b4"}))
-    fig.add_trace(go.Scatter(x=merged[date_col], y=merged["x2_norm"], mode='lines', name='x2', line={"color": "#9467bd"}))
-    fig.add_trace(go.Scatter(x=merged[date_col], y=merged["x3_norm"], mode='lines', name='x3', line={"color": "#7f7f7f"}))
+    for col in assets:
+        x, y = merged[date_col].to_numpy(), merged[f"{col}_norm"].to_numpy()
+        if max_points is not None:
+            rows = lttb_indices(merged["Days"].to_numpy(), y, max_points)
+            x, y = x[rows], y[rows]
+        fig.add_trace(scatter(x=x, y=y, mode='lines', name=col, line={"color": ASSET_COLORS.get(col) or next(other_colors)}))
 
     # Operations
     x1_save = [("x1", day) for (name, day) in operations["buy_tracker"] if "x1_save" in name]
-    add_operations_trace(fig, merged, "x1_norm", x1_save, "#3498db", "Save", date_col, legendgroup="Save", showlegend=True)
-
-    x1_buys = [(name, day) for (name, day) in operations["buy_tracker"] if "x1" == name]
-    x2_buys = [(name, day) for (name, day) in operations["buy_tracker"] if "x2" in name]
-    x3_buys = [(name, day) for (name, day) in operations["buy_tracker"] if "x3" in name]
-    add_operations_trace(fig, merged, "x1_norm", x1_buys, "#2ecc71", "Buy", date_col, legendgroup="buy", showlegend=True)
-    add_operations_trace(fig, merged, "x2_norm", x2_buys, "#2ecc71", "Buy", date_col, legendgroup="buy", showlegend=(not x1_buys))
-    add_operations_trace(fig, merged, "x3_norm", x3_buys, "#2ecc71", "Buy", date_col, legendgroup="buy", showlegend=(not x2_buys))
-
-    x1_rotations = [(name, day) for (name, day) in operations["rotate_tracker"] if "x1" == name]
-    x2_rotations = [(name, day) for (name, day) in operations["rotate_tracker"] if "x2" in name]
-    x3_rotations = [(name, day) for (name, day) in operations["rotate_tracker"] if "x3" in name]
-    add_operations_trace(fig, merged, "x1_norm", x1_rotations, "#f39c12", "Rotate", date_col, legendgroup="rotate", showlegend=True)
-    add_operations_trace(fig, merged, "x2_norm", x2_rotations, "#f39c12", "Rotate", date_col, legendgroup="rotate", showlegend=(not x1_buys))
-    add_operations_trace(fig, merged, "x3_norm", x3_rotations, "#f39c12", "Rotate", date_col, legendgroup="rotate", showlegend=(not x2_buys))
-
-    x1_sells = [(name, day) for (name, day) in operations["sell_tracker"] if "x1" == name]
-    x2_sells = [(name, day) for (name, day) in operations["sell_tracker"] if "x2" in name]
-    x3_sells = [(name, day) for (name, day) in operations["sell_tracker"] if "x3" in name]
-    add_operations_trace(fig, merged, "x1_norm", x1_sells, "#e74c3c", "Sell", date_col, legendgroup="sell", showlegend=True)
-    add_operations_trace(fig, merged, "x2_norm", x2_sells, "#e74c3c", "Sell", date_col, legendgroup="sell", showlegend=(not x1_buys))
-    add_operations_trace(fig, merged, "x3_norm", x3_sells, "#e74c3c", "Sell", date_col, legendgroup="sell", showlegend=(not x2_buys))
+    add_operations_trace(fig, merged, "x1_norm", x1_save, "#3498db", "Save", date_col, legendgroup="Save", showlegend=True, scatter=scatter)
+
+    # Operations of an asset: buys and sells are named after the asset, rotations "<from> to <to>" are shown on both
+    for tracker, color, label in [("buy_tracker", "#2ecc71", "Buy"), ("rotate_tracker", "#f39c12", "Rotate"), ("sell_tracker", "#e74c3c", "Sell")]:
+        shown = False
+        for col in assets:
+            if col == "x1":
+                ops = [(name, day) for (name, day) in operations[tracker] if name == "x1"]
+            else:
+                ops = [(name, day) for (name, day) in operations[tracker] if col in name.split(" to ")]
+            add_operations_trace(fig, merged, f"{col}_norm", ops, color, label, date_col, legendgroup=label.lower(), showlegend=not shown, scatter=scatter)
+            shown = shown or bool(ops)
 
     fig.update_layout(xaxis_title=date_col, yaxis_title="Normalized Value (%)", height=500, template="plotly_white")
 
     return fig
+
+
+def plot_portfolio(dates, portfolio, max_points=None):
+    """
+    Equity of a recorded backtest (total value, cash and value of every asset held) over its owed money, the recorded
+    days being at ``dates``. With ``max_points``, every line is downsampled to that many points (LTTB) and drawn with WebGL.
+    """
+    scatter = go.Scatter if max_points is None else go.Scattergl
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.04)
+
+    def add_line(y, name, row, color=None, **kwargs):
+        x = dates
+        if max_points is not None:
+            rows = lttb_indices(portfolio["days"], y, max_points)
+            x, y = x[rows], y[rows]
+        fig.add_trace(scatter(x=x, y=y, mode="lines", name=name, line={"color": color}, **kwargs), row=row, col=1)
+
+    add_line(portfolio["total"], "Total value", 1, "#2c3e50")
+    add_line(portfolio["cash"], "Cash", 1, "#2ecc71")
+    other_colors = iter(OTHER_ASSET_COLORS * len(portfolio["values"]))
+    for asset, values in portfolio["values"].items():
+        if values.any():
+            color = "#3498db" if asset == "x1_save" else ASSET_COLORS.get(asset) or next(other_colors)
+            add_line(values, asset, 1, color)
+    add_line(portfolio["owed"], "Owed money", 2, "#e74c3c", fill="tozeroy")
+
+    fig.update_yaxes(title_text="Value (€)", row=1, col=1)
+    fig.update_yaxes(title_text="Debt (€)", row=2, col=1)
+    fig.update_layout(height=520, template="plotly_white", title="Equity and debt",
+                      legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+
+    return fig
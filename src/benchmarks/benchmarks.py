@@ -0,0 +1,215 @@
+"""
+Benchmarks of the backtest and evaluation hot paths (no Streamlit code).
+
+Usage:
+    python -m src.benchmarks.benchmarks [--years 10 50 200] [--output bench.json] [--compare previous.json]
+
+Every benchmark runs on reproducible synthetic price paths (regime-switching geometric Brownian motion, fixed seed) and
+reports the median time of a call, calls per second, cost per simulated day and the peak memory allocated by a call
+(tracemalloc, measured on a separate call so it does not slow down the timed ones). Results are written as JSON,
+``--compare`` prints the speedup of every benchmark against a previous results file.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.strategy.Strategy import Strategy
+from src.backtest.strategy.ThresholdsStrategy import ThresholdsStrategy
+from src.backtest.strategy.BatchThresholdsStrategy import BatchThresholdsStrategy
+from src.backtest.strategy.MarketData import MarketData
+from src.backtest.strategy.Journal import NullJournal
+from src.evaluation.batch_evaluation import evaluate_all_configurations, get_input_data, INITIAL_CAPITAL, DEBT_YIELD
+from src.evaluation.configs import ENTRY_THRESHOLDS_SPACE, build_all_configurations
+from src.utils.leverage import _leverage_dataset, leverage_cube
+
+DEFAULT_YEARS = [10, 50, 200]
+TRADING_DAYS = 252
+SEED = 42
+MIN_TIME = 1.0  # Seconds spent repeating each benchmark (at least MIN_REPEATS calls)
+MIN_REPEATS = 3
+SWEEP_PERIOD_YEARS = 10
+
+# Bull and bear regimes of the synthetic paths: annual drift, annual volatility and daily probability of leaving the regime
+REGIMES = {
+    "bull": (0.12, 0.15, 1 / 1250),
+    "bear": (-0.35, 0.35, 1 / 150),
+}
+
+# ThresholdsStrategy.backtest variants: (rotate, risk_control, allow_fractional)
+BACKTEST_VARIANTS = {
+    "base": (False, False, True),
+    "rotate": (True, False, True),
+    "risk_control": (False, True, True),
+    "rotate_risk_control": (True, True, True),
+    "not_fractional": (True, True, False),
+}
+BACKTEST_THRESHOLDS = ENTRY_THRESHOLDS_SPACE["x2_30_x3_70"]
+
+
+def synthetic_prices(years, seed=SEED):
+    """Daily price path of ``years`` years alternating bull and bear regimes, as a dataset like the ones loaded by the app."""
+    rng = np.random.default_rng(seed)
+    n_days = years * TRADING_DAYS
+
+    # Regime of every day (Markov chain), then log returns with the drift and volatility of the regime
+    bear = np.empty(n_days, dtype=bool)
+    state = False
+    switches = rng.random(n_days)
+    for t in range(n_days):
+        bear[t] = state
+        if switches[t] < REGIMES["bear" if state else "bull"][2]:
+            state = not state
+    mu = np.where(bear, REGIMES["bear"][0], REGIMES["bull"][0]) / TRADING_DAYS
+    sigma = np.where(bear, REGIMES["bear"][1], REGIMES["bull"][1]) / np.sqrt(TRADING_DAYS)
+    log_returns = mu - 0.5 * sigma ** 2 + sigma * rng.standard_normal(n_days)
+    log_returns[0] = 0.0
+    prices = 100.0 * np.exp(np.cumsum(log_returns))
+
+    dates = pd.bdate_range("1900-01-01", periods=n_days)
+    return pd.DataFrame({"Date": dates, "Close": prices, "Adj Close": prices, "Days": (dates - dates[0]).days})
+
+
+def synthetic_periods(df, period_years=SWEEP_PERIOD_YEARS):
+    # Consecutive periods covering the whole path
+    start, end = df['Date'].iloc[0], df['Date'].iloc[-1]
+    periods = {}
+    while start <= end:
+        period_end = min(start + pd.DateOffset(years=period_years) - pd.Timedelta(days=1), end)
+        periods[f"{start.year}-{period_end.year}"] = (start.strftime("%Y-%m-%d"), period_end.strftime("%Y-%m-%d"))
+        start = period_end + pd.Timedelta(days=1)
+    return periods
+
+
+def measure(func, min_time=MIN_TIME, min_repeats=MIN_REPEATS):
+    """Median and minimum time of ``func()`` over repeated calls, and the peak memory allocated by one call."""
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_repeats or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"median_s": float(np.median(times)), "min_s": float(np.min(times)), "repeats": len(times), "peak_mem_mb": peak / 2 ** 20}
+
+
+def build_benchmarks(years, sweep_engine="batch"):
+    """Return {benchmark name: (function, number of simulated days)} for a synthetic path of ``years`` years."""
+    df = synthetic_prices(years)
+    n_days = len(df)
+    benchmarks = {
+        f"leverage_dataset[{years}y]": (lambda: _leverage_dataset(df, L=3, knockout_zero=True), n_days),
+        # Leverage sweep of 1x to 5x by 0.25 with three TERs in one pass
+        f"leverage_cube_17x3[{years}y]": (lambda: leverage_cube(df['Adj Close'].to_numpy(), np.arange(1.0, 5.01, 0.25), (0.0, 0.0075, 0.0095)), n_days),
+        f"compute_drawdowns[{years}y]": (lambda: Strategy.compute_drawdowns(df), n_days),
+    }
+
+    # Backtests share the market data, as in the batch evaluation
+    assets = sorted({asset for _, asset in BACKTEST_THRESHOLDS.values()})
+    market_data = MarketData(get_input_data(assets, df, df['Date'].iloc[0], df['Date'].iloc[-1]))
+    yield_targets = {asset: "auto" for asset in assets}
+    yield_values = {asset: None for asset in assets}
+    for variant, (rotate, risk_control, allow_fractional) in BACKTEST_VARIANTS.items():
+        def backtest(rotate=rotate, risk_control=risk_control, allow_fractional=allow_fractional):
+            strategy = ThresholdsStrategy(INITIAL_CAPITAL, BACKTEST_THRESHOLDS, market_data.input_dfs, rotate, risk_control, yield_targets,
+                                          yield_values, DEBT_YIELD, allow_fractional, market_data=market_data, journal=NullJournal())
+            return strategy.backtest()
+        benchmarks[f"backtest_{variant}[{years}y]"] = (backtest, n_days)
+
+    # Full configuration grid over consecutive periods (cost per day is per simulated config-day)
+    configs = build_all_configurations()
+    periods = synthetic_periods(df)
+    batch_builder = BatchThresholdsStrategy if sweep_engine == "batch" else None
+    sweep = lambda: evaluate_all_configurations(ThresholdsStrategy, configs, periods, df, batch_builder=batch_builder)
+    benchmarks[f"evaluate_all_configurations_{sweep_engine}[{years}y]"] = (sweep, n_days * len(configs))
+
+    return benchmarks
+
+
+def run_benchmarks(years_list, sweep_engine="batch", pattern=None, min_time=MIN_TIME, stream=sys.stderr):
+    results = []
+    for years in years_list:
+        for name, (func, n_days) in build_benchmarks(years, sweep_engine).items():
+            if pattern is not None and pattern not in name:
+                continue
+            # The sweep takes long enough to be measured on a single call
+            is_sweep = name.startswith("evaluate_all_configurations")
+            stats = measure(func, min_time=0.0 if is_sweep else min_time, min_repeats=1 if is_sweep else MIN_REPEATS)
+            stats.update(name=name, years=years, days=n_days, ops_per_s=1.0 / stats["median_s"], us_per_day=stats["median_s"] / n_days * 1e6)
+            results.append(stats)
+            stream.write(f"{name:<48} {stats['median_s'] * 1e3:>12.3f} ms {stats['ops_per_s']:>10.2f} ops/s "
+                         f"{stats['us_per_day']:>10.4f} us/day {stats['peak_mem_mb']:>10.2f} MB\n")
+            stream.flush()
+    return results
+
+
+def get_metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "seed": SEED,
+    }
+
+
+def compare(results, previous):
+    """Rows (name, previous median, current median, speedup) of the benchmarks present in both runs."""
+    previous = {r["name"]: r for r in previous["results"]}
+    rows = []
+    for r in results:
+        if r["name"] in previous:
+            rows.append((r["name"], previous[r["name"]]["median_s"], r["median_s"], previous[r["name"]]["median_s"] / r["median_s"]))
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backtest and evaluation hot paths on synthetic price paths")
+    parser.add_argument("--years", type=int, nargs="+", default=DEFAULT_YEARS, help="Lengths of the synthetic paths")
+    parser.add_argument("--filter", help="Only run the benchmarks whose name contains this text")
+    parser.add_argument("--sweep-engine", choices=["batch", "scalar"], default="batch", help="Engine of the full configuration sweep")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="Seconds spent repeating each benchmark")
+    parser.add_argument("--output", help="JSON file where the results are written")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args.years, args.sweep_engine, args.filter, args.min_time)
+    report = {"metadata": get_metadata(), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nCompared with {previous['metadata'].get('commit', '')} ({previous['metadata'].get('timestamp', '')})", file=sys.stderr)
+        for name, previous_s, current_s, speedup in compare(results, previous):
+            print(f"{name:<48} {previous_s * 1e3:>12.3f} ms -> {current_s * 1e3:>12.3f} ms  x{speedup:.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
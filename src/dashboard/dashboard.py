@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 from src.visualization import plot_timeseries, plot_combined_original_and_leveraged
-from src.utils.utils import _show_day_range_slider
+from src.utils.utils import _show_day_range_slider, _filter_days
+from src.utils.downsampling import DEFAULT_MAX_POINTS
 
 
 def run():
@@ -19,14 +20,18 @@ def run():
 
     # Add days range slider
     start_day, end_day = _show_day_range_slider(df)
-    filtered = df[(df['Days'] >= start_day) & (df['Days'] <= end_day)].copy()
+    filtered = _filter_days(df, start_day, end_day)
+    fast_charts = st.toggle("Fast charts", value=True, key="dashboard_fast_charts",
+                            help=f"Downsample every line to {DEFAULT_MAX_POINTS} points keeping its shape (LTTB) and draw it with WebGL. "
+                                 "Narrow the days range to see more detail")
+    max_points = DEFAULT_MAX_POINTS if fast_charts else None
     #st.write(f"Selected registers: {len(filtered)} — {start_date} a {end_date}")
 
     # CODIGO PARA MOSTRAR COMPARACION
     if "Original vs Leveraged" in selected_plot:
         lev_L_str = selected_plot.split(" ")[-1]
         lev_df = st.session_state['leveraged_df'][lev_L_str]
-        fig = plot_combined_original_and_leveraged(orig=filtered, leveraged=lev_df, title=selected_plot)
+        fig = plot_combined_original_and_leveraged(orig=filtered, leveraged=lev_df, title=selected_plot, max_points=max_points)
         st.plotly_chart(fig, width='content')
         #st.markdown("Current parameters")
         #st.write(f"L = {lev_L}")
@@ -35,4 +40,4 @@ def run():
             st.download_button("Download leveraged dataset (CSV)", data=lev_df.to_csv(index=False).encode('utf-8'), file_name="leveraged.csv", mime="text/csv")
 
     if selected_plot == "Price over time":
-        st.plotly_chart(plot_timeseries(filtered, date_col=date_col, value_col="Adj Close", title=f"Price over time"), width='content')
+        st.plotly_chart(plot_timeseries(filtered, date_col=date_col, value_col="Adj Close", title=f"Price over time", max_points=max_points), width='content')
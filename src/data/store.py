@@ -0,0 +1,124 @@
+"""
+Typed columnar store of price datasets (no Streamlit code).
+
+Every dataset is a directory with one .npy file per column: Date as int64 days since 1970-01-01, Days (days since the
+first date) as int64 and every other numeric column as float64. Columns are memory-mapped when loaded, so opening a
+dataset does not parse nor copy the prices, and the backtest engine reads them as NumPy arrays without conversion.
+
+A manifest (manifest.json) lists the stored datasets with their source, number of rows, date range and columns.
+"""
+
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_DIR = os.path.join("data", "store")
+MANIFEST_FILE = "manifest.json"
+
+
+def dataset_name(text):
+    # Name usable as a directory, e.g. "sp500_daily_1927"
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("_") or "dataset"
+
+
+def to_columns(df):
+    """Typed columns of a dataset: Date as int64 days, Days as int64 and the other numeric columns as float64."""
+    dates = pd.to_datetime(df['Date']).to_numpy(dtype="datetime64[D]")
+    columns = {
+        "Date": dates.astype(np.int64),
+        "Days": (dates - dates[0]).astype(np.int64) if len(dates) > 0 else np.empty(0, dtype=np.int64),
+    }
+    for name in df.columns:
+        if name not in columns and pd.api.types.is_numeric_dtype(df[name]):
+            columns[name] = df[name].to_numpy(dtype=np.float64)
+    return columns
+
+
+def from_columns(columns):
+    """DataFrame of stored columns, prices are not copied (read-only when memory-mapped)."""
+    data = {"Date": pd.to_datetime(columns["Date"].astype("datetime64[D]"))}
+    data.update({name: column for name, column in columns.items() if name != "Date"})
+    return pd.DataFrame(data, copy=False)
+
+
+class DatasetStore:
+
+    """Directory of datasets stored as typed NumPy columns, with a manifest of what is available."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def manifest(self):
+        """Return {name: {source, rows, start, end, columns, created}} of the stored datasets."""
+        if not os.path.exists(self._manifest_path()):
+            return {}
+        with open(self._manifest_path()) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = f"{self._manifest_path()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def __contains__(self, name):
+        return name in self.manifest()
+
+    def save(self, name, df, source=""):
+        """Store a dataset (replacing any dataset with the same name), returns its name in the store."""
+        name = dataset_name(name)
+        columns = to_columns(df)
+
+        # Columns are written to a temporary directory first, so a dataset is never left half written
+        tmp_dir = os.path.join(self.root, f".{name}.{uuid.uuid4().hex[:8]}")
+        os.makedirs(tmp_dir)
+        for column_name, column in columns.items():
+            np.save(os.path.join(tmp_dir, f"{column_name}.npy"), column)
+        dataset_dir = os.path.join(self.root, name)
+        if os.path.exists(dataset_dir):
+            shutil.rmtree(dataset_dir)
+        os.replace(tmp_dir, dataset_dir)
+
+        dates = columns["Date"].astype("datetime64[D]")
+        manifest = self.manifest()
+        manifest[name] = {
+            "source": source,
+            "rows": int(len(dates)),
+            "start": str(dates[0]) if len(dates) > 0 else None,
+            "end": str(dates[-1]) if len(dates) > 0 else None,
+            "columns": list(columns.keys()),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        self._write_manifest(manifest)
+        return name
+
+    def load_columns(self, name, mmap=True):
+        """Return {column: array} of a stored dataset, memory-mapped (read-only) by default."""
+        entry = self.manifest().get(name)
+        if entry is None:
+            raise KeyError(f"Dataset {name} is not in the store. Available: {list(self.manifest().keys())}")
+        dataset_dir = os.path.join(self.root, name)
+        return {column: np.load(os.path.join(dataset_dir, f"{column}.npy"), mmap_mode="r" if mmap else None) for column in entry["columns"]}
+
+    def load(self, name, mmap=True):
+        return from_columns(self.load_columns(name, mmap))
+
+    def remove(self, name):
+        manifest = self.manifest()
+        if manifest.pop(name, None) is not None:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            self._write_manifest(manifest)
+
+    def clear(self):
+        # Remove every stored dataset and the manifest
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -15,16 +15,34 @@ You only need to adapt ONE function call:
 so it connects with your existing backtest logic.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import ceil
+import atexit
+import threading
 import pandas as pd
 
-from src.utils.utils import _leverage_dataset
+from src.utils.leverage import TER_ANNUAL, TRADING_DAYS, leveraged_datasets, sort_assets
+from src.backtest.strategy.MarketData import MarketData
+from src.backtest.strategy.Journal import NullJournal
+from src.backtest.strategy.Asset import Asset
+from src.evaluation.result_cache import dataset_fingerprint, make_period_token, make_config_token, make_key
+from src.evaluation.market_arena import MarketArena, attach_arena
 
 # ============================================================
 # Static configuration values
 # ============================================================
 INITIAL_CAPITAL = 10000
 DEBT_YIELD = 0.0325
+KNOCKOUT_ZERO = True  # A leveraged ETP whose daily factor is zero or negative is worth zero from then on
+
+# Number of (config, period) pairs sent to a worker process in a single task
+DEFAULT_CHUNK_SIZE = 64
+
+# Process pools kept alive between calls (and Streamlit reruns) to avoid paying the start-up cost again, one per
+# number of workers: Streamlit sessions run on different threads and may share a pool, none is shut down while in use
+_process_pools = {}
+_process_pools_lock = threading.Lock()
 
 
 @dataclass
@@ -46,7 +64,11 @@ class BacktestSummary:
 
 def retrieve_backtest_results(strategy, input_data):
     result = strategy.backtest()
+    result["gross_value"] = result["cash"] + sum([result[a].get_invested_value() for a in result["assets"]])
+    return compute_summary_metrics(result, input_data)
 
+
+def compute_summary_metrics(result, input_data):
     # Get elapsed time and price movement over period
     x1 = input_data["x1"]
     first_price, last_price = x1.loc[x1['Date'].idxmin(), 'Adj Close'], x1.loc[x1['Date'].idxmax(), 'Adj Close']
@@ -54,7 +76,6 @@ def retrieve_backtest_results(strategy, input_data):
     elapsed_days = end_day - start_day
 
     # Compute additional metrics
-    result["gross_value"] = result["cash"] + sum([result[a].get_invested_value() for a in result["assets"]])
     result["tuw"] /= elapsed_days  # Normalise value as a percentage of total number of days
     net_value = result["gross_value"] - result["debt_cost"] - result["fees_paid"]
     result["cagr"] = (max(net_value, 0.0) / INITIAL_CAPITAL) ** (365 / elapsed_days) - 1
@@ -64,7 +85,7 @@ def retrieve_backtest_results(strategy, input_data):
     result["base_scenario"] = INITIAL_CAPITAL * last_price / first_price
     result["base_debt_time"] = elapsed_days
     result["base_debt_cost"] = INITIAL_CAPITAL * elapsed_days * (DEBT_YIELD / 360)
-    net_value = result["base_scenario"] - result["base_debt_cost"] - max(INITIAL_CAPITAL * 0.0012, 1.0)
+    net_value = result["base_scenario"] - result["base_debt_cost"] - Asset.compute_fees(INITIAL_CAPITAL)
     result["base_cagr"] = (max(net_value, 0.0) / INITIAL_CAPITAL) ** (365 / elapsed_days) - 1
 
     return result
@@ -72,14 +93,30 @@ def retrieve_backtest_results(strategy, input_data):
 
 def get_input_data(config_assets, df, start_dt, end_dt):
     input_data = {"x1": df[(df['Date'] >= start_dt) & (df['Date'] <= end_dt)].copy()}
-    for asset in config_assets:
-        if asset == "x1":
-            continue
-        input_data[asset] = _leverage_dataset(input_data["x1"], L=int(asset[-1]), knockout_zero=True)
+    # Leveraged NAVs of all the assets from a single cube
+    input_data.update(leveraged_datasets(input_data["x1"], [asset for asset in config_assets if asset != "x1"], KNOCKOUT_ZERO, TER_ANNUAL, TRADING_DAYS))
     return input_data
 
 
-def evaluate_threshold_config(strategy_builder, df, periods, config_values) -> pd.DataFrame:
+class MarketDataCache:
+
+    """
+    Market data of a dataset built once per (period, leverage set) and shared by every configuration evaluated on it:
+    sliced prices, leveraged NAVs, ATH, drawdowns and max drawdowns per cycle.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._entries = {}
+
+    def get(self, start_dt, end_dt, assets):
+        key = (start_dt, end_dt, tuple(assets))
+        if key not in self._entries:
+            self._entries[key] = MarketData(get_input_data(assets, self.df, start_dt, end_dt))
+        return self._entries[key]
+
+
+def evaluate_config_period(strategy_builder, df, period_name, start, end, config_values, market_data_cache=None) -> BacktestSummary:
     # Dynamic values
     entry_thresholds = config_values["thresholds"]
     rotate = config_values["rotate"]
@@ -87,42 +124,306 @@ def evaluate_threshold_config(strategy_builder, df, periods, config_values) -> p
     yield_targets = config_values["yield_targets"]
     yield_values = config_values["yield_values"]
 
-    summaries = []
-    for period_name, (start, end) in periods.items():
-        # Get input data for this period
-        start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
-        assets = sorted({asset for _, asset in entry_thresholds.values()})
+    # Get input data for this period
+    start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
+    assets = sort_assets({asset for _, asset in entry_thresholds.values()})
+    if market_data_cache is not None:
+        market_data = market_data_cache.get(start_dt, end_dt, assets)
+        input_data = market_data.input_dfs
+    else:
+        market_data = None
         input_data = get_input_data(assets, df, start_dt, end_dt)
 
-        # Initialise strategy
-        strategy = strategy_builder(INITIAL_CAPITAL, entry_thresholds, input_data, rotate, risk_control, yield_targets, yield_values, DEBT_YIELD)
-
-        # Backtest strategy and retrieve results
-        metrics = retrieve_backtest_results(strategy, input_data)
-
-        summaries.append(
-            BacktestSummary(
-                period=period_name,
-                cash=metrics["cash"],
-                fees=metrics["fees_paid"],
-                debt_cost=metrics["debt_cost"],
-                debt_time=metrics["debt_time"],
-                gross_value=metrics["gross_value"],
-                cagr=metrics["cagr"],
-                adjusted_cagr=metrics["adjusted_cagr"],
-                tuw=metrics["tuw"],
-                base_debt_time=metrics["base_debt_time"],
-                base_debt_cost=metrics["base_debt_cost"],
-                base_scenario=metrics["base_scenario"],
-                base_cagr=metrics["base_cagr"],
-            )
-        )
+    # Initialise strategy (journal is disabled in batch evaluation)
+    strategy = strategy_builder(INITIAL_CAPITAL, entry_thresholds, input_data, rotate, risk_control, yield_targets, yield_values, DEBT_YIELD,
+                                market_data=market_data, journal=NullJournal())
+
+    # Backtest strategy and retrieve results
+    metrics = retrieve_backtest_results(strategy, input_data)
+
+    return build_summary(period_name, metrics)
+
+
+def evaluate_period_batch(batch_builder, df, period_name, start, end, configs, market_data_cache=None):
+    """Evaluate several configurations on one period with a batch engine, returns {config_name: BacktestSummary}."""
+    start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
+    assets = sort_assets({asset for config in configs.values() for _, asset in config["thresholds"].values()})
+    if market_data_cache is not None:
+        market_data = market_data_cache.get(start_dt, end_dt, assets)
+    else:
+        market_data = MarketData(get_input_data(assets, df, start_dt, end_dt))
+
+    strategy = batch_builder(INITIAL_CAPITAL, list(configs.values()), market_data.input_dfs, DEBT_YIELD, market_data=market_data)
+    results = strategy.backtest()
+
+    return {name: build_summary(period_name, compute_summary_metrics(result, market_data.input_dfs))
+            for name, result in zip(configs, results)}
+
+
+def build_summary(period_name, metrics) -> BacktestSummary:
+    return BacktestSummary(
+        period=period_name,
+        cash=metrics["cash"],
+        fees=metrics["fees_paid"],
+        debt_cost=metrics["debt_cost"],
+        debt_time=metrics["debt_time"],
+        gross_value=metrics["gross_value"],
+        cagr=metrics["cagr"],
+        adjusted_cagr=metrics["adjusted_cagr"],
+        tuw=metrics["tuw"],
+        base_debt_time=metrics["base_debt_time"],
+        base_debt_cost=metrics["base_debt_cost"],
+        base_scenario=metrics["base_scenario"],
+        base_cagr=metrics["base_cagr"],
+    )
+
+
+def evaluate_threshold_config(strategy_builder, df, periods, config_values, market_data_cache=None) -> pd.DataFrame:
+    summaries = []
+    for period_name, (start, end) in periods.items():
+        summaries.append(evaluate_config_period(strategy_builder, df, period_name, start, end, config_values, market_data_cache))
     return pd.DataFrame([s.__dict__ for s in summaries])
 
 
-def evaluate_all_configurations(strategy_builder, configs, periods, df):
-    results = {}
-    for name, config in configs.items():
-        results[name] = evaluate_threshold_config(strategy_builder, df, periods, config)
+def get_process_pool(workers):
+    """Return a warm pool of ``workers`` processes, reusing the one created by a previous call if possible."""
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None or getattr(pool, "_broken", False):
+            # A broken pool cannot run anything anymore, its futures already failed
+            pool = _process_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
 
+@atexit.register
+def shutdown_process_pool():
+    # Only at exit (or at the end of a command-line run): the pools may be in use by other sessions otherwise
+    with _process_pools_lock:
+        pools = list(_process_pools.values())
+        _process_pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+def build_work_chunks(cells, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split the cells to evaluate ({period_name: [config_name]}) into chunks of at most ``chunk_size`` pairs.
+    Every chunk belongs to a single period, so a worker builds the strategies of a chunk on the same market data.
+    """
+    chunks = []
+    for period_name, config_names in cells.items():
+        for i in range(0, len(config_names), chunk_size):
+            chunks.append((period_name, config_names[i:i + chunk_size]))
+    return chunks
+
+
+def _evaluate_chunk(strategy_builder, arena_name, period_name, config_names, batch_builder=None):
+    # Runs inside a worker process, market data and configurations are read from the shared arena published by the parent
+    arena = attach_arena(arena_name)
+    start, end = arena.periods[period_name]
+    if batch_builder is not None:
+        chunk_configs = {name: arena.configs[name] for name in config_names}
+        return list(evaluate_period_batch(batch_builder, None, period_name, start, end, chunk_configs, arena).items())
+    return [(name, evaluate_config_period(strategy_builder, None, period_name, start, end, arena.configs[name], arena))
+            for name in config_names]
+
+
+def publish_market_arena(configs, periods, cells, df):
+    """Compute the market data of every period in ``cells`` once and publish it, with the configurations, in a MarketArena."""
+    market_data_cache = MarketDataCache(df)
+    market_data = {}
+    for period_name, config_names in cells.items():
+        start, end = periods[period_name]
+        assets = sort_assets({asset for name in config_names for _, asset in configs[name]["thresholds"].values()})
+        market_data[period_name] = market_data_cache.get(pd.to_datetime(start), pd.to_datetime(end), assets)
+    used_configs = {name: configs[name] for config_names in cells.values() for name in config_names}
+    return MarketArena.create(market_data, {period_name: periods[period_name] for period_name in cells}, used_configs)
+
+
+def _assemble_results(configs, periods, summaries):
+    # Rebuild results in the same order as the sequential path (configs order, then periods order)
+    results = {}
+    for name in configs:
+        results[name] = pd.DataFrame([summaries[(name, period_name)].__dict__ for period_name in periods])
     return results
+
+
+def _iter_cells_parallel(strategy_builder, configs, periods, cells, df, workers, chunk_size, batch_builder):
+    pool = get_process_pool(workers)
+
+    # Tasks only carry the arena name, a period name and config names
+    with publish_market_arena(configs, periods, cells, df) as arena:
+        futures = [pool.submit(_evaluate_chunk, strategy_builder, arena.name, period_name, config_names, batch_builder)
+                   for period_name, config_names in build_work_chunks(cells, chunk_size)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def iter_cells(strategy_builder, configs, periods, cells, df, workers=1, chunk_size=None, batch_builder=None):
+    """
+    Evaluate the configurations listed for each period in ``cells`` ({period_name: [config_name]}), yielding the
+    [(config_name, BacktestSummary)] of every chunk (of a period with the sequential batch engine) as it finishes.
+    """
+    cells = {period_name: list(names) for period_name, names in cells.items() if len(names) > 0}
+    if not cells:
+        return
+
+    if chunk_size is None:
+        # The batch engine is faster with bigger chunks, just enough to keep every worker busy
+        max_configs = max(len(names) for names in cells.values())
+        chunk_size = DEFAULT_CHUNK_SIZE if batch_builder is None else max(1, ceil(max_configs / workers))
+
+    if workers > 1:
+        yield from _iter_cells_parallel(strategy_builder, configs, periods, cells, df, workers, chunk_size, batch_builder)
+        return
+
+    market_data_cache = MarketDataCache(df)
+    for period_name, config_names in cells.items():
+        start, end = periods[period_name]
+        if batch_builder is not None:
+            period_configs = {name: configs[name] for name in config_names}
+            yield list(evaluate_period_batch(batch_builder, df, period_name, start, end, period_configs, market_data_cache).items())
+        else:
+            for i in range(0, len(config_names), chunk_size):
+                yield [(name, evaluate_config_period(strategy_builder, df, period_name, start, end, configs[name], market_data_cache))
+                       for name in config_names[i:i + chunk_size]]
+
+
+def evaluate_cells(strategy_builder, configs, periods, cells, df, workers=1, chunk_size=None, batch_builder=None, progress=None):
+    """
+    Evaluate the configurations listed for each period in ``cells`` ({period_name: [config_name]}),
+    returns {(config_name, period_name): BacktestSummary}.
+    ``progress(n_done)``, if given, is called with the number of pairs simulated so far.
+    """
+    summaries = {}
+    for chunk_summaries in iter_cells(strategy_builder, configs, periods, cells, df, workers, chunk_size, batch_builder):
+        for config_name, summary in chunk_summaries:
+            summaries[(config_name, summary.period)] = summary
+        if progress is not None:
+            progress(len(summaries))
+
+    return summaries
+
+
+def get_cache_constants(strategy_builder):
+    # Everything besides data, period and config that the results depend on, including how the leveraged NAVs are built
+    return {
+        "strategy": strategy_builder.__name__,
+        "initial_capital": INITIAL_CAPITAL,
+        "debt_yield": DEBT_YIELD,
+        "fee_rate": Asset.FEE_RATE,
+        "min_fee": Asset.MIN_FEE,
+        "ter_annual": TER_ANNUAL,
+        "trading_days": TRADING_DAYS,
+        "knockout_zero": KNOCKOUT_ZERO,
+    }
+
+
+def build_period_tokens(strategy_builder, periods, df):
+    """Return {period_name: period token of the result cache keys}."""
+    constants = get_cache_constants(strategy_builder)
+    tokens = {}
+    for period_name, (start, end) in periods.items():
+        start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
+        tokens[period_name] = make_period_token(dataset_fingerprint(df[(df['Date'] >= start_dt) & (df['Date'] <= end_dt)]), start, end, constants)
+    return tokens
+
+
+def build_cache_keys(strategy_builder, configs, periods, df):
+    """Return {(config_name, period_name): result cache key}."""
+    config_tokens = {config_name: make_config_token(config) for config_name, config in configs.items()}
+    keys = {}
+    for period_name, period_token in build_period_tokens(strategy_builder, periods, df).items():
+        for config_name, config_token in config_tokens.items():
+            keys[(config_name, period_name)] = make_key(period_token, config_token)
+    return keys
+
+
+def evaluate_all_configurations(strategy_builder, configs, periods, df, workers=1, chunk_size=None, batch_builder=None, cache=None,
+                                computed=None, stats=None, progress=None):
+    """
+    Evaluate every configuration over every period, returns {config_name: DataFrame with one row per period}.
+    When a ``batch_builder`` is given, all the configurations of a chunk are simulated together by the batch engine.
+
+    Only the (config, period) pairs not evaluated yet are simulated:
+    - ``computed`` is an in-memory {cache key: BacktestSummary} of previous evaluations, updated with the new results
+    - ``cache`` is a persistent ResultCache, read for the pairs missing from ``computed`` and updated with the new results
+    ``stats``, if given, is filled with the number of pairs reused from memory, loaded from the cache and simulated.
+    ``progress(n_done, n_total)``, if given, is called as the pairs to simulate are evaluated.
+    """
+    summaries = {}
+    cells = {period_name: list(configs) for period_name in periods}
+    reused = loaded = 0
+
+    if cache is not None or computed is not None:
+        keys = build_cache_keys(strategy_builder, configs, periods, df)
+
+        # Pairs already evaluated in this session (the same config may have been evaluated under another name or period name)
+        if computed is not None:
+            for (config_name, period_name), key in keys.items():
+                if key in computed:
+                    summaries[(config_name, period_name)] = replace(computed[key], period=period_name)
+            reused = len(summaries)
+
+        # Pairs evaluated in a previous session
+        if cache is not None:
+            missing = {cell: key for cell, key in keys.items() if cell not in summaries}
+            cached = cache.get_many(set(missing.values()))
+            for (config_name, period_name), key in missing.items():
+                if key in cached:
+                    summaries[(config_name, period_name)] = BacktestSummary(**{**cached[key], "period": period_name})
+                    loaded += 1
+
+        cells = {period_name: [name for name in configs if (name, period_name) not in summaries] for period_name in periods}
+
+    n_total = sum(len(names) for names in cells.values())
+    cells_progress = (lambda n_done: progress(n_done, n_total)) if progress is not None else None
+    new_summaries = evaluate_cells(strategy_builder, configs, periods, cells, df, workers, chunk_size, batch_builder, cells_progress)
+    if cache is not None and new_summaries:
+        cache.put_many({keys[cell]: summary.__dict__ for cell, summary in new_summaries.items()})
+    summaries.update(new_summaries)
+
+    if computed is not None:
+        for cell, summary in summaries.items():
+            computed.setdefault(keys[cell], summary)
+    if stats is not None:
+        stats.update(reused=reused, loaded=loaded, simulated=len(new_summaries))
+
+    return _assemble_results(configs, periods, summaries)
+
+
+def stream_all_configurations(strategy_builder, configs, periods, df, sink, workers=1, chunk_size=None, batch_builder=None, cache=None,
+                              stats=None, progress=None):
+    """
+    Evaluate every configuration over every period like evaluate_all_configurations, but append the summaries to
+    ``sink`` (see ResultsSink) as chunks finish instead of returning them, so memory does not grow with the results.
+
+    Pairs found in the persistent ResultCache ``cache`` are appended from it period by period, the simulated ones are
+    added to it chunk by chunk. ``stats`` and ``progress(n_done, n_total)`` are used like in evaluate_all_configurations.
+    """
+    cells = {period_name: list(configs) for period_name in periods}
+    loaded = simulated = 0
+
+    if cache is not None:
+        period_tokens = build_period_tokens(strategy_builder, periods, df)
+        config_tokens = {config_name: make_config_token(config) for config_name, config in configs.items()}
+        for period_name, period_token in period_tokens.items():
+            keys = {config_name: make_key(period_token, config_token) for config_name, config_token in config_tokens.items()}
+            cached = cache.get_many(set(keys.values()))
+            cells[period_name] = [name for name in configs if keys[name] not in cached]
+            for name in configs:
+                if keys[name] in cached:
+                    sink.append(name, BacktestSummary(**{**cached[keys[name]], "period": period_name}))
+                    loaded += 1
+
+    n_total = sum(len(names) for names in cells.values())
+    for chunk_summaries in iter_cells(strategy_builder, configs, periods, cells, df, workers, chunk_size, batch_builder):
+        sink.extend(chunk_summaries)
+        if cache is not None:
+            cache.put_many({make_key(period_tokens[summary.period], config_tokens[name]): summary.__dict__ for name, summary in chunk_summaries})
+        simulated += len(chunk_summaries)
+        if progress is not None:
+            progress(simulated, n_total)
+
+    if stats is not None:
+        stats.update(reused=0, loaded=loaded, simulated=simulated)
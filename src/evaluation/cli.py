@@ -0,0 +1,176 @@
+"""
+Headless batch evaluation, for long sweeps on servers without the Streamlit app.
+
+Usage:
+    python -m src.evaluation.cli --data data/sp500_daily_1927_2025.csv --output results.parquet [--periods periods.json]
+                                 [--space space.json] [--workers 8] [--racing]
+
+The results table (one row per config and period) is streamed to a Parquet file as the pairs are evaluated (see
+ResultsSink), and can be loaded afterwards on the Evaluation page, which computes the scores over the whole table.
+With --racing only the finalists are in the results table, the round where every configuration was eliminated, with
+its score and rank, is written next to it (see racing_report_path) and the eliminations per round printed to stderr.
+
+Periods file: {"period_name": ["start_date", "end_date"], ...}, defaults to configs.PERIODS.
+Config space file, every key is optional and defaults to the spaces in configs.py:
+    {
+        "entry_thresholds": ["crisis_only", {"name": {"-0.30": [0.30, "x2"], "-0.50": [0.70, "x3"]}}],
+        "yield_targets": {"x1": ["auto"], "x2": ["auto", "none"], "x3": ["num"]},
+        "yield_values": [0.5, 1.0],
+        "rotate": [true, false],
+        "risk_control": [true]
+    }
+Entry thresholds are given by template name (see configs.ENTRY_THRESHOLDS_SPACE) or as {name: {drawdown: [buy_pct, asset]}}.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from src.backtest.strategy.builders import STRATEGY_BUILDERS, BATCH_STRATEGY_BUILDERS
+from src.evaluation.batch_evaluation import stream_all_configurations, shutdown_process_pool
+from src.evaluation.configs import PERIODS, ENTRY_THRESHOLDS_SPACE, build_all_configurations
+from src.evaluation.racing import race_configurations, elimination_summary, racing_report_path
+from src.evaluation.result_cache import ResultCache, DEFAULT_CACHE_PATH
+from src.evaluation.results_sink import ResultsSink, write_results
+from src.data.store import DatasetStore, DEFAULT_STORE_DIR
+
+
+def load_dataset(path, store_dir=DEFAULT_STORE_DIR):
+    # Name of a dataset in the store, or a file
+    if not os.path.exists(path) and path in DatasetStore(store_dir):
+        return DatasetStore(store_dir).load(path)
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, index_col=0)
+    df['Date'] = pd.to_datetime(df['Date'])
+    if 'Days' not in df:
+        df['Days'] = (df['Date'] - df['Date'].min()).dt.days
+    return df
+
+
+def load_periods(path):
+    if path is None:
+        return PERIODS
+    with open(path) as f:
+        return {name: (start, end) for name, (start, end) in json.load(f).items()}
+
+
+def parse_entry_thresholds(spec):
+    # Template names or inline {name: {drawdown: [buy_pct, asset]}} (JSON keys are strings)
+    entry_thresholds = {}
+    for item in spec:
+        if isinstance(item, str):
+            if item not in ENTRY_THRESHOLDS_SPACE:
+                raise ValueError(f"Unknown entry thresholds {item}. Available: {list(ENTRY_THRESHOLDS_SPACE.keys())}")
+            entry_thresholds[item] = ENTRY_THRESHOLDS_SPACE[item]
+        else:
+            for name, thresholds in item.items():
+                entry_thresholds[name] = {float(dd): (float(buy_pct), asset) for dd, (buy_pct, asset) in thresholds.items()}
+    return entry_thresholds
+
+
+def load_configurations(path):
+    if path is None:
+        return build_all_configurations()
+    with open(path) as f:
+        spec = json.load(f)
+    return build_all_configurations(
+        entry_thresholds_space=parse_entry_thresholds(spec["entry_thresholds"]) if "entry_thresholds" in spec else None,
+        yield_targets_space=spec.get("yield_targets"),
+        yield_values_space=spec.get("yield_values"),
+        rotate_space=spec.get("rotate"),
+        risk_control_space=spec.get("risk_control"),
+    )
+
+
+class ProgressReporter:
+
+    """Prints the number of (config, period) pairs simulated, the rate and the ETA to stderr (per racing round)."""
+
+    def __init__(self, stream=sys.stderr, min_interval=1.0):
+        self.stream = stream
+        self.min_interval = min_interval
+        self.start = None
+        self.total = None
+        self.last = 0.0
+
+    def __call__(self, n_done, n_total):
+        now = time.time()
+        if n_total != self.total:
+            # New evaluation (e.g. next racing round)
+            self.start, self.total = now, n_total
+        if n_done < n_total and now - self.last < self.min_interval:
+            return
+        self.last = now
+
+        elapsed = now - self.start
+        rate = n_done / elapsed if elapsed > 0 else 0.0
+        eta = (n_total - n_done) / rate if rate > 0 else float("nan")
+        self.stream.write(f"\r{n_done}/{n_total} pairs ({n_done / max(n_total, 1):.0%}) | {rate:.0f} pairs/s | "
+                          f"elapsed {elapsed:.0f}s | ETA {eta:.0f}s ")
+        if n_done >= n_total:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate threshold configurations over historical periods without the Streamlit app")
+    parser.add_argument("--data", required=True, help="Dataset of the base index: name in the dataset store, CSV or Parquet file")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Dataset store directory")
+    parser.add_argument("--output", required=True, help="Parquet file where the results are written")
+    parser.add_argument("--periods", help="JSON file with the periods to evaluate (default: built-in periods)")
+    parser.add_argument("--space", help="JSON file with the configuration space (default: built-in space)")
+    parser.add_argument("--strategy", default="thresholds", choices=list(STRATEGY_BUILDERS.keys()))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of processes (1 = sequential)")
+    parser.add_argument("--no-batch-engine", action="store_true", help="Simulate every configuration on its own")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Results cache file")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read nor write the results cache")
+    parser.add_argument("--racing", action="store_true", help="Successive-halving racing, only the finalists are in the results, the eliminations in the racing report")
+    parser.add_argument("--top-k", type=int, default=20, help="Number of racing finalists")
+    parser.add_argument("--keep-fraction", type=float, default=0.5, help="Fraction of configurations kept per racing round")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    df = load_dataset(args.data, args.store)
+    periods = load_periods(args.periods)
+    configs = load_configurations(args.space)
+    strategy_builder = STRATEGY_BUILDERS[args.strategy]
+    batch_builder = None if args.no_batch_engine else BATCH_STRATEGY_BUILDERS.get(args.strategy)
+    cache = None if args.no_cache else ResultCache(args.cache)
+    print(f"Evaluating {len(configs)} configurations over {len(periods)} periods with {args.workers} workers", file=sys.stderr)
+
+    start = time.time()
+    stats = {}
+    try:
+        if args.racing:
+            results, report = race_configurations(strategy_builder, configs, periods, df, keep_fraction=args.keep_fraction, top_k=args.top_k,
+                                                  workers=args.workers, batch_builder=batch_builder, cache=cache, progress=ProgressReporter())
+            table = write_results(results, args.output)
+            report.to_parquet(racing_report_path(args.output))
+        else:
+            with ResultsSink(args.output) as sink:
+                stream_all_configurations(strategy_builder, configs, periods, df, sink, workers=args.workers, batch_builder=batch_builder,
+                                          cache=cache, stats=stats, progress=ProgressReporter())
+                table = sink.close()
+    finally:
+        shutdown_process_pool()
+
+    print(f"Evaluated in {time.time() - start:.2f} seconds", file=sys.stderr)
+    if stats:
+        print(f"{stats['simulated']} pairs simulated, {stats['loaded']} loaded from the results cache", file=sys.stderr)
+    print(f"Results written to {args.output} ({table.n_rows} rows)", file=sys.stderr)
+    if args.racing:
+        print(f"Racing eliminations: {elimination_summary(report)}", file=sys.stderr)
+        print(f"Racing report written to {racing_report_path(args.output)} ({len(report)} configurations)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
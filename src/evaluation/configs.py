@@ -1,5 +1,7 @@
 import itertools
 
+from src.utils.leverage import sort_assets
+
 PERIODS = {
     "1927-1935": ("1927-01-01", "1935-12-31"),
     "1935-1940": ("1935-01-01", "1940-12-31"),
@@ -208,15 +210,23 @@ def _build_config_name(entry_name, yield_targets, yield_values, rotate, risk_con
     return " | ".join(parts)
 
 
-def build_all_configurations():
+def build_all_configurations(entry_thresholds_space=None, yield_targets_space=None, yield_values_space=None, rotate_space=None,
+                             risk_control_space=None):
+    # Spaces not given default to the ones defined above
+    entry_thresholds_space = ENTRY_THRESHOLDS_SPACE if entry_thresholds_space is None else entry_thresholds_space
+    yield_targets_space = YIELD_TARGETS_SPACE if yield_targets_space is None else yield_targets_space
+    yield_values_space = YIELD_VALUES_SPACE if yield_values_space is None else yield_values_space
+    rotate_space = ROTATE_SPACE if rotate_space is None else rotate_space
+    risk_control_space = RISK_CONTROL_SPACE if risk_control_space is None else risk_control_space
+
     all_configs = {}
-    for et_name, entry_thresholds in ENTRY_THRESHOLDS_SPACE.items():
-        assets = sorted({asset for _, asset in entry_thresholds.values()})
+    for et_name, entry_thresholds in entry_thresholds_space.items():
+        assets = sort_assets({asset for _, asset in entry_thresholds.values()})
 
         # 1. Yield target
         per_asset_targets = []
         for asset in assets:
-            allowed = YIELD_TARGETS_SPACE.get(asset, [])
+            allowed = yield_targets_space.get(asset, [])
             # e.g., [('x2', 'auto'), ('x2', 'num'), ('x2', 'none')]
             per_asset_targets.append([(asset, yt) for yt in allowed])
 
@@ -228,7 +238,7 @@ def build_all_configurations():
             per_asset_values = []
             for asset, target in yield_targets.items():
                 if target == "num":
-                    per_asset_values.append([(asset, v) for v in YIELD_VALUES_SPACE])
+                    per_asset_values.append([(asset, v) for v in yield_values_space])
                 else:
                     per_asset_values.append([(asset, None)])
 
@@ -237,10 +247,10 @@ def build_all_configurations():
                 # e.g., {'x2', None}, {'x3', 0.75}
 
                 # 3. Rotation
-                for rotate in ROTATE_SPACE:
+                for rotate in rotate_space:
 
                     # 4. Risk control
-                    for risk_control in RISK_CONTROL_SPACE:
+                    for risk_control in risk_control_space:
                         # Check if configuration is valid
                         if not _is_valid_config(assets, yield_targets, yield_values, rotate, risk_control):
                             continue
@@ -257,3 +267,52 @@ def build_all_configurations():
                         }
 
     return all_configs
+
+
+# Maximum fraction of the initial capital invested in each zone of a parametric ladder (as in t_x2_30_x3_70)
+LADDER_MAX_PCTS = {"x2": 0.30, "x3": 0.70}
+LADDER_MIN_DRAWDOWN = -0.95
+
+
+def build_ladder_thresholds(n_rungs, first_dd, spacing, convexity, split):
+    """
+    Entry thresholds of a parametric ladder: ``n_rungs`` drawdowns starting at ``first_dd`` every ``spacing``.
+    The first ``round(split * n_rungs)`` rungs buy x2 and the rest x3. Inside each zone the fraction to buy grows up to
+    LADDER_MAX_PCTS as (rung / rungs in zone) ** convexity (1 = linear, > 1 = keeps more capital for deeper drawdowns).
+    """
+    n_rungs = int(n_rungs)
+    n_x2 = int(round(split * n_rungs))
+    zones = [("x2", n_x2), ("x3", n_rungs - n_x2)]
+
+    thresholds = {}
+    rung = 0
+    for asset, n_zone in zones:
+        for j in range(n_zone):
+            dd = round(first_dd - rung * spacing, 4)
+            if dd <= LADDER_MIN_DRAWDOWN:
+                break
+            thresholds[dd] = (round(LADDER_MAX_PCTS[asset] * ((j + 1) / n_zone) ** convexity, 4), asset)
+            rung += 1
+
+    return dict(sorted(thresholds.items(), reverse=True))
+
+
+def build_ladder_configuration(ladder_params, yield_targets, yield_values, rotate, risk_control):
+    """Return (config_name, config) of a parametric ladder, yield settings are only kept for the assets it uses."""
+    thresholds = build_ladder_thresholds(**ladder_params)
+    assets = sort_assets({asset for _, asset in thresholds.values()})
+    yield_targets = {asset: yield_targets[asset] for asset in assets}
+    yield_values = {asset: yield_values.get(asset) for asset in assets}
+    rotate = rotate and len(assets) > 1
+    risk_control = risk_control and "x3" in assets
+
+    ladder_name = f"ladder_n{int(ladder_params['n_rungs'])}_d{-ladder_params['first_dd']:.3f}_s{ladder_params['spacing']:.3f}" \
+                  f"_c{ladder_params['convexity']:.2f}_x2:{sum(1 for _, a in thresholds.values() if a == 'x2')}"
+    config_name = _build_config_name(ladder_name, yield_targets, yield_values, rotate, risk_control)
+    return config_name, {
+        "thresholds": thresholds,
+        "yield_targets": yield_targets,
+        "yield_values": yield_values,
+        "rotate": rotate,
+        "risk_control": risk_control
+    }
@@ -1,78 +1,28 @@
+import os
 import time
 import pandas as pd
+import plotly.express as px
 import streamlit as st
-from src.evaluation.batch_evaluation import evaluate_all_configurations
-from src.backtest.strategy.builders import STRATEGY_BUILDERS
+from src.evaluation.batch_evaluation import stream_all_configurations
+from src.backtest.strategy.builders import STRATEGY_BUILDERS, BATCH_STRATEGY_BUILDERS
 from src.evaluation.configs import build_all_configurations, PERIODS
+from src.evaluation.result_cache import ResultCache
+from src.evaluation.racing import race_configurations, elimination_summary
+from src.evaluation.optimizer import optimize_ladders
+from src.evaluation.rolling import DEFAULT_HORIZON_YEARS, evaluate_rolling_windows, rolling_periods
+from src.evaluation import montecarlo
+from src.evaluation.results_sink import TOP_CONFIGS, ResultsSink, ResultsTable, new_results_path, summarize_table, write_results
+from src.evaluation.scoring import SCORE_FORMULA, DISTRIBUTION_METRICS, flatten_results, formula_str, summarize_distributions
 
-SCORE_FORMULA = [
-    {"weight": 2.0, "metric": "cagr"},
-    {"weight": -0.5, "metric": "tuw"},
-]
+# Rows of the ranking shown, the best configurations first
+RANKING_ROWS = 1000
 
 
-def asc_is_better(metric):
-    if metric == "tuw":
-        return True
-    return False
+def show_global_kpis(summary):
+    best_config = summary["ranking"].index[0]
 
-
-def flatten_results(results):
-    dfs = []
-    for config_name, df in results.items():
-        df = df.copy()
-        df["config"] = config_name
-        dfs.append(df)
-    return pd.concat(dfs, ignore_index=True)
-
-
-def compute_score(df, formula, normalizer):
-    score = 0.0
-    for term in formula:
-        score += term["weight"] * normalizer(df[term["metric"]])
-
-    return score
-
-
-def formula_str(formula, normalizer_name="min-max normalized"):
-    terms = []
-
-    for term in formula:
-        w = term["weight"]
-        metric = term["metric"].replace("_", " ").upper()
-
-        sign = "" if w > 0 else "−"
-        abs_w = abs(w)
-
-        terms.append(f"- {sign} {abs_w:g} × {metric}")
-
-    body = "\n".join(terms)
-
-    return (
-        f"Score is computed as a weighted sum of {normalizer_name} metrics:\n\n"
-        f"{body}\n\n"
-        f"Higher score = better overall strategy performance."
-    )
-
-
-def augment_metrics(df):
-    df = df.copy()
-
-    df["excess_cagr"] = df["cagr"] - df["base_cagr"]
-    df["value_vs_base"] = df["gross_value"] / df["base_scenario"]
-
-    def minmax(s):
-        return (s - s.min()) / (s.max() - s.min() + 1e-9)
-
-    df["score"] = compute_score(df, SCORE_FORMULA, minmax)
-
-    return df
-
-
-def show_global_kpis(ref_metric, df):
-    best_config = df.groupby("config")[ref_metric].mean().sort_values(ascending=asc_is_better(ref_metric)).index[0]
-
-    best_df = df[df["config"] == best_config]
+    top_rows = summary["top_rows"]
+    best_df = top_rows[top_rows["config"] == best_config]
 
     c1, c2, c3, c4, c5, c6, c7 = st.columns(7)
     c1.metric("🏆 Best config", best_config, help=best_config)
@@ -85,33 +35,23 @@ def show_global_kpis(ref_metric, df):
     c7.metric("Worst period score", f"{best_df['score'].min():.2f}")
 
 
-def show_global_ranking(ref_metric, df):
-    ranking = (
-        df.groupby("config")
-        .agg(
-            avg_score=("score", "mean"),
-            avg_cagr=("cagr", "mean"),
-            avg_adjusted_cagr=("adjusted_cagr", "mean"),
-            avg_tuw=("tuw", "mean"),
-            avg_excess_cagr=("excess_cagr", "mean"),
-            worst_score=("score", "min"),
-            max_debt_cost=("debt_cost", "max"),
-        )
-        .sort_values(f"avg_{ref_metric}", ascending=asc_is_better(ref_metric))
-        .round(3)
-    )
+def show_global_ranking(summary):
+    # The ranking is already sorted by the reference metric, only its first rows are shown
+    ranking = summary["ranking"].round(3)
 
     st.subheader("🏆 Global configuration ranking")
+    if len(ranking) > RANKING_ROWS:
+        st.caption(f"Top {RANKING_ROWS} of {len(ranking)} configurations")
     st.dataframe(
-        ranking.style
+        ranking.head(RANKING_ROWS).style
         .background_gradient(subset=["avg_score"], cmap="RdYlGn")
         .background_gradient(subset=["worst_score"], cmap="RdYlGn"),
         width='stretch'
     )
 
 
-def show_best_by_period(ref_metric, df):
-    best = df.sort_values(ref_metric, ascending=asc_is_better(ref_metric)).groupby("period").first().reset_index()
+def show_best_by_period(summary):
+    best = summary["best_by_period"]
 
     st.subheader("📆 Best configuration per period")
     st.dataframe(
@@ -128,31 +68,32 @@ def show_best_by_period(ref_metric, df):
     )
 
 
-def show_heatmap(ref_metric, df):
-    pivot = df.pivot(
+def show_heatmap(ref_metric, summary):
+    # Rows of the top configurations, ordered like the ranking (by average reference metric)
+    pivot = summary["top_rows"].pivot(
         index="config",
         columns="period",
         values=ref_metric
     )
-    # Compute average score per config
-    avg_score = (df.groupby("config")[ref_metric].mean().sort_values(ascending=asc_is_better(ref_metric)))
-
-    # Reorder pivot rows by average score
-    pivot = pivot.loc[avg_score.index]
+    pivot = pivot.loc[[config for config in summary["ranking"].index[:TOP_CONFIGS] if config in pivot.index]]
 
     st.subheader(f"🔥 Strategy robustness heatmap ({ref_metric})")
+    if len(summary["ranking"]) > TOP_CONFIGS:
+        st.caption(f"Top {TOP_CONFIGS} configurations")
     st.dataframe(
         pivot.style.background_gradient(cmap="RdYlGn"),
         width='stretch'
     )
 
 
-def show_config_drilldown(df):
+def show_config_drilldown(summary):
     st.subheader("🔍 Configuration drill-down")
 
+    df = summary["top_rows"]
     config = st.selectbox(
         "Select configuration",
-        options=sorted(df["config"].unique())
+        options=sorted(df["config"].unique()),
+        help=f"Top {TOP_CONFIGS} configurations by the reference metric"
     )
 
     st.dataframe(
@@ -162,6 +103,113 @@ def show_config_drilldown(df):
     )
 
 
+def show_racing_report(report):
+    st.subheader("🏁 Racing eliminations")
+    st.caption(elimination_summary(report))
+    st.dataframe(report.round(3), width='stretch')
+
+
+def show_ladder_optimizer(strategy_builder, df, workers, batch_builder, use_cache):
+    with st.expander("🪜 Ladder optimizer"):
+        st.caption("Search entry-threshold ladders (number of rungs, first drawdown, spacing, convexity, x2/x3 split) "
+                   "maximizing the score formula on the raw metrics averaged over the periods")
+        c1, c2 = st.columns(2)
+        budget = c1.number_input("Evaluations", min_value=8, value=64, step=8)
+        batch_size = c2.number_input("Batch size", min_value=1, value=8, step=1)
+
+        if st.button("▶ Optimize ladders"):
+            cache = ResultCache(os.path.join(st.session_state['PROJECT_DIR'], "cache", "results.sqlite")) if use_cache else None
+            progress = st.empty()
+            with st.spinner(f"Evaluating {int(budget)} ladders..."):
+                history, configs = optimize_ladders(strategy_builder, PERIODS, df, budget=int(budget), batch_size=int(batch_size),
+                                                    callback=lambda h: progress.caption(f"{len(h)} ladders evaluated, best objective {h['objective'].max():.4f}"),
+                                                    workers=int(workers), batch_builder=batch_builder, cache=cache)
+            st.session_state.ladder_history = history
+            st.session_state.ladder_configs = configs
+
+        if st.session_state.get('ladder_history') is not None:
+            history = st.session_state.ladder_history
+            st.dataframe(history.round(4), width='stretch')
+            best = st.session_state.ladder_configs[history["config"].iloc[0]]
+            st.write("Best ladder thresholds:", {f"{pct:.1%}": f"{buy_pct:.1%} {asset}" for pct, (buy_pct, asset) in sorted(best["thresholds"].items(), reverse=True)})
+
+
+def show_rolling_evaluation(strategy_builder, df, batch_builder):
+    with st.expander("🔁 Rolling windows"):
+        st.caption("Backtest configurations from every start date (or every Nth trading day) with a fixed horizon, "
+                   "instead of the predefined periods, and compare the distribution of their metrics")
+        configs = build_all_configurations()
+        names = st.multiselect("Configurations", options=list(configs), max_selections=10, key="rolling_configs")
+        c1, c2 = st.columns(2)
+        horizon_years = c1.number_input("Horizon (years)", min_value=1, max_value=30, value=DEFAULT_HORIZON_YEARS, step=1)
+        step = c2.number_input("Start every N trading days", min_value=1, value=21, step=1)
+        st.caption(f"{len(rolling_periods(df, int(horizon_years), int(step)))} windows per configuration")
+
+        if st.button("▶ Evaluate rolling windows", disabled=len(names) == 0):
+            progress = st.progress(0.0)
+            start = time.time()
+            results = evaluate_rolling_windows(strategy_builder, {name: configs[name] for name in names}, df, int(horizon_years), int(step),
+                                               batch_builder=batch_builder,
+                                               progress=lambda n_done, n_total: progress.progress(n_done / n_total, text=f"{n_done}/{n_total} windows"))
+            progress.empty()
+            st.session_state.rolling_results = results
+            st.caption(f"Evaluated in {time.time() - start:.2f} seconds")
+
+        if st.session_state.get('rolling_results') is not None:
+            results = st.session_state.rolling_results
+            st.dataframe(summarize_distributions(results).round(4), width='stretch')
+
+            metric = st.selectbox("Rolling metric", options=DISTRIBUTION_METRICS,
+                                  format_func=lambda k: {"cagr": "CAGR", "adjusted_cagr": "Adjusted CAGR", "tuw": "TUW"}[k])
+            windows = flatten_results(results)
+            windows["start"] = pd.to_datetime(windows["period"])
+            st.plotly_chart(px.histogram(windows, x=metric, color="config", barmode="overlay", nbins=60, template="plotly_white"), width='stretch')
+            st.plotly_chart(px.line(windows, x="start", y=metric, color="config", render_mode="webgl", template="plotly_white"), width='stretch')
+
+
+def show_monte_carlo(strategy_builder, df, workers, batch_builder):
+    with st.expander("🎲 Monte Carlo stress test"):
+        st.caption("Backtest configurations on synthetic price paths, resampled from the historical returns or generated by a "
+                   "bull/bear regime-switching model, and compare the distribution of their metrics")
+        configs = build_all_configurations()
+        names = st.multiselect("Configurations", options=list(configs), max_selections=10, key="monte_carlo_configs")
+        c1, c2, c3, c4 = st.columns(4)
+        model = c1.selectbox("Path model", options=montecarlo.MODELS,
+                             format_func=lambda k: {"bootstrap": "Block bootstrap of history", "regimes": "Regime switching"}[k])
+        n_paths = c2.number_input("Paths", min_value=1, value=256, step=64)
+        years = c3.number_input("Years per path", min_value=1, max_value=50, value=montecarlo.DEFAULT_HORIZON_YEARS, step=1)
+        seed = c4.number_input("Seed", min_value=0, value=montecarlo.SEED, step=1)
+
+        if st.button("▶ Run Monte Carlo", disabled=len(names) == 0):
+            progress = st.progress(0.0)
+            start = time.time()
+            results = montecarlo.evaluate_monte_carlo(strategy_builder, {name: configs[name] for name in names}, model, int(n_paths), int(years),
+                                                      seed=int(seed), returns=montecarlo.historical_returns(df), workers=int(workers),
+                                                      batch_builder=batch_builder,
+                                                      progress=lambda n_done, n_total: progress.progress(n_done / n_total, text=f"{n_done}/{n_total} paths"))
+            progress.empty()
+            st.session_state.monte_carlo_results = results
+            st.caption(f"Evaluated in {time.time() - start:.2f} seconds")
+
+        if st.session_state.get('monte_carlo_results') is not None:
+            results = st.session_state.monte_carlo_results
+            st.dataframe(summarize_distributions(results).round(4), width='stretch')
+            metric = st.selectbox("Monte Carlo metric", options=DISTRIBUTION_METRICS,
+                                  format_func=lambda k: {"cagr": "CAGR", "adjusted_cagr": "Adjusted CAGR", "tuw": "TUW"}[k])
+            st.plotly_chart(px.histogram(flatten_results(results), x=metric, color="config", barmode="overlay", nbins=60, template="plotly_white"),
+                            width='stretch')
+
+
+def set_results_table(table, report=None):
+    # The session only keeps the handle of the results file, the previous file written by this page is removed, so
+    # every session has at most one file under cache/results (removed with "Clean data and logs")
+    previous = st.session_state.get('evaluation_table')
+    if previous is not None and previous.path != table.path and os.path.dirname(previous.path) == os.path.dirname(table.path):
+        previous.remove()
+    st.session_state.evaluation_table = table
+    st.session_state.racing_report = report
+
+
 def run():
     if not st.session_state.get('df_loaded', False):
         st.info("Upload a CSV file or download the data from Yahoo Finance")
@@ -169,6 +217,7 @@ def run():
 
     # Get DataFrame from session state
     df = st.session_state["df"]
+    results_dir = os.path.join(st.session_state['PROJECT_DIR'], "cache", "results")
 
     # Select strategy to evaluate
     strategy_key = st.selectbox(
@@ -179,25 +228,84 @@ def run():
         }[k],
     )
 
+    workers = st.number_input("Workers", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1, step=1,
+                              help="Number of processes used to evaluate configurations (1 = sequential)")
+    use_batch_engine = st.toggle("Vectorized batch engine", value=strategy_key in BATCH_STRATEGY_BUILDERS,
+                                 disabled=strategy_key not in BATCH_STRATEGY_BUILDERS,
+                                 help="Simulate all the configurations of a period together (same results, much faster)")
+
+    use_cache = st.toggle("Reuse cached results", value=True,
+                          help="Results are stored on disk, only the (configuration, period) pairs never evaluated on this data are simulated")
+
+    use_racing = st.toggle("Racing (successive halving)", value=False,
+                           help="Evaluate every configuration on a few crisis and calm periods, drop the worst ones by score and "
+                                "repeat with more periods until only the top configurations are evaluated on every period")
+    if use_racing:
+        c1, c2 = st.columns(2)
+        top_k = c1.number_input("Finalists", min_value=1, value=20, step=1)
+        keep_fraction = c2.number_input("Fraction kept per round", min_value=0.1, max_value=0.9, value=0.5, step=0.05)
+
     evaluate = st.button("▶ Evaluate strategy")
     if evaluate:
         if st.session_state.get('strategy_key', '') != strategy_key:
             st.session_state.strategy_key = strategy_key
         strategy_builder = STRATEGY_BUILDERS[st.session_state.strategy_key]
+        batch_builder = BATCH_STRATEGY_BUILDERS.get(st.session_state.strategy_key) if use_batch_engine else None
 
         with st.spinner(f"Building configurations..."):
             configs = build_all_configurations()
 
+        cache = ResultCache(os.path.join(st.session_state['PROJECT_DIR'], "cache", "results.sqlite")) if use_cache else None
+
+        # Results are streamed to a file as they are computed, previously evaluated pairs are loaded from the results cache
         start = time.time()
+        stats = {}
+        path = new_results_path(results_dir)
         with st.spinner(f"Evaluating {len(configs)} configurations..."):
-            results = evaluate_all_configurations(strategy_builder, configs, PERIODS, df)
-            st.session_state.evaluation_results = results
+            try:
+                if use_racing:
+                    results, report = race_configurations(strategy_builder, configs, PERIODS, df, keep_fraction=keep_fraction, top_k=int(top_k),
+                                                          workers=int(workers), batch_builder=batch_builder, cache=cache)
+                    table = write_results(results, path)
+                else:
+                    report = None
+                    with ResultsSink(path) as sink:
+                        stream_all_configurations(strategy_builder, configs, PERIODS, df, sink, workers=int(workers), batch_builder=batch_builder,
+                                                  cache=cache, stats=stats)
+                        table = sink.close()
+            except BaseException:
+                # Interrupted or failed run (including a rerun of the page), its partial results file is not kept
+                ResultsTable(path, 0).remove()
+                raise
+            set_results_table(table, report)
         end = time.time()
         st.info(f"Successfully evaluated {len(configs)} configurations in {end - start:>.2f} seconds")
-
-
-    # Show results
-    if st.session_state.get('evaluation_results') is not None:
+        if stats:
+            st.caption(f"{stats['simulated']} (configuration, period) pairs simulated, {stats['loaded']} loaded from the results cache")
+
+    # Results written by the command-line runner (python -m src.evaluation.cli), copied next to the page results
+    results_file = st.file_uploader("Load results file", type=["parquet"], help="Results table written by the command-line batch runner")
+    if results_file is not None and st.session_state.get('evaluation_results_file') != results_file.file_id:
+        st.session_state.evaluation_results_file = results_file.file_id
+        path = new_results_path(results_dir)
+        os.makedirs(results_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(results_file.getbuffer())
+        set_results_table(ResultsTable.open(path))
+
+    show_ladder_optimizer(STRATEGY_BUILDERS[strategy_key], df, workers,
+                          BATCH_STRATEGY_BUILDERS.get(strategy_key) if use_batch_engine else None,
+                          use_cache)
+
+    show_rolling_evaluation(STRATEGY_BUILDERS[strategy_key], df, BATCH_STRATEGY_BUILDERS.get(strategy_key) if use_batch_engine else None)
+
+    show_monte_carlo(STRATEGY_BUILDERS[strategy_key], df, workers, BATCH_STRATEGY_BUILDERS.get(strategy_key) if use_batch_engine else None)
+
+    # Show results (unless the results file was removed by "Clean data and logs")
+    if st.session_state.get('evaluation_table') is not None and not os.path.exists(st.session_state.evaluation_table.path):
+        st.session_state.evaluation_table = None
+        st.session_state.racing_report = None
+    if st.session_state.get('evaluation_table') is not None and st.session_state.evaluation_table.n_rows > 0:
         # Select reference metric to choose best strategy
         ref_metric = st.selectbox(
             "Reference metric",
@@ -205,20 +313,24 @@ def run():
             format_func=lambda k: {"score": "Score", "cagr": "CAGR", "adjusted_cagr": "Adjusted CAGR", "tuw": "TUW"}[k],
         )
 
-        global_results = flatten_results(st.session_state.evaluation_results)
-        global_results = augment_metrics(global_results)
+        # Aggregated chunk by chunk from the results file (memoized per file and reference metric)
+        summary = summarize_table(st.session_state.evaluation_table, ref_metric)
 
         st.divider()
-        show_global_kpis(ref_metric, global_results)
+        show_global_kpis(summary)
 
         st.divider()
-        show_global_ranking(ref_metric, global_results)
+        show_global_ranking(summary)
 
         st.divider()
-        show_best_by_period(ref_metric, global_results)
+        show_best_by_period(summary)
 
         st.divider()
-        show_heatmap(ref_metric, global_results)
+        show_heatmap(ref_metric, summary)
 
         st.divider()
-        show_config_drilldown(global_results)
+        show_config_drilldown(summary)
+
+        if st.session_state.get('racing_report') is not None:
+            st.divider()
+            show_racing_report(st.session_state.racing_report)
@@ -0,0 +1,133 @@
+"""
+Shared-memory arena of the market data read by the worker processes of a batch evaluation (no Streamlit code).
+
+The parent process publishes once, in a single shared memory block, the arrays of every period to evaluate (dates,
+days and, per asset, prices or leveraged NAVs, ATH, drawdowns and max drawdowns) together with the configurations.
+Workers attach to the block by name and read the arrays as read-only NumPy views, so a task only carries the arena
+name, a period name and configuration names, and the prices are neither pickled per task nor copied into every worker.
+"""
+
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.strategy.MarketData import MarketData
+from src.backtest.strategy.MarketFrame import MarketFrame
+
+# Arrays start at multiples of ALIGNMENT bytes, the first bytes of the block hold the offset and size of the header
+ALIGNMENT = 64
+ARRAY_FIELDS = ["prices", "ath", "dd", "dmax"]
+
+# Arena attached by this process (a worker keeps the last one it was given)
+_attached = {}
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class MarketArena:
+
+    """
+    Market data of several periods in a shared memory block: created (and removed) by the parent process with
+    ``create`` and attached by name in the workers with ``attach_arena``.
+    ``get(start_dt, end_dt, assets)`` returns the MarketData of a period, like MarketDataCache.
+    """
+
+    def __init__(self, shm, header, owner=False):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self.periods = header["periods"]  # {period_name: (start, end)}
+        self.configs = header["configs"]  # {config_name: config_values}
+        self.layout = header["layout"]  # {period_name: {array key: (offset, dtype, length)}}
+        self._period_names = {(pd.to_datetime(start), pd.to_datetime(end)): name for name, (start, end) in self.periods.items()}
+        self._market_data = {}
+
+    @classmethod
+    def create(cls, market_data, periods, configs):
+        """Publish the MarketData of every period ({period_name: MarketData}) and the configurations used with them."""
+        arrays = {}
+        for period_name, data in market_data.items():
+            x1 = data.input_dfs["x1"]
+            period_arrays = {"Date": x1['Date'].to_numpy(dtype="datetime64[ns]"), "Days": data.days}
+            for asset, frame in data.frames.items():
+                for field, array in zip(ARRAY_FIELDS, frame.arrays()):
+                    period_arrays[f"{asset}/{field}"] = np.asarray(array)
+            arrays[period_name] = period_arrays
+
+        # Place the arrays one after the other, then the header
+        layout, offset = {}, ALIGNMENT
+        for period_name, period_arrays in arrays.items():
+            layout[period_name] = {}
+            for key, array in period_arrays.items():
+                layout[period_name][key] = (offset, array.dtype.str, len(array))
+                offset = _aligned(offset + array.nbytes)
+        header = pickle.dumps({"periods": periods, "configs": configs, "layout": layout})
+
+        shm = shared_memory.SharedMemory(create=True, size=offset + len(header))
+        np.ndarray(2, dtype=np.int64, buffer=shm.buf)[:] = (offset, len(header))
+        shm.buf[offset:offset + len(header)] = header
+        for period_name, period_arrays in arrays.items():
+            for key, array in period_arrays.items():
+                start, dtype, length = layout[period_name][key]
+                np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=start)[:] = array
+        return cls(shm, {"periods": periods, "configs": configs, "layout": layout}, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        offset, size = (int(v) for v in np.ndarray(2, dtype=np.int64, buffer=shm.buf))
+        return cls(shm, pickle.loads(shm.buf[offset:offset + size]))
+
+    def _array(self, period_name, key):
+        offset, dtype, length = self.layout[period_name][key]
+        array = np.ndarray(length, dtype=dtype, buffer=self.shm.buf, offset=offset)
+        array.flags.writeable = False
+        return array
+
+    def get_period(self, period_name):
+        """MarketData of a period with every published asset, its arrays are views of the shared block."""
+        if period_name not in self._market_data:
+            keys = self.layout[period_name]
+            dates, days = self._array(period_name, "Date"), self._array(period_name, "Days")
+            assets = [key.split("/")[0] for key in keys if key.endswith("/prices")]
+            frames = {asset: MarketFrame(days, *(self._array(period_name, f"{asset}/{field}") for field in ARRAY_FIELDS)) for asset in assets}
+            self._market_data[period_name] = MarketData.from_arrays(dates, days, {asset: frames[asset].price for asset in assets}, frames)
+        return self._market_data[period_name]
+
+    def get(self, start_dt, end_dt, assets):
+        # Same interface as MarketDataCache, restricted to x1 and the given assets like a freshly built MarketData
+        period_name = self._period_names[(start_dt, end_dt)]
+        key = (period_name, tuple(assets))
+        if key not in self._market_data:
+            self._market_data[key] = self.get_period(period_name).subset(assets)
+        return self._market_data[key]
+
+    def close(self):
+        self._market_data.clear()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Some views are still referenced, the block is unmapped when they are released
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_arena(name):
+    """Arena published under ``name``, attached once per process (the previously attached arena is released)."""
+    if name not in _attached:
+        for arena in _attached.values():
+            arena.close()
+        _attached.clear()
+        _attached[name] = MarketArena.attach(name)
+    return _attached[name]
@@ -0,0 +1,172 @@
+"""
+Monte Carlo stress test of configurations on synthetic price paths (no Streamlit code).
+
+Paths are generated in blocks of PATHS_PER_BLOCK paths, as 2-D arrays with one row per path, by one of the models:
+- "bootstrap": stationary block bootstrap of the historical daily returns (blocks of geometric length), which keeps
+  the volatility clustering and crashes of the history but reorders them
+- "regimes": bull/bear regime-switching geometric Brownian motion
+
+Block b always draws from the random stream spawned for b from the seed, so a path is the same whatever the number
+of paths, workers or chunking, and a worker regenerates its blocks instead of receiving them.
+Leveraged NAVs are derived from the price paths with the same formula as _leverage_dataset.
+"""
+
+from concurrent.futures import as_completed
+from math import ceil
+
+import numpy as np
+
+from src.backtest.strategy.MarketData import MarketData
+from src.evaluation.batch_evaluation import evaluate_config_period, evaluate_period_batch, get_process_pool, _assemble_results
+from src.utils.leverage import TER_ANNUAL, TRADING_DAYS, leverage_factor, sort_assets
+
+MODELS = ["bootstrap", "regimes"]
+SEED = 42
+PATHS_PER_BLOCK = 64
+DEFAULT_MEAN_BLOCK = 20  # Mean length in days of the bootstrapped blocks
+DEFAULT_HORIZON_YEARS = 10
+
+# Bull and bear regimes of the "regimes" model: annual drift, annual volatility and daily probability of leaving the regime
+REGIMES = {
+    "bull": (0.12, 0.15, 1 / 1250),
+    "bear": (-0.35, 0.35, 1 / 150),
+}
+
+# Calendar of the synthetic paths, TRADING_DAYS trading days per 365 days
+START_DATE = np.datetime64("2000-01-01", "D")
+
+
+def historical_returns(df):
+    """Daily returns of the x1 prices of a dataset (without the first day)."""
+    prices = df['Adj Close'].to_numpy(dtype=np.float64)
+    return prices[1:] / prices[:-1] - 1.0
+
+
+def stationary_bootstrap(returns, n_paths, n_days, rng, mean_block=DEFAULT_MEAN_BLOCK):
+    """(n_paths, n_days) daily returns resampled in blocks of historical returns with a geometric length of mean ``mean_block``."""
+    new_block = rng.random((n_paths, n_days)) < 1.0 / mean_block
+    new_block[:, 0] = True
+    block_starts = rng.integers(0, len(returns), size=(n_paths, n_days))
+
+    # Day every block started at and its first historical return, the block goes on with the next returns (wrapping around)
+    days = np.arange(n_days)
+    block_day = np.maximum.accumulate(np.where(new_block, days, 0), axis=1)
+    index = (np.take_along_axis(block_starts, block_day, axis=1) + days - block_day) % len(returns)
+    return returns[index]
+
+
+def regime_switching(n_paths, n_days, rng, regimes=REGIMES):
+    """(n_paths, n_days) daily returns of a geometric Brownian motion switching between the bull and bear regimes."""
+    drift, volatility, leave = (np.array([regimes["bull"][i], regimes["bear"][i]]) for i in range(3))
+
+    # Regime of every day and path (Markov chain, paths start in a bull regime)
+    bear = np.zeros((n_paths, n_days), dtype=np.int64)
+    switches = rng.random((n_paths, n_days))
+    for t in range(1, n_days):
+        bear[:, t] = bear[:, t - 1] ^ (switches[:, t - 1] < leave[bear[:, t - 1]])
+
+    mu, sigma = drift[bear] / TRADING_DAYS, volatility[bear] / np.sqrt(TRADING_DAYS)
+    return np.expm1(mu - 0.5 * sigma ** 2 + sigma * rng.standard_normal((n_paths, n_days)))
+
+
+def generate_block(model, block, n_days, seed=SEED, returns=None, mean_block=DEFAULT_MEAN_BLOCK):
+    """Prices (PATHS_PER_BLOCK, n_days) of a block of paths, starting at 1."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+    if model == "bootstrap":
+        path_returns = stationary_bootstrap(returns, PATHS_PER_BLOCK, n_days, rng, mean_block)
+    elif model == "regimes":
+        path_returns = regime_switching(PATHS_PER_BLOCK, n_days, rng)
+    else:
+        raise ValueError(f"Unknown path model {model}, available models: {MODELS}")
+    path_returns[:, 0] = 0.0
+    return np.cumprod(1.0 + path_returns, axis=1)
+
+
+def generate_paths(model, n_paths, n_days, seed=SEED, returns=None, mean_block=DEFAULT_MEAN_BLOCK):
+    """Prices (n_paths, n_days) of the first ``n_paths`` paths of a model."""
+    blocks = [generate_block(model, block, n_days, seed, returns, mean_block) for block in range(ceil(n_paths / PATHS_PER_BLOCK))]
+    return np.concatenate(blocks)[:n_paths]
+
+
+def leverage_paths(prices, L, ter_annual=TER_ANNUAL, trading_days=TRADING_DAYS):
+    """Leveraged NAVs of price paths (one row per path), computed like _leverage_dataset with knockouts to zero."""
+    factor = np.ones_like(prices)
+    factor[:, 1:] = 1 + L * (prices[:, 1:] / prices[:, :-1] - 1.0)
+    factor *= 1 - ter_annual / trading_days
+    # Once a factor is zero the NAV stays at zero
+    return np.cumprod(np.where(factor > 0.0, factor, 0.0), axis=1)
+
+
+def path_calendar(n_days):
+    """Dates and days (since the first date) of the synthetic paths."""
+    days = np.round(np.arange(n_days) * 365 / TRADING_DAYS).astype(np.int64)
+    return (START_DATE + days).astype("datetime64[ns]"), days
+
+
+class PathMarket:
+
+    """MarketDataCache interface over a single path, the whole path being the period."""
+
+    def __init__(self, market_data):
+        self.market_data = market_data
+        self._subsets = {}
+
+    def get(self, start_dt, end_dt, assets):
+        key = tuple(assets)
+        if key not in self._subsets:
+            self._subsets[key] = self.market_data.subset(assets)
+        return self._subsets[key]
+
+
+def path_name(i):
+    return f"path {i:05d}"
+
+
+def evaluate_path_block(strategy_builder, configs, model, block, n_paths, n_days, seed=SEED, returns=None, mean_block=DEFAULT_MEAN_BLOCK,
+                        batch_builder=None):
+    """Evaluate every configuration on the paths of a block, returns [(config_name, BacktestSummary)]."""
+    prices = generate_block(model, block, n_days, seed, returns, mean_block)
+    assets = sort_assets({asset for config in configs.values() for _, asset in config["thresholds"].values()} - {"x1"})
+    navs = {asset: leverage_paths(prices, leverage_factor(asset)) for asset in assets}
+    dates, days = path_calendar(n_days)
+
+    summaries = []
+    for row in range(min(PATHS_PER_BLOCK, n_paths - block * PATHS_PER_BLOCK)):
+        period_name = path_name(block * PATHS_PER_BLOCK + row)
+        market = PathMarket(MarketData.from_arrays(dates, days, {"x1": prices[row], **{asset: navs[asset][row] for asset in assets}}))
+        if batch_builder is not None:
+            summaries.extend(evaluate_period_batch(batch_builder, None, period_name, dates[0], dates[-1], configs, market).items())
+        else:
+            summaries.extend((config_name, evaluate_config_period(strategy_builder, None, period_name, dates[0], dates[-1], config_values, market))
+                             for config_name, config_values in configs.items())
+    return summaries
+
+
+def evaluate_monte_carlo(strategy_builder, configs, model, n_paths, years=DEFAULT_HORIZON_YEARS, seed=SEED, returns=None,
+                         mean_block=DEFAULT_MEAN_BLOCK, workers=1, batch_builder=None, progress=None):
+    """
+    Backtest every configuration on ``n_paths`` synthetic paths of ``years`` years, returns {config_name: DataFrame with
+    one row per path}. ``returns`` are the historical daily returns resampled by the "bootstrap" model.
+    ``progress(n_done, n_total)``, if given, is called with the number of paths evaluated so far.
+    """
+    if model == "bootstrap" and (returns is None or len(returns) == 0):
+        raise ValueError("The bootstrap model needs the historical daily returns")
+    n_days = years * TRADING_DAYS
+    blocks = range(ceil(n_paths / PATHS_PER_BLOCK))
+    if workers > 1:
+        pool = get_process_pool(workers)
+        futures = [pool.submit(evaluate_path_block, strategy_builder, configs, model, block, n_paths, n_days, seed, returns, mean_block, batch_builder)
+                   for block in blocks]
+        block_results = (future.result() for future in as_completed(futures))
+    else:
+        block_results = (evaluate_path_block(strategy_builder, configs, model, block, n_paths, n_days, seed, returns, mean_block, batch_builder)
+                         for block in blocks)
+
+    summaries = {}
+    for block_summaries in block_results:
+        for config_name, summary in block_summaries:
+            summaries[(config_name, summary.period)] = summary
+        if progress is not None:
+            progress(len(summaries) // len(configs), n_paths)
+
+    return _assemble_results(configs, [path_name(i) for i in range(n_paths)], summaries)
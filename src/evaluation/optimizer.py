@@ -0,0 +1,183 @@
+"""
+Budgeted search of parametric entry-threshold ladders (no Streamlit code).
+
+Ladders are described by a few continuous parameters (see configs.build_ladder_thresholds). The search starts with a
+quasi-random (Halton) design, then fits a Gaussian process to the scores obtained so far and proposes batches of
+ladders maximizing the expected improvement. Every batch is evaluated with evaluate_all_configurations, so it runs on
+the parallel / batch engine paths.
+
+The objective is SCORE_FORMULA applied to the raw metrics averaged over the periods: min-max normalization makes the
+Evaluation page score relative to the evaluated population, which does not fit a search evaluating one batch at a time.
+"""
+
+from math import erf, sqrt
+import numpy as np
+import pandas as pd
+
+from src.evaluation.batch_evaluation import evaluate_all_configurations
+from src.evaluation.configs import build_ladder_configuration
+from src.evaluation.scoring import SCORE_FORMULA, compute_score, flatten_results
+
+# Search bounds of every ladder parameter
+LADDER_SPACE = {
+    "n_rungs": (3, 9),
+    "first_dd": (-0.40, -0.03),
+    "spacing": (0.03, 0.12),
+    "convexity": (0.5, 3.0),
+    "split": (0.0, 1.0),
+}
+
+DEFAULT_YIELD_TARGETS = {"x2": "auto", "x3": "auto"}
+N_CANDIDATES = 2048  # Random points where the expected improvement is evaluated at each proposal
+LENGTH_SCALES = [0.05, 0.1, 0.2, 0.4, 0.8]  # Kernel length scales tried when fitting the Gaussian process
+
+_norm_cdf = np.vectorize(lambda z: 0.5 * (1 + erf(z / sqrt(2))))
+
+
+def decode(x):
+    """Ladder parameters of a point of the unit cube."""
+    params = {}
+    for value, (name, (low, high)) in zip(x, LADDER_SPACE.items()):
+        params[name] = low + float(value) * (high - low)
+    params["n_rungs"] = int(round(params["n_rungs"]))
+    return params
+
+
+def halton(n, dims, rng):
+    """First ``n`` points of a randomly shifted Halton sequence in [0, 1) ** dims."""
+    primes = [2, 3, 5, 7, 11, 13, 17, 19][:dims]
+    points = np.empty((n, dims))
+    for d, base in enumerate(primes):
+        for i in range(n):
+            f, r, k = 1.0, 0.0, i + 1
+            while k > 0:
+                f /= base
+                r += f * (k % base)
+                k //= base
+            points[i, d] = r
+    return (points + rng.random(dims)) % 1.0
+
+
+class GaussianProcess:
+
+    """Gaussian process regression with an RBF kernel, the length scale is chosen by marginal likelihood."""
+
+    def __init__(self, noise=1e-6):
+        self.noise = noise
+
+    @staticmethod
+    def _kernel(a, b, length_scale):
+        sq_dist = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-0.5 * sq_dist / length_scale ** 2)
+
+    def fit(self, x, y):
+        self.x = x
+        self.y_mean, self.y_std = y.mean(), y.std() or 1.0
+        y = (y - self.y_mean) / self.y_std
+
+        best = None
+        for length_scale in LENGTH_SCALES:
+            k = self._kernel(x, x, length_scale) + self.noise * np.eye(len(x))
+            try:
+                chol = np.linalg.cholesky(k)
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, y))
+            log_likelihood = -0.5 * y @ alpha - np.log(np.diag(chol)).sum()
+            if best is None or log_likelihood > best[0]:
+                best = (log_likelihood, length_scale, chol, alpha)
+        _, self.length_scale, self.chol, self.alpha = best
+        return self
+
+    def predict(self, x):
+        k = self._kernel(x, self.x, self.length_scale)
+        mean = k @ self.alpha
+        v = np.linalg.solve(self.chol, k.T)
+        std = np.sqrt(np.maximum(1.0 - (v ** 2).sum(axis=0), 1e-12))
+        return mean * self.y_std + self.y_mean, std * self.y_std
+
+
+def expected_improvement(mean, std, best):
+    z = (mean - best) / std
+    return (mean - best) * _norm_cdf(z) + std * np.exp(-0.5 * z ** 2) / sqrt(2 * np.pi)
+
+
+def propose_batch(x, y, batch_size, rng):
+    """Next points to evaluate: the expected improvement maximizer, repeated assuming the predicted score (kriging believer)."""
+    x, y = x.copy(), y.copy()
+    proposals = []
+    for _ in range(batch_size):
+        gp = GaussianProcess().fit(x, y)
+
+        # Random candidates plus small moves around the best points found so far
+        best_points = x[np.argsort(y)[-5:]]
+        local = best_points[rng.integers(len(best_points), size=N_CANDIDATES // 2)] + rng.normal(0.0, 0.05, (N_CANDIDATES // 2, x.shape[1]))
+        candidates = np.clip(np.vstack([rng.random((N_CANDIDATES // 2, x.shape[1])), local]), 0.0, 1.0)
+
+        mean, std = gp.predict(candidates)
+        i = int(np.argmax(expected_improvement(mean, std, y.max())))
+        proposals.append(candidates[i])
+        x = np.vstack([x, candidates[i]])
+        y = np.append(y, mean[i])
+
+    return np.array(proposals)
+
+
+def score_results(results):
+    """Objective of every evaluated config: SCORE_FORMULA on the raw metrics, averaged over the periods."""
+    df = flatten_results(results)
+    df["objective"] = compute_score(df, SCORE_FORMULA, lambda s: s)
+    return df.groupby("config")["objective"].mean()
+
+
+def optimize_ladders(strategy_builder, periods, df, budget=64, n_initial=None, batch_size=8, yield_targets=None, yield_values=None,
+                     rotate=True, risk_control=True, seed=0, callback=None, **evaluate_kwargs):
+    """
+    Search the best ladder with ``budget`` evaluations (each one a config evaluated on every period).
+    Returns (history, configs): history is a DataFrame with one row per evaluation (round, ladder parameters, config
+    name, objective), best first, and configs maps config names to configs.
+    ``callback(history)`` is called after every evaluated batch. Extra keyword arguments (workers, batch_builder,
+    cache...) are passed to evaluate_all_configurations.
+    """
+    rng = np.random.default_rng(seed)
+    yield_targets = yield_targets or DEFAULT_YIELD_TARGETS
+    yield_values = yield_values or {}
+    n_initial = min(budget, n_initial or max(2 * batch_size, 2 * len(LADDER_SPACE)))
+    computed = evaluate_kwargs.pop("computed", None)
+    computed = {} if computed is None else computed  # Proposals decoding to an already evaluated ladder are not simulated again
+
+    initial_points = halton(n_initial, len(LADDER_SPACE), rng)
+    configs = {}
+    rows = []
+    x_seen = np.empty((0, len(LADDER_SPACE)))
+    y_seen = np.empty(0)
+    round_idx = 0
+    while len(rows) < budget:
+        # Quasi-random warm-up, then batches proposed by the model
+        if len(rows) < n_initial:
+            batch = initial_points[len(rows):len(rows) + batch_size]
+        else:
+            batch = propose_batch(x_seen, y_seen, min(batch_size, budget - len(rows)), rng)
+
+        batch_configs = {}
+        names = []
+        for point in batch:
+            params = decode(point)
+            name, config = build_ladder_configuration(params, yield_targets, yield_values, rotate, risk_control)
+            batch_configs[name] = config
+            names.append((name, params))
+        configs.update(batch_configs)
+
+        results = evaluate_all_configurations(strategy_builder, batch_configs, periods, df, computed=computed, **evaluate_kwargs)
+        objectives = score_results(results)
+        for point, (name, params) in zip(batch, names):
+            rows.append({"round": round_idx, **params, "config": name, "objective": objectives[name]})
+        x_seen = np.vstack([x_seen, batch])
+        y_seen = np.append(y_seen, [objectives[name] for name, _ in names])
+        round_idx += 1
+
+        if callback is not None:
+            callback(pd.DataFrame(rows))
+
+    history = pd.DataFrame(rows).sort_values("objective", ascending=False).reset_index(drop=True)
+    return history, configs
@@ -0,0 +1,98 @@
+"""
+Successive-halving racing of threshold configurations across periods (no Streamlit code).
+
+All the configurations are evaluated on a few periods, mixing crisis and calm ones, and scored with SCORE_FORMULA.
+The worst ones are dropped and the survivors are evaluated on more periods, until only the best ``top_k`` remain,
+which are evaluated on every period. The round where each configuration was eliminated is reported.
+"""
+
+from math import ceil
+import os
+
+import pandas as pd
+
+from src.backtest.strategy.Strategy import Strategy
+from src.evaluation.batch_evaluation import evaluate_all_configurations
+from src.evaluation.scoring import flatten_results, augment_metrics
+
+def classify_periods(df, periods):
+    """
+    Return {period_name: "crisis" or "calm"}: crisis periods are the half with the deepest drawdown of the base index
+    (a fixed drawdown level would classify most multi-year periods as crisis).
+    """
+    max_dd = {}
+    for period_name, (start, end) in periods.items():
+        period_df = df[(df['Date'] >= pd.to_datetime(start)) & (df['Date'] <= pd.to_datetime(end))]
+        _, _, dd, _ = Strategy.compute_drawdowns(period_df)
+        max_dd[period_name] = dd.min() if len(dd) > 0 else 0.0
+    median_dd = pd.Series(max_dd).median()
+    return {period_name: "crisis" if dd < median_dd else "calm" for period_name, dd in max_dd.items()}
+
+
+def stratified_period_order(period_kinds):
+    """Periods alternating crisis and calm ones, so any prefix of the order is a balanced subset."""
+    crisis = [p for p, kind in period_kinds.items() if kind == "crisis"]
+    calm = [p for p, kind in period_kinds.items() if kind == "calm"]
+    order = []
+    for i in range(max(len(crisis), len(calm))):
+        order += crisis[i:i + 1] + calm[i:i + 1]
+    return order
+
+
+def score_configurations(results):
+    # Mean SCORE_FORMULA score of every config over its evaluated periods, best first
+    df = augment_metrics(flatten_results(results))
+    return df.groupby("config")["score"].mean().sort_values(ascending=False)
+
+
+def race_configurations(strategy_builder, configs, periods, df, keep_fraction=0.5, top_k=20, initial_periods=4, **evaluate_kwargs):
+    """
+    Successive-halving evaluation, returns (results, report):
+    - results: {config_name: DataFrame with one row per period} of the finalists, evaluated on every period
+    - report: DataFrame indexed by config with the round where it was eliminated (NaN for finalists), the number of
+      periods it was evaluated on, its score and rank in its last round
+    Extra keyword arguments (workers, batch_builder, cache...) are passed to evaluate_all_configurations.
+    """
+    order = stratified_period_order(classify_periods(df, periods))
+    computed = evaluate_kwargs.pop("computed", None)
+    computed = {} if computed is None else computed  # Periods evaluated in a round are not simulated again in the next ones
+
+    alive = list(configs)
+    n_periods = min(initial_periods, len(order))
+    report = {}
+    round_idx = 0
+    while True:
+        round_periods = {p: periods[p] for p in periods if p in order[:n_periods]}
+        results = evaluate_all_configurations(strategy_builder, {name: configs[name] for name in alive}, round_periods, df, computed=computed,
+                                              **evaluate_kwargs)
+        scores = score_configurations(results)
+        for rank, (name, score) in enumerate(scores.items(), start=1):
+            report[name] = {"eliminated_round": float("nan"), "periods_evaluated": n_periods, "last_round": round_idx, "score": score, "rank": rank}
+
+        if n_periods >= len(order):
+            break
+
+        # Next round uses twice as many periods, the configs reaching every period are the top_k finalists
+        n_periods = min(2 * n_periods, len(order))
+        n_keep = top_k if n_periods == len(order) else max(top_k, ceil(len(alive) * keep_fraction))
+        for name in scores.index[n_keep:]:
+            report[name]["eliminated_round"] = round_idx
+        alive = list(scores.index[:n_keep])
+        if len(alive) <= top_k:
+            n_periods = len(order)
+        round_idx += 1
+
+    report = pd.DataFrame.from_dict(report, orient="index").rename_axis("config")
+    report = report.sort_values(["eliminated_round", "rank"], ascending=[False, True], na_position="first")
+    return {name: results[name] for name in scores.index}, report
+
+
+def elimination_summary(report):
+    # Number of configurations eliminated per round and of finalists, e.g. "round 0: 120 eliminated, ... | 20 finalists"
+    rounds = report["eliminated_round"].value_counts().sort_index()
+    return ", ".join(f"round {int(r)}: {n} eliminated" for r, n in rounds.items()) + f" | {report['eliminated_round'].isna().sum()} finalists"
+
+
+def racing_report_path(output):
+    """Path of the racing report written next to a results file: ``<output without extension>.racing.parquet``."""
+    return f"{os.path.splitext(output)[0]}.racing.parquet"
@@ -0,0 +1,101 @@
+"""
+Persistent cache of evaluation results.
+
+Every (config, period) result is stored in a SQLite database under a hash of everything it depends on: the prices of
+the period, the period bounds, the normalized config, the evaluation constants and the engine version. Changing any
+of them produces a different key, so stale results are never returned and no invalidation is needed.
+
+Results are read only for the keys requested, the database is never loaded as a whole.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+# Bump when a change in the backtest engine alters its results, so previous cached results are not reused
+ENGINE_VERSION = 1
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "results.sqlite")
+
+# Maximum number of keys per SELECT (SQLite limits the number of query parameters)
+QUERY_BATCH_SIZE = 500
+
+
+def dataset_fingerprint(df):
+    """Hash of the dates and prices of a dataset (or a slice of it)."""
+    digest = hashlib.sha256()
+    digest.update(df['Date'].to_numpy(dtype="datetime64[ns]").view(np.int64).tobytes())
+    digest.update(df['Adj Close'].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def normalize_config(config):
+    """Canonical form of a config, independent of dict ordering and of the values of unused yield settings."""
+    assets = sorted({asset for _, asset in config["thresholds"].values()})
+    return {
+        "thresholds": sorted([[float(pct), float(buy_pct), asset] for pct, (buy_pct, asset) in config["thresholds"].items()], reverse=True),
+        "yield_targets": {asset: config["yield_targets"][asset] for asset in assets},
+        "yield_values": {asset: (float(config["yield_values"][asset]) if config["yield_targets"][asset] == "num" else None) for asset in assets},
+        "rotate": bool(config["rotate"]),
+        "risk_control": bool(config["risk_control"]),
+    }
+
+
+def make_period_token(data_fingerprint, start, end, constants):
+    # Part of the key shared by every config evaluated on a period
+    payload = {"data": data_fingerprint, "period": [str(start), str(end)], "constants": constants, "engine_version": ENGINE_VERSION}
+    return json.dumps(payload, sort_keys=True)
+
+
+def make_config_token(config):
+    # Part of the key shared by every period a config is evaluated on
+    return json.dumps(normalize_config(config), sort_keys=True)
+
+
+def make_key(period_token, config_token):
+    return hashlib.sha256(f"{period_token}|{config_token}".encode()).hexdigest()
+
+
+class ResultCache:
+
+    """On-disk store of evaluation results (dicts of BacktestSummary fields) indexed by content hash."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Streamlit reruns may use a different thread, SQLite serializes the accesses itself
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+
+    def get_many(self, keys):
+        """Return {key: summary dict} for the keys found in the cache."""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), QUERY_BATCH_SIZE):
+            batch = keys[i:i + QUERY_BATCH_SIZE]
+            query = f"SELECT key, summary FROM results WHERE key IN ({','.join('?' * len(batch))})"
+            for key, summary in self.conn.execute(query, batch):
+                found[key] = json.loads(summary)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store {key: summary dict}, values must be JSON serializable (NumPy scalars are converted)."""
+        rows = [(key, json.dumps({k: (v.item() if isinstance(v, np.generic) else v) for k, v in summary.items()}))
+                for key, summary in items.items()]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO results (key, summary) VALUES (?, ?)", rows)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM results")
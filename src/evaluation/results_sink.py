@@ -0,0 +1,191 @@
+"""
+Streaming, memory-bounded results of large evaluations (no Streamlit code).
+
+A ResultsSink appends the summary rows of the evaluated (config, period) pairs to a Parquet file as they are computed,
+in row groups of a fixed number of rows, so a sweep never holds more than one batch of rows besides its configurations.
+The file is read back through a ResultsTable, a small handle (path and number of rows) that can be kept in the
+Streamlit session, and aggregated chunk by chunk by ``summarize_table``: score bounds, ranking of the configurations,
+best configuration per period and the rows of the top configurations (heatmap, drill-down).
+"""
+
+import os
+import uuid
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.evaluation.batch_evaluation import BacktestSummary
+from src.evaluation.scoring import SCORE_FORMULA, asc_is_better, augment_metrics, unflatten_results
+from src.utils.memo import memoize
+
+DEFAULT_BATCH_SIZE = 65536  # Rows per row group written, and per chunk read
+DEFAULT_RESULTS_DIR = os.path.join("cache", "results")
+TOP_CONFIGS = 200  # Configurations of the heatmap and the drill-down, the best ones by the reference metric
+
+SUMMARY_FIELDS = [field.name for field in fields(BacktestSummary)]
+ARROW_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+SCHEMA = pa.schema([("config", pa.string())] + [(field.name, ARROW_TYPES[field.type]) for field in fields(BacktestSummary)])
+
+# Per-config aggregates of the ranking: (metric, aggregation), means are accumulated as sums and divided by the count
+RANKING_AGGREGATES = {
+    "avg_score": ("score", "mean"),
+    "avg_cagr": ("cagr", "mean"),
+    "avg_adjusted_cagr": ("adjusted_cagr", "mean"),
+    "avg_tuw": ("tuw", "mean"),
+    "avg_excess_cagr": ("excess_cagr", "mean"),
+    "worst_score": ("score", "min"),
+    "max_debt_cost": ("debt_cost", "max"),
+}
+
+
+def new_results_path(results_dir=DEFAULT_RESULTS_DIR):
+    return os.path.join(results_dir, f"results_{uuid.uuid4().hex}.parquet")
+
+
+@dataclass(frozen=True)
+class ResultsTable:
+
+    """Handle of a results file written by a ResultsSink (or by the command-line runner), read chunk by chunk."""
+
+    path: str
+    n_rows: int
+
+    @classmethod
+    def open(cls, path):
+        return cls(path, pq.ParquetFile(path).metadata.num_rows)
+
+    def iter_chunks(self, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+        """DataFrames of at most ``batch_size`` rows (with only ``columns`` if given)."""
+        for batch in pq.ParquetFile(self.path).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+    def to_results(self):
+        # {config_name: DataFrame with one row per period}, the whole table is loaded: only for small tables
+        return unflatten_results(pd.read_parquet(self.path, columns=SCHEMA.names))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResultsSink:
+
+    """
+    Writer of summary rows to a Parquet file, buffered in preallocated columns of ``batch_size`` rows that are written
+    as a row group whenever they are full. ``close`` returns the ResultsTable of the file.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.writer = pq.ParquetWriter(path, SCHEMA)
+        self.n_rows = 0
+        self.size = 0
+        self.columns = {field.name: [None] * batch_size if field.type == pa.string() else np.empty(batch_size, dtype=field.type.to_pandas_dtype())
+                        for field in SCHEMA}
+
+    def append(self, config_name, summary):
+        i = self.size
+        self.columns["config"][i] = config_name
+        for name in SUMMARY_FIELDS:
+            self.columns[name][i] = getattr(summary, name)
+        self.size += 1
+        if self.size == self.batch_size:
+            self.flush()
+
+    def extend(self, summaries):
+        for config_name, summary in summaries:
+            self.append(config_name, summary)
+
+    def flush(self):
+        if self.size == 0:
+            return
+        batch = pa.table({name: column[:self.size] for name, column in self.columns.items()}, schema=SCHEMA)
+        self.writer.write_table(batch, row_group_size=self.batch_size)
+        self.n_rows += self.size
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        return ResultsTable(self.path, self.n_rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.writer.is_open:
+            self.close()
+
+
+def write_results(results, path, batch_size=DEFAULT_BATCH_SIZE):
+    """Write in-memory results ({config_name: DataFrame with one row per period}) as a results table."""
+    with ResultsSink(path, batch_size) as sink:
+        for config_name, df in results.items():
+            for row in df[SUMMARY_FIELDS].itertuples(index=False):
+                sink.append(config_name, row)
+        return sink.close()
+
+
+def score_bounds(table, formula=SCORE_FORMULA):
+    """{metric: (min, max)} over the whole table of the metrics of the score formula."""
+    metrics = list(dict.fromkeys(term["metric"] for term in formula))
+    bounds = {metric: (np.inf, -np.inf) for metric in metrics}
+    for chunk in table.iter_chunks(columns=metrics):
+        for metric in metrics:
+            low, high = bounds[metric]
+            bounds[metric] = (min(low, chunk[metric].min()), max(high, chunk[metric].max()))
+    return bounds
+
+
+def _augmented_chunks(table, bounds):
+    for chunk in table.iter_chunks(columns=SCHEMA.names):
+        yield augment_metrics(chunk, bounds)
+
+
+def _merge_ranking(ranking, part):
+    if ranking is None:
+        return part
+    merged = pd.concat([ranking, part]).groupby(level=0, sort=False)
+    return merged.agg({column: "min" if column == "worst_score" else "max" if column == "max_debt_cost" else "sum" for column in part.columns})
+
+
+@memoize(maxsize=8)
+def summarize_table(table, ref_metric, top=TOP_CONFIGS):
+    """
+    Aggregates of a results table computed chunk by chunk, the score being normalized with the bounds of the whole table:
+    - "ranking": one row per configuration (RANKING_AGGREGATES), best first by the mean of ``ref_metric``
+    - "best_by_period": the best row of every period by ``ref_metric``
+    - "top_rows": the rows of the ``top`` best configurations of the ranking
+    """
+    bounds = score_bounds(table)
+    ascending = asc_is_better(ref_metric)
+
+    # Sums, counts, minimums and maximums per config, and candidates for the best row of every period
+    ranking, best = None, []
+    for chunk in _augmented_chunks(table, bounds):
+        groups = chunk.groupby("config", sort=False)
+        part = pd.DataFrame({"runs": groups.size()})
+        for column, (metric, how) in RANKING_AGGREGATES.items():
+            part[column] = groups[metric].agg("sum" if how == "mean" else how)
+        ranking = _merge_ranking(ranking, part)
+        best.append(chunk.sort_values(ref_metric, ascending=ascending).groupby("period").head(1))
+
+    if ranking is None:
+        return {"ranking": pd.DataFrame(columns=list(RANKING_AGGREGATES)), "best_by_period": pd.DataFrame(columns=SCHEMA.names),
+                "top_rows": pd.DataFrame(columns=SCHEMA.names)}
+    for column, (_, how) in RANKING_AGGREGATES.items():
+        if how == "mean":
+            ranking[column] = ranking[column] / ranking["runs"]
+    ranking = ranking.drop(columns="runs").rename_axis("config").sort_values(f"avg_{ref_metric}", ascending=ascending)
+
+    best = pd.concat(best).sort_values(ref_metric, ascending=ascending).groupby("period").first().reset_index()
+
+    top_configs = set(ranking.index[:top])
+    top_rows = pd.concat([chunk[chunk["config"].isin(top_configs)] for chunk in _augmented_chunks(table, bounds)], ignore_index=True)
+
+    return {"ranking": ranking, "best_by_period": best, "top_rows": top_rows}
@@ -0,0 +1,109 @@
+"""
+Rolling-window evaluation of configurations (no Streamlit code).
+
+Instead of a few hand-picked periods, a configuration is backtested from every start date (or every Nth trading day)
+with a fixed horizon, and summarised by the distribution of its metrics over all the windows (summarize_distributions).
+
+Leveraged NAVs are not rebuilt per window: the daily growth of every leverage factor is accumulated once over the
+full history, and the NAV of a window is that growth rescaled to the start of the window and zeroed from the first
+knockout inside the window, which is what the leveraged dataset of the window slice would contain.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.strategy.MarketData import MarketData
+from src.evaluation.batch_evaluation import evaluate_config_period, evaluate_period_batch, _assemble_results
+from src.utils.leverage import TER_ANNUAL, TRADING_DAYS, leverage_factor, sort_assets
+
+DEFAULT_HORIZON_YEARS = 5
+
+
+def rolling_periods(df, horizon_years=DEFAULT_HORIZON_YEARS, step=1):
+    """
+    Windows of ``horizon_years`` starting every ``step`` trading days, as {period_name: (start, end)} like PERIODS.
+    Only windows ending before the last date of the dataset are returned, the period name is the start date.
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(df['Date']))
+    starts = dates[::step]
+    ends = starts + pd.DateOffset(years=horizon_years) - pd.Timedelta(days=1)
+    complete = ends <= dates[-1]
+    starts, ends = starts[complete].strftime("%Y-%m-%d"), ends[complete].strftime("%Y-%m-%d")
+    return {start: (start, end) for start, end in zip(starts, ends)}
+
+
+class RollingMarket:
+
+    """
+    Full-history prices and leveraged growth of a dataset, from which the MarketData of any window is derived.
+    ``get(start_dt, end_dt, assets)`` has the interface of MarketDataCache, the last window is kept for the next calls.
+    """
+
+    def __init__(self, df, assets, ter_annual=TER_ANNUAL, trading_days=TRADING_DAYS):
+        self.dates = df['Date'].to_numpy(dtype="datetime64[ns]")
+        self.days = df['Days'].to_numpy(dtype=np.int64)
+        self.prices = df['Adj Close'].to_numpy(dtype=np.float64)
+        self.daily_fee = 1 - ter_annual / trading_days
+
+        # Growth of every leverage factor since the first day, skipping knockout days (restarted by a new window)
+        n = len(self.prices)
+        returns = np.zeros(n)
+        returns[1:] = self.prices[1:] / self.prices[:-1] - 1.0
+        self.growth, self.next_knockout = {}, {}
+        for asset in assets:
+            if asset == "x1":
+                continue
+            factor = (1 + leverage_factor(asset) * returns) * self.daily_fee
+            knockout = factor <= 0.0
+            self.growth[asset] = np.cumprod(np.where(knockout, 1.0, factor))
+            # First knockout day at or after every day (n if none)
+            self.next_knockout[asset] = np.minimum.accumulate(np.where(knockout, np.arange(n), n)[::-1])[::-1]
+
+        self._window = None
+        self._market_data = {}
+
+    def get_nav(self, asset, start, end):
+        """Leveraged NAV of the rows start..end (inclusive) with an initial NAV of 1 before the first day's fee."""
+        nav = self.daily_fee * self.growth[asset][start:end + 1] / self.growth[asset][start]
+        if start < end and self.next_knockout[asset][start + 1] <= end:
+            nav[self.next_knockout[asset][start + 1] - start:] = 0.0
+        return nav
+
+    def get(self, start_dt, end_dt, assets):
+        start = int(np.searchsorted(self.dates, np.datetime64(start_dt, "ns"), side="left"))
+        end = int(np.searchsorted(self.dates, np.datetime64(end_dt, "ns"), side="right")) - 1
+        if self._window != (start, end):
+            self._window = (start, end)
+            self._market_data = {}
+
+        key = tuple(assets)
+        if key not in self._market_data:
+            dates, days = self.dates[start:end + 1], self.days[start:end + 1]
+            prices = {"x1": self.prices[start:end + 1]}
+            prices.update({asset: self.get_nav(asset, start, end) for asset in assets if asset != "x1"})
+            self._market_data[key] = MarketData.from_arrays(dates, days, prices)
+        return self._market_data[key]
+
+
+def evaluate_rolling_windows(strategy_builder, configs, df, horizon_years=DEFAULT_HORIZON_YEARS, step=1, batch_builder=None, progress=None):
+    """
+    Backtest every configuration over every rolling window of ``horizon_years`` starting every ``step`` trading days,
+    returns {config_name: DataFrame with one row per window} (the period of a row is the start date of its window).
+    ``progress(n_done, n_total)``, if given, is called after every window.
+    """
+    periods = rolling_periods(df, horizon_years, step)
+    assets = sort_assets({asset for config in configs.values() for _, asset in config["thresholds"].values()})
+    market = RollingMarket(df, assets)
+
+    summaries = {}
+    for i, (period_name, (start, end)) in enumerate(periods.items()):
+        if batch_builder is not None:
+            for config_name, summary in evaluate_period_batch(batch_builder, None, period_name, start, end, configs, market).items():
+                summaries[(config_name, period_name)] = summary
+        else:
+            for config_name, config_values in configs.items():
+                summaries[(config_name, period_name)] = evaluate_config_period(strategy_builder, None, period_name, start, end, config_values, market)
+        if progress is not None:
+            progress(i + 1, len(periods))
+
+    return _assemble_results(configs, periods, summaries)
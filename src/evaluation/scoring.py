@@ -0,0 +1,100 @@
+"""
+Scoring of evaluation results, shared by the Evaluation page and the evaluation pipelines (no Streamlit code).
+"""
+
+import pandas as pd
+
+SCORE_FORMULA = [
+    {"weight": 2.0, "metric": "cagr"},
+    {"weight": -0.5, "metric": "tuw"},
+]
+
+# Metrics and quantiles reported by summarize_distributions
+DISTRIBUTION_METRICS = ["cagr", "adjusted_cagr", "tuw"]
+DISTRIBUTION_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def asc_is_better(metric):
+    if metric == "tuw":
+        return True
+    return False
+
+
+def flatten_results(results):
+    dfs = []
+    for config_name, df in results.items():
+        df = df.copy()
+        df["config"] = config_name
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def unflatten_results(df):
+    # Inverse of flatten_results, e.g. for a results table written by the command-line runner
+    return {config_name: group.drop(columns="config").reset_index(drop=True) for config_name, group in df.groupby("config", sort=False)}
+
+
+def compute_score(df, formula, normalizer):
+    score = 0.0
+    for term in formula:
+        score += term["weight"] * normalizer(df[term["metric"]])
+
+    return score
+
+
+def formula_str(formula, normalizer_name="min-max normalized"):
+    terms = []
+
+    for term in formula:
+        w = term["weight"]
+        metric = term["metric"].replace("_", " ").upper()
+
+        sign = "" if w > 0 else "−"
+        abs_w = abs(w)
+
+        terms.append(f"- {sign} {abs_w:g} × {metric}")
+
+    body = "\n".join(terms)
+
+    return (
+        f"Score is computed as a weighted sum of {normalizer_name} metrics:\n\n"
+        f"{body}\n\n"
+        f"Higher score = better overall strategy performance."
+    )
+
+
+def augment_metrics(df, bounds=None):
+    # ``bounds`` ({metric: (min, max)}) normalize the score metrics of a chunk of a larger table, by default the
+    # bounds of the metrics in df are used
+    df = df.copy()
+
+    df["excess_cagr"] = df["cagr"] - df["base_cagr"]
+    df["value_vs_base"] = df["gross_value"] / df["base_scenario"]
+
+    def minmax(s):
+        low, high = bounds[s.name] if bounds is not None else (s.min(), s.max())
+        return (s - low) / (high - low + 1e-9)
+
+    df["score"] = compute_score(df, SCORE_FORMULA, minmax)
+
+    return df
+
+
+def summarize_distributions(results, metrics=DISTRIBUTION_METRICS, quantiles=DISTRIBUTION_QUANTILES):
+    """
+    Distribution of the metrics over the periods of every configuration (e.g. rolling windows or synthetic paths),
+    one row per configuration.
+    """
+    rows = {}
+    for config_name, df in results.items():
+        row = {"runs": len(df)}
+        for metric in metrics:
+            row[f"{metric}_mean"] = df[metric].mean()
+            row[f"{metric}_min"] = df[metric].min()
+            for q in quantiles:
+                row[f"{metric}_p{round(q * 100)}"] = df[metric].quantile(q)
+            row[f"{metric}_max"] = df[metric].max()
+        # Share of the runs where the configuration beats the baseline scenario (x1 held over the whole period)
+        row["beats_base"] = (df["cagr"] > df["base_cagr"]).mean()
+        rows[config_name] = row
+    return pd.DataFrame.from_dict(rows, orient="index")
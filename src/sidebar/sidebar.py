@@ -1,25 +1,30 @@
+import os
 import streamlit as st
 from datetime import date
-from src.sidebar.utils import load_csv, download_dataset
-from src.utils.utils import _add_available_plot, _leverage_dataset, _reset_session, _clear_data, _clear_data_and_logs
+from src.sidebar.utils import load_uploaded_dataset, download_dataset
+from src.data.store import DatasetStore
+from src.utils.utils import _add_available_plot, _cached_leverage_dataset, _reset_session, _clear_data, _clear_data_and_logs
+from src.utils.leverage import asset_name
 
 
 def run():
     st.sidebar.header("Data source")
-    data_source = st.sidebar.radio("Source", ("CSV file", "Yahoo Finance"))
+    data_source = st.sidebar.radio("Source", ("CSV file", "Yahoo Finance", "Stored dataset"))
+    store = DatasetStore(os.path.join(st.session_state['PROJECT_DIR'], "data", "store"))
 
     if data_source == "CSV file":
         uploaded_file = st.sidebar.file_uploader("Upload a CSV file", type=["csv"], on_change=_clear_data)
         if uploaded_file is not None:
-            # Load dataset and save in session state
+            # Load dataset and save in session state (only once per uploaded file)
             try:
-                df = load_csv(uploaded_file)
-                st.session_state['df'] = df
-                st.session_state['df_loaded'] = True
+                if st.session_state.get('dataset_source') != ("upload", uploaded_file.file_id):
+                    st.session_state['df'] = load_uploaded_dataset(uploaded_file.getvalue(), store)
+                    st.session_state['df_loaded'] = True
+                    st.session_state['dataset_source'] = ("upload", uploaded_file.file_id)
                 st.sidebar.success("CSV loaded")
             except Exception as e:
                 st.sidebar.error(f"Error reading CSV file: {e}")
-    else:
+    elif data_source == "Yahoo Finance":
         st.sidebar.markdown("Download data from Yahoo Finance")
         ticker = st.sidebar.selectbox("Ticker", options=["sp500", "nasdaq"])
         interval = st.sidebar.selectbox("Interval", options=["daily", "monthly"])
@@ -28,12 +33,26 @@ def run():
             _clear_data()
             # Download dataset and save in session state
             try:
-                df = download_dataset(ticker=ticker, interval=interval, start_year=int(start_year), save=True)
+                df = download_dataset(ticker=ticker, interval=interval, start_year=int(start_year), save=True, store=store)
                 st.session_state['df'] = df
                 st.session_state['df_loaded'] = True
+                st.session_state['dataset_source'] = ("yahoo", ticker, interval, int(start_year))
                 st.sidebar.success("Dataset downloaded")
             except Exception as e:
                 st.sidebar.error(f"Error downloading {ticker} from Yahoo Finance: {e}")
+    else:
+        # Datasets downloaded or uploaded before, loaded from the store without parsing
+        manifest = store.manifest()
+        if not manifest:
+            st.sidebar.info("No stored datasets yet, upload a CSV file or download one from Yahoo Finance")
+        else:
+            name = st.sidebar.selectbox("Dataset", options=list(manifest.keys()),
+                                        format_func=lambda k: f"{k} ({manifest[k]['start']} → {manifest[k]['end']}, {manifest[k]['rows']} rows)")
+            if st.session_state.get('dataset_source') != ("store", name) or not st.session_state.get('df_loaded', False):
+                st.session_state['df'] = store.load(name)
+                st.session_state['df_loaded'] = True
+                st.session_state['dataset_source'] = ("store", name)
+            st.sidebar.caption(f"Source: {manifest[name]['source']} | Columns: {', '.join(manifest[name]['columns'])}")
 
     if st.session_state.get('df_loaded', False):
         _add_available_plot("Price over time")
@@ -45,11 +64,11 @@ def run():
         knockout = st.sidebar.checkbox("Zero knockout (Ignore negative returns)", value=True)
         if st.sidebar.button("Create"):
             try:
-                lev_df = _leverage_dataset(df, L=lev_L, knockout_zero=knockout)
-                st.session_state.setdefault('leveraged_df', {})[f"x{lev_L}"] = lev_df
+                lev_df = _cached_leverage_dataset(df, L=lev_L, knockout_zero=knockout)
+                st.session_state.setdefault('leveraged_df', {})[asset_name(lev_L)] = lev_df
                 print(st.session_state.keys())
                 st.session_state['leveraged_created'] = True
-                _add_available_plot(f"Original vs Leveraged x{lev_L}")
+                _add_available_plot(f"Original vs Leveraged {asset_name(lev_L)}")
                 st.success("Leveraged dataset successfully created")
             except Exception as e:
                 st.sidebar.error(f"Error while creating leveraged dataset: {e}")
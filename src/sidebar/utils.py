@@ -1,5 +1,9 @@
+import io
+import hashlib
 import pandas as pd
 import yfinance as yf
+from src.utils.memo import memoize
+from src.data.store import DatasetStore
 
 DEFAULT_DATE_COL = "date"
 
@@ -10,7 +14,21 @@ def load_csv(path):
     return df
 
 
-def download_dataset(ticker, interval, start_year, save=False):
+@memoize(maxsize=4)
+def load_csv_bytes(data):
+    # Uploaded files are kept by the uploader across reruns, parse each content once
+    return load_csv(io.BytesIO(data))
+
+
+def load_uploaded_dataset(data, store):
+    # Uploaded CSV files are converted once into the dataset store, later uploads of the same file are memory-mapped
+    name = f"upload_{hashlib.sha256(data).hexdigest()[:12]}"
+    if name not in store:
+        store.save(name, load_csv_bytes(data), source="csv upload")
+    return store.load(name)
+
+
+def download_dataset(ticker, interval, start_year, save=False, store=None):
     yf_tickers = {'sp500': '^GSPC', 'nasdaq': 'QQQ'}
     yf_intervals = {'daily': '1d', 'monthly': '1mo'}
 
@@ -33,6 +51,6 @@ def download_dataset(ticker, interval, start_year, save=False):
     df['Days'] = (df['Date'] - df['Date'].min()).dt.days
 
     if save:
-        df.to_csv(f"data/{ticker}_{interval}_{start_year}_2025.csv")
+        (store or DatasetStore()).save(f"{ticker}_{interval}_{start_year}", df, source="yahoo finance")
 
     return df
\ No newline at end of file
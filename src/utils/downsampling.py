@@ -0,0 +1,45 @@
+import numpy as np
+
+# Points per line trace when charts are downsampled, enough for a full-width chart
+DEFAULT_MAX_POINTS = 2000
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the ``n_out`` points kept by largest-triangle-three-buckets downsampling of the series (x, y).
+    The first and last points are always kept, then each bucket keeps the point forming the largest triangle with the
+    point kept in the previous bucket and the average of the next bucket, which preserves peaks and drawdowns.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    # Average point of every bucket, the one after the last bucket is the last point
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1])
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x, next_y = mean_x[i + 1], mean_y[i + 1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def rows_of_days(days, op_days):
+    """Row of every operation day in the sorted ``days`` column, -1 for days that are not in it."""
+    days = np.asarray(days)
+    op_days = np.asarray(op_days)
+    rows = np.minimum(np.searchsorted(days, op_days), len(days) - 1)
+    return np.where(days[rows] == op_days, rows, -1)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Annual total expense ratio of the leveraged ETPs, charged every trading day
+TER_ANNUAL = 0.0075
+TRADING_DAYS = 252
+
+
+def leverage_factor(asset):
+    # Leverage of an asset name, e.g. "x2" -> 2.0, "x2.5" -> 2.5
+    try:
+        if asset.startswith("x"):
+            return float(asset[1:])
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid asset {asset}, assets are named x<leverage>, e.g. x2 or x2.5")
+
+
+def asset_name(L):
+    # Inverse of leverage_factor, e.g. 2.0 -> "x2", 2.5 -> "x2.5"
+    return f"x{float(L):g}"
+
+
+def _asset_sort_key(asset):
+    try:
+        return 0, leverage_factor(asset), asset
+    except ValueError:
+        return 1, 0.0, asset
+
+
+def sort_assets(assets):
+    # Assets by increasing leverage, e.g. x1, x2, x2.5, x10 (other names go last)
+    return sorted(assets, key=_asset_sort_key)
+
+
+def leverage_cube(prices, factors, ter_annuals=(TER_ANNUAL,), knockout_zero=True, trading_days=TRADING_DAYS):
+    """
+    NAVs (days x leverage factors x TERs) of daily leveraged ETPs tracking ``prices``, all computed in one pass and
+    starting at 1 before the first day's fee. With ``knockout_zero``, an ETP whose daily factor is zero or negative is
+    worth zero from that day on.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    returns = np.zeros(len(prices))
+    returns[1:] = prices[1:] / prices[:-1] - 1.0
+    returns[np.isnan(returns)] = 0.0
+
+    # Computed as (leverage factors x TERs x days), so every NAV is accumulated over contiguous memory
+    factor = 1 + np.asarray(factors, dtype=np.float64)[:, None, None] * returns[None, None, :]
+    factor = factor * (1 - np.asarray(ter_annuals, dtype=np.float64) / trading_days)[None, :, None]
+    if knockout_zero:
+        # Once a factor is zero the NAV stays at zero
+        factor = np.where(factor > 0.0, factor, 0.0)
+    return np.cumprod(factor, axis=2).transpose(2, 0, 1)
+
+
+def leveraged_datasets(_df, assets, knockout_zero=True, ter_annual=TER_ANNUAL, trading_days=TRADING_DAYS):
+    # {asset: leveraged dataset} of several leverage factors, built from a single NAV cube
+    navs = leverage_cube(_df["Adj Close"].to_numpy(dtype=np.float64), [leverage_factor(asset) for asset in assets], (ter_annual,),
+                         knockout_zero, trading_days)
+    return {asset: pd.DataFrame({"Date": _df["Date"], "Days": _df["Days"], "Og Adj Close": _df['Close'], "Adj Close": navs[:, i, 0]}, index=_df.index)
+            for i, asset in enumerate(assets)}
+
+
+def _leverage_dataset(_df, L=5, knockout_zero=True, ter_annual=TER_ANNUAL, trading_days=TRADING_DAYS):
+    # Leveraged dataset of a single leverage factor: NAV of a daily leveraged ETP with its TER (see leverage_cube)
+    return leveraged_datasets(_df, [asset_name(L)], knockout_zero, ter_annual, trading_days)[asset_name(L)]
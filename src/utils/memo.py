@@ -0,0 +1,103 @@
+"""
+Bounded LRU memoization of the pure data transforms used by the Streamlit pages (no Streamlit code).
+
+Calls are keyed by a fingerprint of their arguments: DataFrames and bytes by a hash of their content, other
+arguments by their value. So reruns, date range changes and leverage factors seen before are served from memory,
+whatever DataFrame object holds the data. Cached results are shared between callers and must not be modified in place.
+The fingerprint of a DataFrame is computed once per object, so arguments must not be modified in place either.
+"""
+
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+DEFAULT_MAXSIZE = 32
+
+# Content fingerprint of the pandas objects already hashed, by object id (entries are removed with the object)
+_pandas_fingerprints = {}
+
+
+def _pandas_fingerprint(value):
+    key = id(value)
+    if key not in _pandas_fingerprints:
+        digest = hashlib.sha256(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+        _pandas_fingerprints[key] = ("pandas", digest.hexdigest())
+        weakref.finalize(value, _pandas_fingerprints.pop, key, None)
+    return _pandas_fingerprints[key]
+
+
+def fingerprint(value):
+    """Hashable key of an argument, DataFrames and bytes are hashed by content."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return _pandas_fingerprint(value)
+    if isinstance(value, (bytes, bytearray)):
+        return ("bytes", hashlib.sha256(value).hexdigest())
+    if isinstance(value, dict):
+        return tuple(sorted((k, fingerprint(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(fingerprint(v) for v in value)
+    return value
+
+
+class LRUCache:
+
+    """Mapping keeping at most ``maxsize`` entries, the least recently used one is evicted first (thread-safe)."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # Streamlit sessions run on different threads
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def memoize(maxsize=DEFAULT_MAXSIZE):
+    """Decorator caching the results of a pure function in an LRUCache (available as ``func.cache``)."""
+    def decorator(func):
+        cache = LRUCache(maxsize)
+        missing = object()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (fingerprint(args), fingerprint(kwargs))
+            result = cache.get(key, missing)
+            if result is missing:
+                result = func(*args, **kwargs)
+                cache.put(key, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
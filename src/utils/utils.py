@@ -1,6 +1,17 @@
 import streamlit as st
-import pandas as pd
 import os
+from src.data.store import DatasetStore
+from src.utils.leverage import _leverage_dataset
+from src.utils.memo import memoize
+
+
+# Memoized transforms used on every rerun (bounded LRU keyed by data fingerprint and parameters)
+_cached_leverage_dataset = memoize(maxsize=32)(_leverage_dataset)
+
+
+@memoize(maxsize=32)
+def _filter_days(df, start_day, end_day):
+    return df[(df['Days'] >= start_day) & (df['Days'] <= end_day)].copy()
 
 
 def _add_available_plot(title):
@@ -14,9 +25,15 @@ def _set_df_loaded():
 
 
 def _reset_session():
-    for k in ['df', 'leveraged_df', 'df_loaded', 'leveraged_created', 'available_plots']:
+    # Results file of the evaluation page of this session (see evaluation.set_results_table)
+    if st.session_state.get('evaluation_table') is not None:
+        st.session_state['evaluation_table'].remove()
+    for k in ['df', 'leveraged_df', 'df_loaded', 'leveraged_created', 'available_plots', 'dataset_source',
+              'evaluation_table', 'racing_report', 'evaluation_results_file']:
         if k in st.session_state:
             del st.session_state[k]
+    _cached_leverage_dataset.cache.clear()
+    _filter_days.cache.clear()
 
 
 def _clear_logs():
@@ -35,11 +52,25 @@ def _clear_data():
     for f in os.listdir(f"{data_dir}/"):
         if os.path.isfile(f"{data_dir}/{f}"):
             os.remove(f"{data_dir}/{f}")
+    # Clear datasets downloaded or uploaded to the dataset store
+    DatasetStore(f"{data_dir}/store").clear()
+
+
+def _clear_results():
+    project_dir = st.session_state['PROJECT_DIR']
+    results_dir = f"{project_dir}/cache/results/"
+    # Clear results files of the evaluation page
+    if not os.path.isdir(results_dir):
+        return
+    for f in os.listdir(results_dir):
+        if os.path.isfile(f"{results_dir}/{f}"):
+            os.remove(f"{results_dir}/{f}")
 
 
 def _clear_data_and_logs():
     _clear_data()
     _clear_logs()
+    _clear_results()
 
 
 def _show_day_range_slider(df):
@@ -48,35 +79,3 @@ def _show_day_range_slider(df):
     max_day = int(df['Days'].max())
     start_day, end_day = st.slider("Days range slider", min_value=min_day, max_value=max_day, value=(min_day, max_day), step=1)
     return start_day, end_day
-
-
-def _leverage_dataset(_df, L=5, knockout_zero=True, ter_annual=0.0075, trading_days=252):
-    # Get prices from original dataset as a Pandas Series
-    prices = pd.Series(_df["Adj Close"])
-    # Create new Series with the price percentage change (daily returns)
-    daily_returns = prices.pct_change().fillna(0.0)
-    # Compute leveraged performance
-    leveraged_daily_returns = L * daily_returns
-    # Add base 1 to make compounding effect
-    factor = 1 + leveraged_daily_returns
-
-    # Apply daily TER cost
-    if ter_annual > 0:
-        daily_fee = 1 - ter_annual / trading_days
-        factor *= daily_fee
-
-    if knockout_zero:
-        # Look for negative returns and limit them to zero
-        factor = factor.where(factor > 0.0, 0.0)
-        # Create a mask with the first value equal to zero
-        # Use cummax to ensure all values after first 0 are included
-        zero_mask = (factor == 0.0).cummax()
-        # After ETP arrives value 0, it "dissappears"
-        factor[zero_mask] = 0.0
-
-    # Get initial price from original dataset
-    initial_nav = 1.0  # _df['Adj Close'].iloc[0]
-    # Accumulate all the performances starting on initial price (compound effect)
-    nav = initial_nav * factor.cumprod()
-
-    return pd.DataFrame({"Date": _df["Date"], "Days": _df["Days"], "Og Adj Close": _df['Close'], "Adj Close": nav})
\ No newline at end of file
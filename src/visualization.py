@@ -2,11 +2,16 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 from typing import Optional, List
+from src.utils.downsampling import lttb_indices
 
 
-def plot_timeseries(df: pd.DataFrame, date_col: str, value_col: str, title: Optional[str] = None):
+def plot_timeseries(df: pd.DataFrame, date_col: str, value_col: str, title: Optional[str] = None, max_points: Optional[int] = None):
     df_sorted = df.sort_values(date_col)
-    fig = px.line(df_sorted, x=date_col, y=value_col, title=title or f"{value_col} over time")
+    if max_points is not None:
+        # Shape-preserving downsampling (LTTB) drawn with WebGL
+        rows = lttb_indices(df_sorted[date_col].to_numpy(dtype="datetime64[ns]").astype("int64"), df_sorted[value_col].to_numpy(), max_points)
+        df_sorted = df_sorted.iloc[rows]
+    fig = px.line(df_sorted, x=date_col, y=value_col, title=title or f"{value_col} over time", render_mode="auto" if max_points is None else "webgl")
     fig.update_layout(xaxis_title=date_col, yaxis_title=value_col, height=450, template="plotly_white")
     #fig.update_xaxes(rangeslider_visible=True)
     fig.update_yaxes(tickformat=".2f", showgrid=True)
@@ -15,19 +20,25 @@ def plot_timeseries(df: pd.DataFrame, date_col: str, value_col: str, title: Opti
 
 def plot_combined_original_and_leveraged(orig: pd.DataFrame, leveraged: pd.DataFrame,
                                          date_col: str = "Date", value_col_orig: str = "Adj Close",
-                                         value_col_lev: str = "Adj Close", title: Optional[str] = None):
+                                         value_col_lev: str = "Adj Close", title: Optional[str] = None, max_points: Optional[int] = None):
     """
     Crea una figura con ambas series en el mismo eje y (misma unidad) — útil para comparar NAVs.
     Acepta que los DataFrames tengan las mismas fechas; en caso contrario hace un merge por date_col.
+    Con max_points, cada serie se reduce a ese número de puntos (LTTB) y se dibuja con WebGL.
     """
     o = orig[[date_col, value_col_orig]].rename(columns={value_col_orig: "Original"})
     l = leveraged[[date_col, value_col_lev]].rename(columns={value_col_lev: "Leveraged"})
     merged = pd.merge(o, l, on=date_col, how="inner").sort_values(date_col)
     merged = merged.reset_index(drop=True)
 
+    scatter = go.Scatter if max_points is None else go.Scattergl
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=merged[date_col], y=merged["Original"], mode='lines', name='Original'))
-    fig.add_trace(go.Scatter(x=merged[date_col], y=merged["Leveraged"], mode='lines', name='Leveraged'))
+    for col in ["Original", "Leveraged"]:
+        x, y = merged[date_col].to_numpy(), merged[col].to_numpy()
+        if max_points is not None:
+            rows = lttb_indices(x.astype("datetime64[ns]").astype("int64"), y, max_points)
+            x, y = x[rows], y[rows]
+        fig.add_trace(scatter(x=x, y=y, mode='lines', name=col))
     fig.update_layout(title=title or "Original vs Leveraged", xaxis_title=date_col, yaxis_title="Value", height=500, template="plotly_white")
     #fig.update_xaxes(rangeslider_visible=True)
     return fig
\ No newline at end of file